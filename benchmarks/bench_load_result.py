@@ -0,0 +1,88 @@
+"""
+Memory and throughput benchmark of LoadResult over a 1,000 tracks playlist.
+
+Run it from the repository root with ``python -m benchmarks.bench_load_result``.
+"""
+import copy
+import timeit
+import tracemalloc
+
+from lavalink.rest_api import LoadResult, Track
+
+TRACKS = 1000
+ROUNDS = 200
+
+
+def playlist_payload(count: int = TRACKS) -> dict:
+    return {
+        "loadType": "PLAYLIST_LOADED",
+        "playlistInfo": {"name": "Benchmark", "selectedTrack": -1},
+        "tracks": [
+            {
+                "track": "QAAAjQIAJVJpY2sgQXN0bGV5IC0gTmV2ZXIgR29ubmEgR2l2ZSBZb3UgVXAADlJpY2tBc3RsZXlWRVZPAAAAAAADPCAAC2RR"
+                         f"dzR3OVdnWGNRAAEAK2h0dHBzOi8vd3d3LnlvdXR1YmUuY29tL3dhdGNoP3Y9ZFF3NHc5V2dYY1EAB3lvdXR1YmUAAAAAAA{i:06}",
+                "info": {
+                    "identifier": f"dQw4w{i:06}",
+                    "isSeekable": True,
+                    "author": f"Author {i % 50}",
+                    "length": 212000 + i,
+                    "isStream": False,
+                    "position": 0,
+                    "title": f"Track number {i} of the benchmark playlist",
+                    "uri": f"https://www.youtube.com/watch?v=dQw4w{i:06}",
+                    "sourceName": "youtube",
+                },
+            }
+            for i in range(count)
+        ],
+    }
+
+
+def eager_tracks(data: dict) -> tuple:
+    """The previous behaviour: every Track is built upfront"""
+    return tuple(Track(t) for t in data["tracks"])
+
+
+def first_track(data: dict) -> LoadResult:
+    result = LoadResult(data)
+    result.tracks[0]
+    return result
+
+
+def all_tracks(data: dict) -> LoadResult:
+    result = LoadResult(data)
+    for _ in result.tracks:
+        pass
+    return result
+
+
+def measure_memory(func, data: dict) -> int:
+    """Memory retained by the result of func, excluding the payload itself"""
+    payloads = [copy.deepcopy(data) for _ in range(5)]
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    results = [func(payload) for payload in payloads]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del results
+    return (after - before) // len(payloads)
+
+
+def main():
+    data = playlist_payload()
+
+    cases = {
+        "eager tuple of Track": eager_tracks,
+        "LoadResult, first track only": first_track,
+        "LoadResult, all tracks": all_tracks,
+    }
+
+    print(f"{TRACKS} tracks playlist, {ROUNDS} rounds")
+    for name, func in cases.items():
+        seconds = timeit.timeit(lambda: func(data), number=ROUNDS) / ROUNDS
+        memory = measure_memory(func, data)
+        print(f"{name:<32} {seconds * 1e6:>10.1f} µs {memory / 1024:>10.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Throughput benchmark of the positional operations of TrackQueue against collections.deque.
+
+Run it from the repository root with ``python -m benchmarks.bench_queue``.
+"""
+import random
+import timeit
+from collections import deque
+
+from lavalink.queue import TrackQueue
+
+SIZES = (10_000, 100_000)
+OPERATIONS = 2_000
+
+
+def random_indexes(size: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    return [rng.randrange(size) for _ in range(OPERATIONS)]
+
+
+def access(queue, indexes: list):
+    for i in indexes:
+        queue[i]
+
+
+def insert_remove(queue, indexes: list):
+    for i in indexes:
+        queue.insert(i, None)
+        del queue[i]
+
+
+def move(queue, indexes: list):
+    for source, destination in zip(indexes, reversed(indexes)):
+        if isinstance(queue, deque):
+            queue.rotate(-source)
+            value = queue.popleft()
+            queue.rotate(source)
+            queue.insert(destination, value)
+        else:
+            queue.move(source, destination)
+
+
+def consume(queue, indexes: list):
+    for _ in indexes:
+        queue.append(queue.popleft())
+
+
+def main():
+    cases = {
+        "index access": access,
+        "insert + remove": insert_remove,
+        "move": move,
+        "popleft + append": consume,
+    }
+
+    for size in SIZES:
+        indexes = random_indexes(size)
+        print(f"{size} entries, {OPERATIONS} operations")
+        for name, func in cases.items():
+            for kind in (deque, TrackQueue):
+                queue = kind(range(size))
+                seconds = timeit.timeit(lambda: func(queue, indexes), number=1) / OPERATIONS
+                print(f"  {name:<20} {kind.__name__:<12} {seconds * 1e6:>10.2f} µs/op")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Memory benchmark of the queued tracks in a TrackQueue against a CompactTrackQueue.
+
+Run it from the repository root with ``python -m benchmarks.bench_queue_memory``.
+"""
+import gc
+import os
+import random
+import tracemalloc
+from base64 import b64encode
+from types import SimpleNamespace
+
+from lavalink.queue import CompactTrackQueue, TrackQueue
+from lavalink.rest_api import Track
+
+SIZES = (10_000, 50_000)
+AUTHORS = 500
+REQUESTERS = 20
+
+
+def make_tracks(size: int, seed: int = 0):
+    rng = random.Random(seed)
+    # The requesters are shared objects, like the cached discord.User
+    requesters = [SimpleNamespace(id=rng.randrange(1 << 60), name=f"user{i}") for i in range(REQUESTERS)]
+    for i in range(size):
+        identifier = b64encode(os.urandom(8)).decode()[:11]
+        track = Track(
+            {
+                "track": b64encode(os.urandom(rng.randrange(140, 200))).decode(),
+                "info": {
+                    "identifier": identifier,
+                    "isSeekable": True,
+                    "author": f"Author {rng.randrange(AUTHORS)}",
+                    "length": rng.randrange(60_000, 600_000),
+                    "isStream": False,
+                    "position": 0,
+                    "title": f"Some track title number {i}",
+                    "uri": f"https://www.youtube.com/watch?v={identifier}",
+                    "sourceName": "youtube",
+                },
+            }
+        )
+        track.requester = requesters[i % REQUESTERS]
+        yield track
+
+
+def measure(kind, size: int) -> int:
+    gc.collect()
+    tracemalloc.start()
+    queue = kind(make_tracks(size))
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(queue) == size
+    return current
+
+
+def main():
+    for size in SIZES:
+        print(f"{size} tracks")
+        baseline = measure(TrackQueue, size)
+        for kind in (TrackQueue, CompactTrackQueue):
+            used = baseline if kind is TrackQueue else measure(kind, size)
+            print(
+                f"  {kind.__name__:<18} {used / 2 ** 20:>8.1f} MiB"
+                f" {used / size:>8.0f} B/track {used / baseline:>6.0%}"
+            )
+
+
+if __name__ == "__main__":
+    main()
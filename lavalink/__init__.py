@@ -5,8 +5,17 @@ set_logging_level()
 from .lavalink import *
 from .node import Node, NodeStats, Stats
 from .player import *
-from .enums import NodeState, PlayerState, TrackEndReason, LavalinkEvents, FiltersOp
-from .rest_api import Track, LoadResult
+from .enums import NodeState, PlayerState, TrackEndReason, LavalinkEvents, FiltersOp, RequestPriority, QueueChangeType
+from .rest_api import Track, PendingTrack, LoadResult, TrackStream, HedgePolicy
+from .scheduler import RESTScheduler
+from .queue import TrackQueue, CompactTrackQueue, FairQueue, PlayHistory
+from .persistence import QueueJournal
+from .metrics import LatencyWindow, LatencyHistogram, SourceHealth
+from .query import analyze_query
+from .tuples import RoutePlannerStatus, QueueChange
+from .autocomplete import TrackIndex, track_index
+from .autoplay import RelatedTracks, related_tracks
+from .filters import FilterState
 from . import utils
 
 __all__ = [
@@ -17,20 +26,44 @@ __all__ = [
     "ws_ll_log",
     "ws_rll_log",
     "utils",
+    "analyze_query",
     "LoadResult",
+    "TrackStream",
+    "HedgePolicy",
     "Track",
+    "PendingTrack",
+    "TrackQueue",
+    "CompactTrackQueue",
+    "FairQueue",
+    "PlayHistory",
+    "QueueJournal",
     "NodeState",
     "PlayerState",
     "TrackEndReason",
     "FiltersOp",
+    "RequestPriority",
+    "QueueChangeType",
     "LavalinkEvents",
     "Node",
     "NodeStats",
     "Stats",
+    "RESTScheduler",
+    "LatencyWindow",
+    "LatencyHistogram",
+    "SourceHealth",
+    "RoutePlannerStatus",
+    "QueueChange",
     "Player",
+    "FilterState",
     "initialize",
     "connect",
     "get_player",
+    "load_tracks",
+    "autocomplete",
+    "TrackIndex",
+    "track_index",
+    "RelatedTracks",
+    "related_tracks",
     "close",
     "register_event_listener",
     "unregister_event_listener",
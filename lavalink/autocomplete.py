@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import re
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Hashable, Iterable, NamedTuple, Optional
+
+if TYPE_CHECKING:
+    from .rest_api import LoadResult, Track
+
+__all__ = ["TrackIndex", "track_index"]
+
+_re_non_word = re.compile(r"[^\w\s]+")
+
+
+def _normalize(text: str) -> list[str]:
+    return _re_non_word.sub(" ", text.casefold()).split()
+
+
+class _Entry(NamedTuple):
+    raw: dict[str, Any]
+    terms: tuple[str, ...]
+    stamp: int
+
+
+class TrackIndex:
+    """
+    In-process prefix index over the titles and authors of recently loaded tracks.
+
+    The terms are kept in a sorted array, so a lookup is a binary search plus a scan
+    of the matching range. When the index is full the least recently loaded tracks are evicted.
+
+    Attributes
+    ----------
+    max_tracks : int
+        The maximum number of indexed tracks, it bounds the memory used by the index
+    per_result : int
+        How many tracks of each :class:`LoadResult` are indexed
+    """
+    max_tracks: int
+    per_result: int
+
+    def __init__(self, max_tracks: int = 5000, per_result: int = 10):
+        """
+        Parameters
+        ----------
+        max_tracks : int
+            The maximum number of indexed tracks, it bounds the memory used by the index
+        per_result : int
+            How many tracks of each :class:`LoadResult` are indexed
+        """
+        self.max_tracks = max_tracks
+        self.per_result = per_result
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._terms: list[tuple[str, str]] = []
+        self._stamps = itertools.count()
+        self._debounce: dict[Hashable, object] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __repr__(self) -> str:
+        return f"<TrackIndex: tracks={len(self._entries)}, terms={len(self._terms)}, max_tracks={self.max_tracks}>"
+
+    def add(self, raw_tracks: Iterable[dict[str, Any]]):
+        """
+        Index the given tracks, as returned by Lavalink
+
+        Parameters
+        ----------
+        raw_tracks : Iterable[dict[str, Any]]
+        """
+        for raw in raw_tracks:
+            # The tracks of Lavalink v4 have the encoded track in "encoded"
+            key = raw.get("track") or raw.get("encoded")
+            info = raw.get("info")
+            if not key or not info:
+                continue
+
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._remove_terms(key, old)
+
+            terms = tuple(set(_normalize(f"{info.get('title') or ''} {info.get('author') or ''}")))
+            self._entries[key] = _Entry(raw, terms, next(self._stamps))
+            for term in terms:
+                insort(self._terms, (term, key))
+
+        while len(self._entries) > self.max_tracks:
+            key, entry = self._entries.popitem(last=False)
+            self._remove_terms(key, entry)
+
+    def add_result(self, result: LoadResult):
+        """
+        Index the first :attr:`per_result` tracks of a result, without building them
+
+        Parameters
+        ----------
+        result : LoadResult
+        """
+        if self.per_result > 0 and not result.has_error:
+            self.add(result._raw["tracks"][:self.per_result])
+
+    def _remove_terms(self, key: str, entry: _Entry):
+        for term in entry.terms:
+            index = bisect_left(self._terms, (term, key))
+            if index < len(self._terms) and self._terms[index] == (term, key):
+                del self._terms[index]
+
+    def clear(self):
+        """Remove every indexed track"""
+        self._entries.clear()
+        self._terms.clear()
+
+    def lookup(self, query: str, limit: int = 25) -> list[Track]:
+        """
+        Find the indexed tracks whose title or author have a word starting with every word of the query
+
+        Parameters
+        ----------
+        query : str
+        limit : int
+            The maximum number of tracks to return
+
+        Returns
+        -------
+        list[Track]
+            The matching tracks, the most recently loaded first
+        """
+        from .rest_api import Track
+
+        words = _normalize(query)
+        if not words or limit <= 0:
+            return []
+
+        # Scan the range of the most selective word, then check the others on each candidate
+        ranges = []
+        for word in set(words):
+            start = bisect_left(self._terms, (word,))
+            end = bisect_left(self._terms, (word + "\U0010ffff",), start)
+            if start == end:
+                return []
+            ranges.append((end - start, start, end, word))
+        _, start, end, word = min(ranges)
+        others = [r[3] for r in ranges if r[3] != word]
+
+        matches = {}
+        for _, key in self._terms[start:end]:
+            if key in matches:
+                continue
+            entry = self._entries[key]
+            if all(any(term.startswith(other) for term in entry.terms) for other in others):
+                matches[key] = entry
+
+        best = sorted(matches.values(), key=lambda e: e.stamp, reverse=True)[:limit]
+        return [Track(entry.raw) for entry in best]
+
+    async def complete(
+            self,
+            query: str,
+            load: Callable[[str], Awaitable[LoadResult]],
+            limit: int = 25,
+            min_results: int = 5,
+            debounce: float = 0.3,
+            key: Optional[Hashable] = None,
+    ) -> list[Track]:
+        """
+        Autocomplete a search query.
+
+        The local index is used first. Only when it has fewer than ``min_results`` hits, and no newer call
+        with the same ``key`` arrives within ``debounce`` seconds, a YouTube search is made with ``load``.
+
+        Parameters
+        ----------
+        query : str
+        load : Callable[[str], Awaitable[LoadResult]]
+            The coroutine function used to load the tracks, for example :func:`load_tracks`
+        limit : int
+            The maximum number of tracks to return
+        min_results : int
+            The minimum number of local hits needed to skip the search
+        debounce : float
+            How many seconds to wait for a newer call before searching
+        key : Optional[Hashable]
+            Identifies who is typing, for example the user ID
+
+        Returns
+        -------
+        list[Track]
+        """
+        hits = self.lookup(query, limit)
+        if len(hits) >= min(min_results, limit) or not query.strip():
+            return hits
+
+        token = object()
+        self._debounce[key] = token
+        try:
+            await asyncio.sleep(debounce)
+            if self._debounce.get(key) is not token:
+                # The user kept typing, this query is already stale
+                return hits
+            result = await load(f"ytsearch:{query}")
+        finally:
+            if self._debounce.get(key) is token:
+                del self._debounce[key]
+
+        self.add_result(result)
+        seen = {track.track_identifier for track in hits}
+        for track in result.tracks[:limit]:
+            if len(hits) >= limit:
+                break
+            if track.track_identifier not in seen:
+                seen.add(track.track_identifier)
+                hits.append(track)
+        return hits
+
+
+track_index = TrackIndex()
+"""The index fed by every loadtracks request"""
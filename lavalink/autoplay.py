@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Optional
+
+from .enums import RequestPriority
+
+if TYPE_CHECKING:
+    from .rest_api import RESTClient, Track
+
+__all__ = ["RelatedTracks", "related_tracks", "related_query"]
+
+
+def related_query(track: Track) -> Optional[str]:
+    """
+    Build the query that loads tracks related to a track.
+
+    YouTube tracks use their mix playlist, the other tracks a YouTube search
+    of their author and title.
+
+    Parameters
+    ----------
+    track : Track
+
+    Returns
+    -------
+    Optional[str]
+        None if the track has nothing to search for
+    """
+    if track.source == "youtube" and track.identifier:
+        return f"https://www.youtube.com/watch?v={track.identifier}&list=RD{track.identifier}"
+    terms = " ".join(part for part in (track.author, track.title) if part)
+    if not terms:
+        return None
+    return f"ytsearch:{terms}"
+
+
+class RelatedTracks:
+    """
+    Cache of the tracks related to the seed tracks of autoplay, shared by all the players.
+
+    The lookups of the same seed made at the same time share a single request.
+    When the cache is full the least recently used seeds are evicted.
+
+    Attributes
+    ----------
+    max_seeds : int
+        The maximum number of cached seeds
+    ttl : float
+        How long the related tracks of a seed are kept, in seconds
+    per_seed : int
+        How many related tracks are kept for a seed
+    """
+    max_seeds: int
+    ttl: float
+    per_seed: int
+
+    def __init__(self, max_seeds: int = 512, ttl: float = 3600.0, per_seed: int = 25):
+        self.max_seeds = max_seeds
+        self.ttl = ttl
+        self.per_seed = per_seed
+        self._entries: OrderedDict[str, tuple[float, list[Track]]] = OrderedDict()
+        self._pending: dict[str, asyncio.Future] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __repr__(self) -> str:
+        return f"<RelatedTracks: seeds={len(self._entries)}, max_seeds={self.max_seeds}>"
+
+    def clear(self):
+        """Remove all the cached seeds"""
+        self._entries.clear()
+
+    async def get(self, client: RESTClient, seed: Track) -> list[Track]:
+        """
+        Get the tracks related to a seed, loading them on a miss
+
+        Parameters
+        ----------
+        client : RESTClient
+            The client used to load the tracks, usually the player
+        seed : Track
+
+        Returns
+        -------
+        list[Track]
+            The related tracks, without the seed. They are shared, copy them before changing them.
+        """
+        key = seed.identifier or seed.track_identifier
+        entry = self._entries.get(key)
+        if entry is not None:
+            if time.monotonic() - entry[0] < self.ttl:
+                self._entries.move_to_end(key)
+                return entry[1]
+            del self._entries[key]
+
+        pending = self._pending.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        query = related_query(seed)
+        if query is None:
+            return []
+        future = self._pending[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await client.load_tracks(query, priority=RequestPriority.BULK)
+            tracks = [track for track in result.tracks[:self.per_seed + 1] if track.identifier != seed.identifier]
+            tracks = tracks[:self.per_seed]
+        except asyncio.CancelledError:
+            # The other lookups of the seed get nothing instead of being cancelled too
+            future.set_result([])
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            # Retrieved, so it isn't reported when no other lookup waits on it
+            future.exception()
+            raise
+        else:
+            future.set_result(tracks)
+        finally:
+            del self._pending[key]
+
+        self._entries[key] = (time.monotonic(), tracks)
+        while len(self._entries) > self.max_seeds:
+            self._entries.popitem(last=False)
+        return tracks
+
+
+related_tracks = RelatedTracks()
@@ -11,6 +11,8 @@ __all__ = [
     "PlayerState",
     "LoadType",
     "ExceptionSeverity",
+    "RequestPriority",
+    "QueueChangeType",
 ]
 
 
@@ -48,6 +50,11 @@ class LavalinkEvents(enum.Enum):
     end of all tracks in the queue.
     """
 
+    QUEUE_UPDATE = "QueueUpdateEvent"
+    """This is a custom event generated by this library when the queue
+    of a player changes, the extra is a :class:`QueueChange` describing the change.
+    """
+
 
 class TrackEndReason(enum.Enum):
     """
@@ -82,6 +89,7 @@ class LavalinkIncomingOp(enum.Enum):
     EVENT = "event"
     PLAYER_UPDATE = "playerUpdate"
     STATS = "stats"
+    READY = "ready"
 
 
 class LavalinkOutgoingOp(enum.Enum):
@@ -190,3 +198,41 @@ class ExceptionSeverity(enum.Enum):
     COMMON = "COMMON"
     SUSPICIOUS = "SUSPICIOUS"
     FATAL = "FATAL"
+
+
+class RequestPriority(enum.IntEnum):
+    """
+    The priority of a REST request, requests with a lower value are served first.
+    """
+    INTERACTIVE = 0
+    """Requests made on behalf of a user, for example a search"""
+
+    BULK = 1
+    """Background work, for example playlist imports or cache warmups"""
+
+
+class QueueChangeType(enum.Enum):
+    """
+    The kinds of changes of the queue of a player.
+    """
+
+    INSERTED = "INSERTED"
+    """Entries were inserted at an index."""
+
+    REMOVED = "REMOVED"
+    """Entries were removed, at an index or at the given indices."""
+
+    REPLACED = "REPLACED"
+    """The entry at an index was replaced, e.g. a query was resolved to a track."""
+
+    MOVED = "MOVED"
+    """Entries were moved from an index to another one."""
+
+    CLEARED = "CLEARED"
+    """All the entries were removed."""
+
+    SHUFFLED = "SHUFFLED"
+    """The entries were reordered by a shuffle or its revert."""
+
+    RESET = "RESET"
+    """The queue changed in a way that can't be described by indices, it has to be read again."""
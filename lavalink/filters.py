@@ -0,0 +1,270 @@
+from __future__ import annotations
+
+from typing import Any, Iterable, Optional
+
+from .enums import FiltersOp
+from .tuples import EqualizerBands
+
+__all__ = ["FilterState"]
+
+
+class FilterState:
+    """
+    The filters applied to a player.
+
+    Lavalink replaces the whole filter set of a player with each filter update, so the
+    filters are accumulated here and always sent together. Setting a filter replaces
+    the previous values of the same filter, the equalizer bands are merged.
+
+    Attributes
+    ----------
+    volume : Optional[float]
+        The volume filter, a multiplier of the volume of the player. None if unset.
+    """
+    volume: Optional[float]
+
+    def __init__(self):
+        self.volume = None
+        self._filters: dict[FiltersOp, dict[str, Any]] = {}
+        # band -> gain
+        self._bands: dict[int, float] = {}
+
+    def __repr__(self) -> str:
+        return f"<FilterState: {', '.join(op.name for op in self.active) or 'none'}>"
+
+    def __bool__(self) -> bool:
+        return bool(self.active)
+
+    def __contains__(self, op: FiltersOp) -> bool:
+        return op in self.active
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, FilterState):
+            return NotImplemented
+        return self.payload() == other.payload()
+
+    @property
+    def active(self) -> list[FiltersOp]:
+        """
+        The filters that are set, in the order of :class:`FiltersOp`.
+        """
+        return [
+            op for op in FiltersOp
+            if op in self._filters
+            or (op is FiltersOp.EQUALIZER and self._bands)
+            or (op is FiltersOp.VOLUME and self.volume is not None)
+        ]
+
+    def copy(self) -> FilterState:
+        """
+        Returns
+        -------
+        FilterState
+            An independent copy of the filters
+        """
+        state = FilterState()
+        state.volume = self.volume
+        state._filters = {op: dict(values) for op, values in self._filters.items()}
+        state._bands = dict(self._bands)
+        return state
+
+    def payload(self) -> dict[str, Any]:
+        """
+        Build the complete filter set, as expected by Lavalink.
+
+        Returns
+        -------
+        dict[str, Any]
+        """
+        payload: dict[str, Any] = {}
+        if self.volume is not None:
+            payload[FiltersOp.VOLUME.value] = self.volume
+        if self._bands:
+            payload[FiltersOp.EQUALIZER.value] = [
+                {"band": band, "gain": gain} for band, gain in sorted(self._bands.items())
+            ]
+        for op, values in self._filters.items():
+            payload[op.value] = dict(values)
+        return payload
+
+    def remove(self, op: FiltersOp):
+        """
+        Unset a filter.
+
+        Parameters
+        ----------
+        op : FiltersOp
+        """
+        if op is FiltersOp.VOLUME:
+            self.volume = None
+        elif op is FiltersOp.EQUALIZER:
+            self._bands.clear()
+        else:
+            self._filters.pop(op, None)
+
+    def clear(self):
+        """Unset all the filters"""
+        self.volume = None
+        self._filters.clear()
+        self._bands.clear()
+
+    def equalizer(self, bands: Iterable[EqualizerBands]):
+        """
+        Change bands of the equalizer, the other bands are kept.
+
+        Parameters
+        ----------
+        bands : Iterable[EqualizerBands]
+            The bands to change. A gain of 0 resets the band.
+        """
+        for band in bands:
+            if not (0 <= band.band <= 14):
+                raise ValueError("Band must be 0 ≤ x ≤ 14")
+            if band.gain:
+                self._bands[band.band] = band.gain
+            else:
+                self._bands.pop(band.band, None)
+
+    def karaoke(self, level: float = 1.0, mono_level: float = 1.0, filter_band: float = 220.0,
+                filter_width: float = 100.0):
+        """
+        Uses equalization to eliminate part of a band, usually targeting vocals.
+
+        Parameters
+        ----------
+        level : float
+            how much to filter
+        mono_level : float
+            how much to filter
+        filter_band : float
+            the frequency band to filter
+        filter_width : float
+            the frequency width to filter
+        """
+        self._filters[FiltersOp.KARAOKE] = {
+            "level": level,
+            "monoLevel": mono_level,
+            "filterBand": filter_band,
+            "filterWidth": filter_width,
+        }
+
+    def timescale(self, speed: float = 1.0, pitch: float = 1.0, rate: float = 1.0):
+        """
+        Changes the speed, pitch, and rate. All default to 1.
+
+        Parameters
+        ----------
+        speed : float
+            Should be >= 0
+        pitch : float
+            Should be >= 0
+        rate : float
+            Should be >= 0
+        """
+        self._filters[FiltersOp.TIMESCALE] = {"speed": speed, "pitch": pitch, "rate": rate}
+
+    def tremolo(self, frequency: float = 2.0, depth: float = 0.5):
+        """
+        Uses amplification to create a shuddering effect, where the volume quickly oscillates.
+
+        Parameters
+        ----------
+        frequency : float
+            Should be >= 0
+        depth : float
+            0 < x ≤ 1
+        """
+        if not (0 < depth <= 1):
+            raise ValueError("Depth must be 0 < x ≤ 1")
+
+        if frequency <= 0:
+            raise ValueError("Frequency must be greater than 0")
+
+        self._filters[FiltersOp.TREMOLO] = {"frequency": frequency, "depth": depth}
+
+    def vibrato(self, frequency: float = 2.0, depth: float = 0.5):
+        """
+        Similar to tremolo. While tremolo oscillates the volume, vibrato oscillates the pitch.
+
+        Parameters
+        ----------
+        frequency : float
+             0 < x ≤ 14
+        depth : float
+            0 < x ≤ 1
+        """
+        if not (0 < depth <= 1):
+            raise ValueError("Depth must be 0 < x ≤ 1")
+
+        if not (0 < frequency <= 14):
+            raise ValueError("Frequency must be 0 < x ≤ 14")
+
+        self._filters[FiltersOp.VIBRATO] = {"frequency": frequency, "depth": depth}
+
+    def rotation(self, rotation: int = 0):
+        """
+        Rotates the sound around the stereo channels/user headphones aka Audio Panning.
+
+        Parameters
+        ----------
+        rotation : int
+            The frequency of the audio rotating around the listener in Hz
+        """
+        self._filters[FiltersOp.ROTATION] = {"rotation": rotation}
+
+    def distortion(self, sin_offset: float = 0, sin_scale: float = 1, cos_offset: float = 0, cos_scale: float = 1,
+                   tan_offset: float = 0, tan_scale: float = 1, offset: float = 0, scale: float = 1):
+        """
+        Distortion effect
+
+        Parameters
+        ----------
+        sin_offset : float
+        sin_scale : float
+        cos_offset : float
+        cos_scale : float
+        tan_offset : float
+        tan_scale : float
+        offset : float
+        scale : float
+        """
+        self._filters[FiltersOp.DISTORTION] = {
+            "sinOffset": sin_offset,
+            "sinScale": sin_scale,
+            "cosOffset": cos_offset,
+            "cosScale": cos_scale,
+            "tanOffset": tan_offset,
+            "tanScale": tan_scale,
+            "offset": offset,
+            "scale": scale,
+        }
+
+    def channel_mix(self, left_to_left: float = 1.0, left_to_right: float = 0.0, right_to_left: float = 0.0,
+                    right_to_right: float = 1.0):
+        """
+        Mixes both channels (left and right), with a configurable factor on how much each channel affects the other.
+
+        Parameters
+        ----------
+        left_to_left : float
+        left_to_right : float
+        right_to_left : float
+        right_to_right : float
+        """
+        self._filters[FiltersOp.CHANNEL_MIX] = {
+            "leftToLeft": left_to_left,
+            "leftToRight": left_to_right,
+            "rightToLeft": right_to_left,
+            "rightToRight": right_to_right,
+        }
+
+    def low_pass(self, smoothing: float = 20.0):
+        """
+        Higher frequencies get suppressed, while lower frequencies pass through this filter.
+
+        Parameters
+        ----------
+        smoothing : float
+            how much to suppress
+        """
+        self._filters[FiltersOp.LOW_PASS] = {"smoothing": smoothing}
@@ -1,11 +1,14 @@
 import asyncio
 from asyncio import BaseEventLoop
-from typing import Optional, Tuple
+from typing import Hashable, Optional, Tuple
 
 import discord
 from discord.ext.commands import Bot
 
-from . import enums, log, node, player
+from . import enums, log, node, player, queue
+from .autocomplete import track_index
+from .query import analyze_query
+from .rest_api import HedgePolicy, LoadResult, Track
 from .utils import Coroutine
 
 __all__ = [
@@ -13,6 +16,8 @@ __all__ = [
     "add_node",
     "connect",
     "get_player",
+    "load_tracks",
+    "autocomplete",
     "close",
     "register_event_listener",
     "unregister_event_listener",
@@ -20,6 +25,9 @@ __all__ = [
     "unregister_update_listener",
     "register_stats_listener",
     "unregister_stats_listener",
+    "register_prefetch_listener",
+    "unregister_prefetch_listener",
+    "set_history_limit",
     "all_players",
     "all_connected_players",
     "active_players",
@@ -64,6 +72,7 @@ async def add_node(
         timeout: int = 30,
         resume_key: Optional[str] = None,
         resume_timeout: int = 60,
+        rest_concurrency: int = 8,
 ):
     """
     Create and initialize a new node
@@ -88,6 +97,8 @@ async def add_node(
         A resume key used for resuming a session upon re-establishing a WebSocket connection to Lavalink.
     resume_timeout : int
         How long the node should wait for a connection while disconnected before clearing all players.
+    rest_concurrency : int
+        The maximum number of concurrent REST requests made to the node.
     """
     lavalink_node = node.Node(
         _loop=_loop,
@@ -100,6 +111,7 @@ async def add_node(
         resume_key=resume_key,
         resume_timeout=resume_timeout,
         bot=bot,
+        rest_concurrency=rest_concurrency,
     )
 
     await lavalink_node.connect(timeout=timeout)
@@ -153,6 +165,74 @@ def get_player(guild_id: int) -> player.Player:
     return node_.get_player(guild_id)
 
 
+async def load_tracks(
+        query: str,
+        priority: enums.RequestPriority = enums.RequestPriority.INTERACTIVE,
+        hedge: Optional[HedgePolicy] = None,
+) -> LoadResult:
+    """
+    Executes a loadtracks request on the least busy ready node,
+    avoiding the nodes where the source of the query is failing.
+
+    Unlike :py:meth:`Player.load_tracks`, it doesn't need a player connected to a voice channel,
+    so it can be used to search tracks, for example for autocomplete.
+
+    Parameters
+    ----------
+    query : str
+    priority : RequestPriority
+        The priority of the request in the node scheduler
+    hedge : Optional[HedgePolicy]
+        If set, the request is repeated on another node when the chosen one is slow
+
+    Returns
+    -------
+    LoadResult
+
+    Raises
+    ------
+    IndexError
+        If there are no ready lavalink nodes.
+    """
+    node_ = node.get_load_node(analyze_query(query).source)
+    return await node_.rest.load_tracks(query, priority, hedge)
+
+
+async def autocomplete(
+        query: str,
+        limit: int = 25,
+        min_results: int = 5,
+        debounce: float = 0.3,
+        key: Optional[Hashable] = None,
+) -> list[Track]:
+    """
+    Autocomplete a search query, for example for a slash command option.
+
+    The titles and authors of the recently loaded tracks are looked up first,
+    which takes microseconds. Only when there are too few hits a YouTube search is made with
+    :py:func:`load_tracks`, after waiting ``debounce`` seconds for a newer call with the same ``key``.
+
+    Parameters
+    ----------
+    query : str
+    limit : int
+        The maximum number of tracks to return
+    min_results : int
+        The minimum number of local hits needed to skip the search
+    debounce : float
+        How many seconds to wait for a newer call before searching
+    key : Optional[Hashable]
+        Identifies who is typing, for example the user ID
+
+    Returns
+    -------
+    list[Track]
+    """
+    return await track_index.complete(
+        query, load_tracks, limit=limit, min_results=min_results, debounce=debounce, key=key
+    )
+
+
 async def _on_guild_remove(guild: discord.Guild):
     try:
         p = get_player(guild.id)
@@ -182,6 +262,10 @@ def register_event_listener(coro: Coroutine):
     If the second argument is :py:attr:`LavalinkEvents.TRACK_START`, the extra will be
     a track identifier string.
 
+    If the second argument is :py:attr:`LavalinkEvents.QUEUE_UPDATE`, the extra will be
+    a :py:class:`QueueChange` describing how the queue changed, so the queue can be
+    patched instead of read again.
+
     If the second argument is any other value, the third argument will not exist.
 
     Parameters
@@ -236,6 +320,8 @@ def _get_event_args(data: enums.LavalinkEvents, raw_data: dict):
         extra = raw_data.get("thresholdMs")
     elif data == enums.LavalinkEvents.TRACK_START:
         extra = raw_data.get("track")
+    elif data == enums.LavalinkEvents.QUEUE_UPDATE:
+        extra = raw_data.get("change")
     elif data == enums.LavalinkEvents.WEBSOCKET_CLOSED:
         extra = {
             "code": raw_data.get("code"),
@@ -353,6 +439,63 @@ def unregister_stats_listener(coro: Coroutine):
         pass
 
 
+def register_prefetch_listener(coro: Coroutine):
+    """
+    Registers a coroutine to prepare the upcoming tracks of the players.
+
+    This coroutine will accept two arguments: an instance of :py:class:`Player`
+    and the :py:class:`Track` that is going to be played soon.
+    It's called in background, without blocking the playback, for the first
+    :py:attr:`Player.prefetch_depth` tracks of the queue. It can be used for example
+    to fetch thumbnails or related tracks before they are needed.
+
+    Parameters
+    ----------
+    coro : :ref:`coroutine <coroutine>`
+
+    Raises
+    ------
+    TypeError
+        If ``coro`` is not a coroutine.
+    """
+    if not asyncio.iscoroutinefunction(coro):
+        raise TypeError("Function is not a coroutine.")
+
+    if coro not in player._prefetch_listeners:
+        player._prefetch_listeners.append(coro)
+
+
+def unregister_prefetch_listener(coro: Coroutine):
+    """
+    Unregisters coroutines from being prefetch listeners.
+
+    Parameters
+    ----------
+    coro : :ref:`coroutine <coroutine>`
+    """
+    try:
+        player._prefetch_listeners.remove(coro)
+    except ValueError:
+        pass
+
+
+def set_history_limit(limit: int):
+    """
+    Sets the maximum number of tracks kept in the histories of all the players together.
+
+    When it's reached, the oldest tracks are dropped first, whatever player they belong to.
+
+    Parameters
+    ----------
+    limit : int
+        The maximum number of tracks, 10000 by default
+    """
+    if limit < 0:
+        raise ValueError("limit can't be negative")
+    queue._history_budget.limit = limit
+    queue._history_budget.trim()
+
+
 def dispatch(op: enums.LavalinkIncomingOp, data, raw_data: dict):
     listeners = []
     args = []
@@ -0,0 +1,261 @@
+from __future__ import annotations
+
+import math
+import time
+from bisect import bisect_left
+from collections import deque
+from typing import Optional, Sequence
+
+__all__ = ["LatencyWindow", "LatencyHistogram", "SourceHealth"]
+
+
+class LatencyWindow:
+    """
+    Keeps the most recent latency samples to compute statistics over them.
+
+    Attributes
+    ----------
+    count : int
+        The number of samples recorded since the creation
+    total : float
+        The sum of all the samples recorded since the creation, in seconds
+    max : float
+        The highest sample recorded since the creation, in seconds
+    """
+    count: int
+    total: float
+    max: float
+
+    def __init__(self, size: int = 512):
+        """
+        Parameters
+        ----------
+        size : int
+            How many recent samples to keep for the percentiles
+        """
+        self._samples: deque[float] = deque(maxlen=size)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def __repr__(self) -> str:
+        return (
+            "<LatencyWindow: "
+            f"count={self.count}, "
+            f"mean={self.mean:.4f}, "
+            f"max={self.max:.4f}>"
+        )
+
+    def record(self, seconds: float):
+        """
+        Add a new sample
+
+        Parameters
+        ----------
+        seconds : float
+        """
+        self._samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    @property
+    def mean(self) -> float:
+        """The mean of all the samples, in seconds"""
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, percentile: float) -> Optional[float]:
+        """
+        Compute a percentile over the recent samples
+
+        Parameters
+        ----------
+        percentile : float
+            0 ≤ x ≤ 100
+
+        Returns
+        -------
+        Optional[float]
+            The percentile in seconds, ``None`` if there are no samples
+        """
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        index = max(0, math.ceil(percentile / 100 * len(ordered)) - 1)
+        return ordered[min(index, len(ordered) - 1)]
+
+
+class LatencyHistogram:
+    """
+    Counts latency samples in buckets, with constant memory and time per sample.
+
+    By default the buckets double in size, from 0.25 ms to about 4 seconds, and the last
+    one counts the higher samples.
+
+    Attributes
+    ----------
+    bounds : tuple[float, ...]
+        The upper bound of each bucket but the last one, in seconds
+    count : int
+        The number of samples recorded since the creation
+    total : float
+        The sum of all the samples recorded since the creation, in seconds
+    max : float
+        The highest sample recorded since the creation, in seconds
+    """
+    bounds: tuple[float, ...]
+    count: int
+    total: float
+    max: float
+
+    def __init__(self, bounds: Optional[Sequence[float]] = None):
+        """
+        Parameters
+        ----------
+        bounds : Optional[Sequence[float]]
+            The ascending upper bounds of the buckets, in seconds
+        """
+        if bounds is None:
+            bounds = [0.00025 * 2 ** i for i in range(15)]
+        self.bounds = tuple(bounds)
+        self._counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def __repr__(self) -> str:
+        return (
+            "<LatencyHistogram: "
+            f"count={self.count}, "
+            f"mean={self.mean:.4f}, "
+            f"max={self.max:.4f}>"
+        )
+
+    def record(self, seconds: float):
+        """
+        Add a new sample
+
+        Parameters
+        ----------
+        seconds : float
+        """
+        self._counts[bisect_left(self.bounds, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    @property
+    def mean(self) -> float:
+        """The mean of all the samples, in seconds"""
+        return self.total / self.count if self.count else 0.0
+
+    def buckets(self) -> list[tuple[float, int]]:
+        """
+        The upper bound and the number of samples of each bucket
+
+        Returns
+        -------
+        list[tuple[float, int]]
+            The bound of the last bucket is infinite
+        """
+        return list(zip(self.bounds + (math.inf,), self._counts))
+
+    def percentile(self, percentile: float) -> Optional[float]:
+        """
+        Estimate a percentile as the upper bound of the bucket containing it
+
+        Parameters
+        ----------
+        percentile : float
+            0 ≤ x ≤ 100
+
+        Returns
+        -------
+        Optional[float]
+            The percentile in seconds, the highest sample if it's in the last bucket,
+            ``None`` if there are no samples
+        """
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(percentile / 100 * self.count))
+        seen = 0
+        for bound, count in zip(self.bounds, self._counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+
+class SourceHealth:
+    """
+    Tracks the outcome of the loads of each audio source on a node.
+
+    A source becomes unhealthy after ``threshold`` consecutive failed loads.
+    After ``cooldown`` seconds it's considered healthy again, so the next load probes it:
+    a success resets the failures while another failure restarts the cooldown.
+
+    Attributes
+    ----------
+    threshold : int
+        The consecutive failures needed to mark a source as unhealthy
+    cooldown : float
+        How long an unhealthy source is avoided, in seconds
+    """
+    threshold: int
+    cooldown: float
+
+    def __init__(self, threshold: int = 3, cooldown: float = 60.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._failures: dict[str, int] = {}
+        self._last_failure: dict[str, float] = {}
+
+    def __repr__(self) -> str:
+        return f"<SourceHealth: failures={self._failures}>"
+
+    def record_success(self, source: str):
+        """
+        Reset the failures of a source after a successful load
+
+        Parameters
+        ----------
+        source : str
+        """
+        self._failures.pop(source, None)
+        self._last_failure.pop(source, None)
+
+    def record_failure(self, source: str):
+        """
+        Count a failed load of a source
+
+        Parameters
+        ----------
+        source : str
+        """
+        self._failures[source] = self._failures.get(source, 0) + 1
+        self._last_failure[source] = time.monotonic()
+
+    def failures(self, source: str) -> int:
+        """The consecutive failed loads of a source"""
+        return self._failures.get(source, 0)
+
+    def is_healthy(self, source: str) -> bool:
+        """
+        Check if loads from a source are expected to work
+
+        Parameters
+        ----------
+        source : str
+
+        Returns
+        -------
+        bool
+        """
+        if self._failures.get(source, 0) < self.threshold:
+            return True
+        return time.monotonic() - self._last_failure[source] >= self.cooldown
@@ -3,6 +3,7 @@ from __future__ import annotations
 import asyncio
 import secrets
 import string
+import time
 import typing
 from collections import deque
 from typing import KeysView, Optional, ValuesView, Union, Any
@@ -12,16 +13,55 @@ from discord.backoff import ExponentialBackoff
 from discord.ext.commands import Bot
 
 from . import log, ws_ll_log, ws_rll_log
-from .enums import LavalinkEvents, LavalinkIncomingOp, LavalinkOutgoingOp, NodeState, PlayerState, FiltersOp
+from .enums import (
+    ExceptionSeverity, LavalinkEvents, LavalinkIncomingOp, LavalinkOutgoingOp, NodeState, PlayerState,
+    TrackEndReason
+)
+from .filters import FilterState
 from .player import Player
-from .rest_api import Track
+from .rest_api import RESTClient, Track
+from .metrics import LatencyHistogram, LatencyWindow, SourceHealth
+from .scheduler import RESTScheduler
 from .tuples import *
 from .utils import VoiceChannel
 
-__all__ = ["Node", "NodeStats", "get_node", "get_nodes_stats", "Stats"]
+__all__ = ["Node", "NodeStats", "get_node", "get_load_node", "get_nodes_stats", "Stats"]
 
 _nodes: list[Node] = []
 
+# The minimum interval between two routeplanner checks triggered by failed loads, in seconds
+_ROUTEPLANNER_CHECK_INTERVAL = 30.0
+# The sources whose requests are made through the routeplanner
+_ROUTEPLANNER_SOURCES = frozenset({"youtube"})
+
+# Lavalink v4 serves the websocket only on its versioned path
+_V4_WEBSOCKET_PATH = "/v4/websocket"
+
+_V4_END_REASONS = {
+    "finished": "FINISHED",
+    "loadFailed": "LOAD_FAILED",
+    "stopped": "STOPPED",
+    "replaced": "REPLACED",
+    "cleanup": "CLEANUP",
+}
+_V4_SEVERITIES = {"common": "COMMON", "suspicious": "SUSPICIOUS", "fault": "FATAL"}
+
+
+def _normalize_v4_event(data: dict[str, Any]) -> dict[str, Any]:
+    """Convert the fields of a Lavalink v4 event to the v3 format used by the dispatcher"""
+    data = dict(data)
+    if "reason" in data:
+        data["reason"] = _V4_END_REASONS.get(data["reason"], data["reason"])
+    if isinstance(data.get("track"), dict):
+        data["track"] = data["track"].get("encoded")
+    exception = data.get("exception")
+    if isinstance(exception, dict) and "severity" in exception:
+        data["exception"] = {
+            **exception,
+            "severity": _V4_SEVERITIES.get(exception["severity"], exception["severity"]),
+        }
+    return data
+
 
 # Originally Added in: https://github.com/PythonistaGuild/Wavelink/pull/66
 class _Key:
@@ -155,7 +195,7 @@ class NodeStats:
         self.system_load: float = cpu["systemLoad"]
         self.lavalink_load: float = cpu["lavalinkLoad"]
 
-        frame_stats: Optional[dict[str, int]] = data.get("frameStats", {})
+        frame_stats: dict[str, int] = data.get("frameStats") or {}
         self.frames_sent: int = frame_stats.get("sent", -1)
         self.frames_nulled: int = frame_stats.get("nulled", -1)
         self.frames_deficit: int = frame_stats.get("deficit", -1)
@@ -187,6 +227,7 @@ class Node:
             resume_key: Optional[str] = None,
             resume_timeout: int = 60,
             bot: Optional[Bot] = None,
+            rest_concurrency: int = 8,
     ):
         """
         Represents a Lavalink node.
@@ -213,6 +254,8 @@ class Node:
             How long the node should wait for a connection while disconnected before clearing all players.
         bot: discord.ext.commands.Bot
             The Bot object that's connect to discord.
+        rest_concurrency : int
+            The maximum number of concurrent REST requests made to the node.
         """
         self.loop = _loop
         self.bot = bot
@@ -229,12 +272,31 @@ class Node:
         self.user_id = user_id
 
         self._ready_event = asyncio.Event()
+        self._session_ready = asyncio.Event()
 
         self._ws = None
+        self._ws_path = ""
+        self._ssl = False
+        self._major_version: Optional[str] = None
+        self.session_id: Optional[str] = None
         self._listener_task = None
         self.session = aiohttp.ClientSession()
+        self.rest_scheduler = RESTScheduler(rest_concurrency)
+        self.rest_latency = LatencyWindow()
+        # From the reception of a TRACK_END with reason FINISHED to the sending of the next track
+        self.transition_latency = LatencyHistogram()
+        self._track_ends: dict[int, float] = {}
+        self._pending_loads: dict[str, asyncio.Future] = {}
+        # Used to make REST requests without a player
+        self.rest = RESTClient(node=self)
+        self.source_health = SourceHealth()
+        self.routeplanner: Optional[RoutePlannerStatus] = None
+        self._routeplanner_checked = 0.0
+        self._routeplanner_task: Optional[asyncio.Task] = None
 
         self._queue = deque()
+        # The player updates made on Lavalink v4 before the session is ready
+        self._pending_updates: deque[tuple[int, dict[str, Any], bool]] = deque()
         self._players_dict = {}
 
         self.state = NodeState.CONNECTING
@@ -305,11 +367,12 @@ class Node:
             If the websocket failed to connect after the given time.
         """
         self._is_shutdown = False
+        self._ssl = ssl
 
         if ssl:
-            uri = f"wss://{self.host}:{self.port}"
+            uri = f"wss://{self.host}:{self.port}{self._ws_path}"
         else:
-            uri = f"ws://{self.host}:{self.port}"
+            uri = f"ws://{self.host}:{self.port}{self._ws_path}"
 
         ws_ll_log.info("Lavalink WS connecting to %s with headers %s", uri, self.headers)
 
@@ -319,11 +382,15 @@ class Node:
         if self._listener_task is not None:
             self._listener_task.cancel()
         self._listener_task = self.loop.create_task(self.listener())
+        if self.api_version >= 4:
+            # The REST player API can't be used before the session ID is received
+            await asyncio.wait_for(self._session_ready.wait(), timeout or 30)
         self.loop.create_task(self._configure_resume())
         if self._queue:
             for data in self._queue:
                 await self.send(data)
             self._queue.clear()
+        await self._send_pending_updates()
         self._ready_event.set()
         self.update_state(NodeState.READY)
         ws_ll_log.info("Lavalink WS connected to %s", uri)
@@ -332,13 +399,20 @@ class Node:
         if self._resuming_configured:
             return
         if self._resume_key and self._resume_timeout and self._resume_timeout > 0:
-            await self.send(
-                dict(
-                    op="configureResuming",
-                    key=str(self._resume_key),
-                    timeout=self._resume_timeout,
+            if self.api_version >= 4:
+                await self._rest_request(
+                    "PATCH",
+                    f"/v4/sessions/{self.session_id}",
+                    json={"resuming": True, "timeout": self._resume_timeout},
+                )
+            else:
+                await self.send(
+                    dict(
+                        op="configureResuming",
+                        key=str(self._resume_key),
+                        timeout=self._resume_timeout,
+                    )
                 )
-            )
             self._resuming_configured = True
             ws_ll_log.debug("Server Resuming has been configured.")
 
@@ -354,6 +428,8 @@ class Node:
         }
         if self._resume_key:
             headers["Resume-Key"] = str(self._resume_key)
+        if self._ws_path == _V4_WEBSOCKET_PATH and self.session_id is not None:
+            headers["Session-Id"] = self.session_id
         return headers
 
     @property
@@ -363,7 +439,29 @@ class Node:
         """
         if not self.ready:
             raise RuntimeError("Node not ready!")
-        return self._ws.response_headers.get("Lavalink-Major-Version")
+        return self._major_version
+
+    @property
+    def api_version(self) -> int:
+        """
+        The major version of the Lavalink API used with the node.
+
+        From version 4 the players are controlled with the REST API instead of websocket ops.
+        Until the node is connected, version 3 is assumed.
+        """
+        try:
+            return int(self._major_version)
+        except (TypeError, ValueError):
+            return 4 if self._ws_path == _V4_WEBSOCKET_PATH else 3
+
+    @property
+    def rest_uri(self) -> str:
+        """
+        The base URI of the REST API of the node
+        """
+        if self._ssl:
+            return f"https://{self.host}:{self.port}"
+        return f"http://{self.host}:{self.port}"
 
     @property
     def ready(self) -> bool:
@@ -389,10 +487,16 @@ class Node:
                 attempt += 1
                 if attempt > 5:
                     raise asyncio.TimeoutError
-            except aiohttp.WSServerHandshakeError:
+            except aiohttp.WSServerHandshakeError as exc:
+                if exc.status == 404 and self._ws_path != _V4_WEBSOCKET_PATH:
+                    self._ws_path = _V4_WEBSOCKET_PATH
+                    uri += _V4_WEBSOCKET_PATH
+                    ws_ll_log.info("Legacy websocket not found, connecting to %s", uri)
+                    continue
                 ws_ll_log.error("Failed connect WSServerHandshakeError")
                 raise asyncio.TimeoutError
             else:
+                self._major_version = ws._response.headers.get("Lavalink-Major-Version")
                 self.session_resumed = ws._response.headers.get("Session-Resumed", False)
                 if self._ws is not None and self.session_resumed:
                     ws_ll_log.info("WEBSOCKET Resumed Session with key: %s", self._resume_key)
@@ -405,6 +509,7 @@ class Node:
         """
         while self._is_shutdown is False:
             msg = await self._ws.receive()
+            received = time.perf_counter()
             if msg.type in self._closers:
                 if self._resuming_configured:
                     if self.state != NodeState.RECONNECTING:
@@ -423,7 +528,7 @@ class Node:
                     ws_ll_log.info("[NODE] | Received unknown op: %s", data)
                 else:
                     ws_ll_log.debug("[NODE] | Received known op: %s", data)
-                    self.loop.create_task(self._handle_op(op, data))
+                    self.loop.create_task(self._handle_op(op, data, received))
             elif msg.type == aiohttp.WSMsgType.ERROR:
                 exc = self._ws.exception()
                 ws_ll_log.info("[NODE] | Exception in WebSocket!", exc_info=exc)
@@ -441,14 +546,26 @@ class Node:
             self.update_state(NodeState.RECONNECTING)
             self.loop.create_task(self._reconnect())
 
-    async def _handle_op(self, op: LavalinkIncomingOp, data: dict[str, Any]):
+    async def _handle_op(self, op: LavalinkIncomingOp, data: dict[str, Any], received: Optional[float] = None):
         if op == LavalinkIncomingOp.EVENT:
             try:
                 event = LavalinkEvents(data.get("type"))
             except ValueError:
                 ws_ll_log.info("Unknown event type: %s", data)
             else:
+                if self.api_version >= 4:
+                    data = _normalize_v4_event(data)
+                if event == LavalinkEvents.TRACK_END and data.get("reason") == TrackEndReason.FINISHED.value:
+                    guild_id = int(data["guildId"])
+                    self._track_ends[guild_id] = received if received is not None else time.perf_counter()
+                    await self._fast_transition(guild_id)
                 self.event_handler(op, event, data)
+        elif op == LavalinkIncomingOp.READY:
+            self.session_id = data.get("sessionId")
+            self.session_resumed = data.get("resumed", False)
+            if self.session_resumed:
+                ws_ll_log.info("WEBSOCKET Resumed Session: %s", self.session_id)
+            self._session_ready.set()
         elif op == LavalinkIncomingOp.PLAYER_UPDATE:
             state = data.get("state", {})
             state = PositionTime(position=state.get("position", 0), time=state.get("time", 0),
@@ -469,6 +586,7 @@ class Node:
 
     async def _reconnect(self):
         self._ready_event.clear()
+        self._session_ready.clear()
 
         if self._is_shutdown is True:
             ws_ll_log.info("[NODE] | Shutting down Lavalink WS.")
@@ -636,7 +754,13 @@ class Node:
         self.update_state(NodeState.DISCONNECTING)
 
         if self._resuming_configured:
-            await self.send(dict(op="configureResuming", key=None))
+            if self.api_version >= 4:
+                try:
+                    await self._rest_request("PATCH", f"/v4/sessions/{self.session_id}", json={"resuming": False})
+                except aiohttp.ClientError:
+                    ws_ll_log.debug("[NODE] | Failed to disable resuming on %s", self.host)
+            else:
+                await self.send(dict(op="configureResuming", key=None))
         self._resuming_configured = False
 
         for p in tuple(self.players):
@@ -663,7 +787,204 @@ class Node:
             ws_ll_log.debug("Sending data to Lavalink: %s", data)
             await self._ws.send_json(data)
 
+    async def _rest_request(
+            self, method: str, path: str, json: Any = None, params: Optional[dict[str, str]] = None
+    ) -> Any:
+        """
+        Make a request to the REST API of the node
+
+        Raises
+        ------
+        aiohttp.ClientResponseError
+            If the node answered with an error status
+        """
+        headers = {"Authorization": self.password}
+        async with self.session.request(
+                method, self.rest_uri + path, json=json, params=params, headers=headers
+        ) as resp:
+            if resp.status >= 400:
+                ws_ll_log.warning(
+                    "[NODE] | %s %s failed with status %s: %s", method, path, resp.status, await resp.text()
+                )
+            resp.raise_for_status()
+            if resp.status == 204:
+                return None
+            return await resp.json(content_type=None)
+
+    def _api_path(self, path: str) -> str:
+        return f"/v4{path}" if self.api_version >= 4 else path
+
+    async def routeplanner_status(self) -> Optional[RoutePlannerStatus]:
+        """
+        Get the status of the routeplanner of the node. The result is also stored in :attr:`routeplanner`.
+
+        Returns
+        -------
+        Optional[RoutePlannerStatus]
+            ``None`` if the routeplanner is not enabled on the node
+
+        Raises
+        ------
+        aiohttp.ClientResponseError
+            If the node answered with an error status
+        """
+        data = await self._rest_request("GET", self._api_path("/routeplanner/status"))
+        self._routeplanner_checked = time.monotonic()
+        if not data or data.get("class") is None:
+            self.routeplanner = None
+            return None
+
+        details = data.get("details") or {}
+        ip_block = details.get("ipBlock") or {}
+        self.routeplanner = RoutePlannerStatus(
+            class_name=data["class"],
+            ip_block_type=ip_block.get("type"),
+            # The size is sent as a string, since IPv6 blocks don't fit in a long
+            ip_block_size=int(ip_block.get("size") or 0),
+            failing_addresses=tuple(
+                address["failingAddress"] for address in details.get("failingAddresses", [])
+            ),
+        )
+        return self.routeplanner
+
+    async def routeplanner_free_address(self, address: str):
+        """
+        Unmark a failing address of the routeplanner, so it's used again
+
+        Parameters
+        ----------
+        address : str
+        """
+        await self._rest_request("POST", self._api_path("/routeplanner/free/address"), json={"address": address})
+        if self.routeplanner is not None:
+            self.routeplanner = self.routeplanner._replace(
+                failing_addresses=tuple(a for a in self.routeplanner.failing_addresses if a != address)
+            )
+
+    async def routeplanner_free_all(self):
+        """
+        Unmark all the failing addresses of the routeplanner
+        """
+        await self._rest_request("POST", self._api_path("/routeplanner/free/all"))
+        if self.routeplanner is not None:
+            self.routeplanner = self.routeplanner._replace(failing_addresses=())
+
+    def is_source_available(self, source: Optional[str]) -> bool:
+        """
+        Check if the node is expected to load tracks from a source.
+
+        A source is unavailable if its recent loads failed, or if it uses the routeplanner
+        and all the addresses of the IP block are marked as failing.
+
+        Parameters
+        ----------
+        source : Optional[str]
+            The source name, ``None`` if unknown
+
+        Returns
+        -------
+        bool
+        """
+        if source is None:
+            return True
+        if source in _ROUTEPLANNER_SOURCES and self.routeplanner is not None and self.routeplanner.exhausted:
+            return False
+        return self.source_health.is_healthy(source)
+
+    def record_load(self, source: Optional[str], failed: bool, severity: Optional[ExceptionSeverity] = None):
+        """
+        Update the health of a source with the outcome of a load.
+
+        Only the suspicious and fatal failures count against the source. The common ones,
+        like an unavailable video, only count when the routeplanner is exhausted.
+        After a failure of a routeplanner source, its status is refreshed in the background.
+
+        Parameters
+        ----------
+        source : Optional[str]
+        failed : bool
+        severity : Optional[ExceptionSeverity]
+            The severity of the failure
+        """
+        if source is None:
+            return
+        if not failed:
+            self.source_health.record_success(source)
+            return
+
+        routed = source in _ROUTEPLANNER_SOURCES
+        if severity in (ExceptionSeverity.SUSPICIOUS, ExceptionSeverity.FATAL) or (
+                routed and self.routeplanner is not None and self.routeplanner.exhausted
+        ):
+            self.source_health.record_failure(source)
+        if (
+                routed
+                and (self._routeplanner_task is None or self._routeplanner_task.done())
+                and time.monotonic() - self._routeplanner_checked >= _ROUTEPLANNER_CHECK_INTERVAL
+        ):
+            self._routeplanner_checked = time.monotonic()
+            self._routeplanner_task = self.loop.create_task(self._check_routeplanner())
+
+    async def _check_routeplanner(self):
+        try:
+            status = await self.routeplanner_status()
+        except aiohttp.ClientError:
+            ws_ll_log.debug("[NODE] | Failed to get the routeplanner status of %s", self.host)
+            return
+        if status is not None and status.exhausted:
+            ws_ll_log.warning(
+                "[NODE] | All the %s addresses of the routeplanner of %s are failing",
+                status.ip_block_size,
+                self.host,
+            )
+
+    async def update_player(self, guild_id: int, payload: dict[str, Any], no_replace: bool = False):
+        """
+        Update many fields of a player in a single request. Only works on Lavalink v4.
+
+        The updates made while the session isn't ready, during a connection or a reconnection,
+        are sent once it's ready.
+
+        Parameters
+        ----------
+        guild_id : int
+        payload : dict[str, Any]
+            The fields to update, as described by the Lavalink REST API
+        no_replace : bool
+            If set to true, a new track doesn't replace the one currently playing
+        """
+        if self.session_id is None or not self._session_ready.is_set():
+            # Like the websocket ops, they are sent once the node is connected
+            self._pending_updates.append((guild_id, payload, no_replace))
+            return
+        try:
+            await self._rest_request(
+                "PATCH",
+                f"/v4/sessions/{self.session_id}/players/{guild_id}",
+                json=payload,
+                params={"noReplace": "true" if no_replace else "false"},
+            )
+        except aiohttp.ClientResponseError:
+            # The errors are logged by _rest_request, like the websocket ops they don't propagate
+            pass
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            ws_ll_log.warning(
+                "[NODE] | Failed to update the player of guild %s on %s", guild_id, self.host, exc_info=True
+            )
+
+    async def _send_pending_updates(self):
+        # The updates are queued again if the session is lost meanwhile, they wait for the next one
+        pending, self._pending_updates = self._pending_updates, deque()
+        for update in pending:
+            await self.update_player(*update)
+
     async def send_lavalink_voice_update(self, guild_id, session_id, event):
+        if self.api_version >= 4:
+            await self.update_player(
+                guild_id,
+                {"voice": {"token": event["token"], "endpoint": event["endpoint"], "sessionId": session_id}},
+            )
+            return
         await self.send(
             {
                 "op": LavalinkOutgoingOp.VOICE_UPDATE.value,
@@ -681,9 +1002,63 @@ class Node:
         ----------
         guild_id : int
         """
+        if self.api_version >= 4:
+            # The updates waiting for the session would create the player again
+            self._pending_updates = deque(update for update in self._pending_updates if update[0] != guild_id)
+            if self.session_id is not None:
+                try:
+                    await self._rest_request("DELETE", f"/v4/sessions/{self.session_id}/players/{guild_id}")
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    pass
+            return
         await self.send({"op": LavalinkOutgoingOp.DESTROY.value, "guildId": str(guild_id)})
 
+    async def _fast_transition(self, guild_id: int):
+        """Start the next track of a player with its pre-built payload, before dispatching the event"""
+        player = self._players_dict.get(guild_id)
+        if player is None:
+            # No track is played next, there is no transition to measure
+            self._track_ends.pop(guild_id, None)
+            return
+        payload = player._fast_advance()
+        if payload is None:
+            return
+        try:
+            await self._send_play(guild_id, payload)
+        except Exception:
+            ws_ll_log.exception("[NODE] | Failed to start the next track of %r.", player)
+
+    def _play_payload(
+            self, guild_id: int, track: Track, replace: bool = True, start: int = 0, pause: bool = False
+    ) -> dict[str, Any]:
+        """Build the op, or the REST payload on Lavalink v4, that plays a track"""
+        if self.api_version >= 4:
+            return {"encodedTrack": track.track_identifier, "position": start, "paused": pause}
+        return {
+            "op": LavalinkOutgoingOp.PLAY.value,
+            "guildId": str(guild_id),
+            "track": track.track_identifier,
+            "noReplace": not replace,
+            "startTime": str(start),
+            "pause": pause,
+        }
+
+    async def _send_play(self, guild_id: int, payload: dict[str, Any], replace: bool = True):
+        if self.api_version >= 4:
+            # Track, position and pause are applied atomically by a single request
+            await self.update_player(guild_id, payload, no_replace=not replace)
+        else:
+            await self.send(payload)
+        started = self._track_ends.pop(guild_id, None)
+        if started is not None:
+            self.transition_latency.record(time.perf_counter() - started)
+
     async def no_event_stop(self, guild_id: int):
+        # The queue ended, there is no transition to measure
+        self._track_ends.pop(guild_id, None)
+        if self.api_version >= 4:
+            await self.update_player(guild_id, {"encodedTrack": None})
+            return
         await self.send({"op": LavalinkOutgoingOp.STOP.value, "guildId": str(guild_id)})
 
     # Player commands
@@ -708,16 +1083,7 @@ class Node:
             start: int = 0,
             pause: bool = False,
     ):
-        await self.send(
-            {
-                "op": LavalinkOutgoingOp.PLAY.value,
-                "guildId": str(guild_id),
-                "track": track.track_identifier,
-                "noReplace": not replace,
-                "startTime": str(start),
-                "pause": pause,
-            }
-        )
+        await self._send_play(guild_id, self._play_payload(guild_id, track, replace, start, pause), replace)
 
     async def play(
             self,
@@ -757,6 +1123,9 @@ class Node:
         paused : bool
             If set to True pause the track, otherwise unpause it
         """
+        if self.api_version >= 4:
+            await self.update_player(guild_id, {"paused": paused})
+            return
         await self.send(
             {"op": LavalinkOutgoingOp.PAUSE.value, "guildId": str(guild_id), "pause": paused}
         )
@@ -770,6 +1139,9 @@ class Node:
         _volume : int
             Volume may range from 0 to 1000
         """
+        if self.api_version >= 4:
+            await self.update_player(guild_id, {"volume": _volume})
+            return
         await self.send(
             {"op": LavalinkOutgoingOp.VOLUME.value, "guildId": str(guild_id), "volume": _volume}
         )
@@ -784,10 +1156,31 @@ class Node:
         position : int
             The position is in milliseconds.
         """
+        if self.api_version >= 4:
+            await self.update_player(guild_id, {"position": position})
+            return
         await self.send(
             {"op": LavalinkOutgoingOp.SEEK.value, "guildId": str(guild_id), "position": position}
         )
 
+    async def set_filters(self, guild_id: int, filters: dict[str, Any]):
+        """
+        Replace the whole filter set of a player.
+
+        The other filter methods of the node send a single filter, so they remove the
+        filters applied before. Use :attr:`Player.filters` to combine filters.
+
+        Parameters
+        ----------
+        guild_id : int
+        filters : dict[str, Any]
+            The filters, usually built by :meth:`FilterState.payload`
+        """
+        if self.api_version >= 4:
+            await self.update_player(guild_id, {"filters": filters})
+        else:
+            await self.send({"op": LavalinkOutgoingOp.FILTERS.value, "guildId": str(guild_id), **filters})
+
     async def equalizer(self, guild_id: int, bands: list[EqualizerBands]):
         """
         Set the equalizer
@@ -798,13 +1191,9 @@ class Node:
         bands : list[EqualizerBands]
             A list of bands to change
         """
-        await self.send(
-            {
-                "op": LavalinkOutgoingOp.FILTERS.value,
-                "guildId": str(guild_id),
-                FiltersOp.EQUALIZER.value: [{"band": band.band, "gain": band.gain} for band in bands]
-            }
-        )
+        state = FilterState()
+        state.equalizer(bands)
+        await self.set_filters(guild_id, state.payload())
 
     async def karaoke(self, guild_id: int, level: float = 1.0, mono_level: float = 1.0, filter_band: float = 220.0,
                       filter_width: float = 100.0):
@@ -823,18 +1212,9 @@ class Node:
         filter_width : float
             the frequency width to filter
         """
-        await self.send(
-            {
-                "op": LavalinkOutgoingOp.FILTERS.value,
-                "guildId": str(guild_id),
-                FiltersOp.KARAOKE.value: {
-                    "level": level,
-                    "monoLevel": mono_level,
-                    "filterBand": filter_band,
-                    "filterWidth": filter_width
-                }
-            }
-        )
+        state = FilterState()
+        state.karaoke(level, mono_level, filter_band, filter_width)
+        await self.set_filters(guild_id, state.payload())
 
     async def time_scale(self, guild_id: int, speed: float = 1.0, pitch: float = 1.0, rate: float = 1.0):
         """
@@ -850,17 +1230,9 @@ class Node:
         rate : float
             Should be >= 0
         """
-        await self.send(
-            {
-                "op": LavalinkOutgoingOp.FILTERS.value,
-                "guildId": str(guild_id),
-                FiltersOp.TIMESCALE.value: {
-                    "speed": speed,
-                    "pitch": pitch,
-                    "rate": rate,
-                }
-            }
-        )
+        state = FilterState()
+        state.timescale(speed, pitch, rate)
+        await self.set_filters(guild_id, state.payload())
 
     async def tremolo(self, guild_id: int, frequency: float = 2.0, depth: float = 0.5):
         """
@@ -874,22 +1246,9 @@ class Node:
         depth : float
             0 < x ≤ 1
         """
-        if not (0 < depth <= 1):
-            raise ValueError("Depth must be 0 < x ≤ 1")
-
-        if frequency <= 0:
-            raise ValueError("Frequency must be greater than 0")
-
-        await self.send(
-            {
-                "op": LavalinkOutgoingOp.FILTERS.value,
-                "guildId": str(guild_id),
-                FiltersOp.TREMOLO.value: {
-                    "frequency": frequency,
-                    "depth": depth,
-                }
-            }
-        )
+        state = FilterState()
+        state.tremolo(frequency, depth)
+        await self.set_filters(guild_id, state.payload())
 
     async def vibrato(self, guild_id: int, frequency: float = 2.0, depth: float = 0.5):
         """
@@ -903,22 +1262,9 @@ class Node:
         depth : float
             0 < x ≤ 1
         """
-        if not (0 < depth <= 1):
-            raise ValueError("Depth must be 0 < x ≤ 1")
-
-        if not (0 < frequency <= 14):
-            raise ValueError("Frequency must be 0 < x ≤ 14")
-
-        await self.send(
-            {
-                "op": LavalinkOutgoingOp.FILTERS.value,
-                "guildId": str(guild_id),
-                FiltersOp.VIBRATO.value: {
-                    "frequency": frequency,
-                    "depth": depth,
-                }
-            }
-        )
+        state = FilterState()
+        state.vibrato(frequency, depth)
+        await self.set_filters(guild_id, state.payload())
 
     async def rotation(self, guild_id: int, rotation: int = 0):
         """
@@ -931,15 +1277,9 @@ class Node:
         rotation : Optional[int]
             The frequency of the audio rotating around the listener in Hz
         """
-        await self.send(
-            {
-                "op": LavalinkOutgoingOp.FILTERS.value,
-                "guildId": str(guild_id),
-                FiltersOp.ROTATION.value: {
-                    "rotation": rotation,
-                }
-            }
-        )
+        state = FilterState()
+        state.rotation(rotation)
+        await self.set_filters(guild_id, state.payload())
 
     async def distortion(self, guild_id: int, sin_offset: int = 0, sin_scale: int = 1, cos_offset: int = 0,
                          cos_scale: int = 1, tan_offset: int = 0, tan_scale: int = 1, offset: int = 0, scale: int = 1):
@@ -958,22 +1298,9 @@ class Node:
         offset : float
         scale : float
         """
-        await self.send(
-            {
-                "op": LavalinkOutgoingOp.FILTERS.value,
-                "guildId": str(guild_id),
-                FiltersOp.DISTORTION.value: {
-                    "sinOffset": sin_offset,
-                    "sinScale": sin_scale,
-                    "cosOffset": cos_offset,
-                    "cosScale": cos_scale,
-                    "tanOffset": tan_offset,
-                    "tanScale": tan_scale,
-                    "offset": offset,
-                    "scale": scale
-                }
-            }
-        )
+        state = FilterState()
+        state.distortion(sin_offset, sin_scale, cos_offset, cos_scale, tan_offset, tan_scale, offset, scale)
+        await self.set_filters(guild_id, state.payload())
 
     async def channel_mix(self, guild_id: int, left_to_left: float = 1.0, left_to_right: float = 0.0,
                           right_to_left: float = 0.0, right_to_right: float = 1.0):
@@ -989,18 +1316,9 @@ class Node:
         right_to_left : float
         right_to_right : float
         """
-        await self.send(
-            {
-                "op": LavalinkOutgoingOp.FILTERS.value,
-                "guildId": str(guild_id),
-                FiltersOp.CHANNEL_MIX.value: {
-                    "leftToLeft": left_to_left,
-                    "leftToRight": left_to_right,
-                    "rightToLeft": right_to_left,
-                    "rightToRight": right_to_right,
-                }
-            }
-        )
+        state = FilterState()
+        state.channel_mix(left_to_left, left_to_right, right_to_left, right_to_right)
+        await self.set_filters(guild_id, state.payload())
 
     async def low_pass(self, guild_id: int, smoothing: float = 0.0):
         """
@@ -1012,15 +1330,9 @@ class Node:
         smoothing : float
             how much to suppress
         """
-        await self.send(
-            {
-                "op": LavalinkOutgoingOp.FILTERS.value,
-                "guildId": str(guild_id),
-                FiltersOp.LOW_PASS.value: {
-                    "smoothing": smoothing,
-                }
-            }
-        )
+        state = FilterState()
+        state.low_pass(smoothing)
+        await self.set_filters(guild_id, state.payload())
 
     async def reset_filter(self, guild_id: int):
         """
@@ -1030,12 +1342,7 @@ class Node:
         ----------
         guild_id : int
         """
-        await self.send(
-            {
-                "op": LavalinkOutgoingOp.FILTERS.value,
-                "guildId": str(guild_id)
-            }
-        )
+        await self.set_filters(guild_id, {})
 
 
 def get_node(guild_id: int = None, ignore_ready_status: bool = False) -> Node:
@@ -1074,6 +1381,34 @@ def get_node(guild_id: int = None, ignore_ready_status: bool = False) -> Node:
     return least_used
 
 
+def get_load_node(source: Optional[str] = None) -> Node:
+    """
+    Gets the ready node to use for a loadtracks request.
+
+    Nodes that can load tracks from the source are preferred, among them the one
+    with the fewest queued REST requests is returned.
+
+    Parameters
+    ----------
+    source : Optional[str]
+        The source of the query, as found by :func:`analyze_query`
+
+    Returns
+    -------
+    Node
+
+    Raises
+    ------
+    IndexError
+        If there are no ready nodes
+    """
+    ready = [n for n in _nodes if n.ready]
+    if not ready:
+        raise IndexError("No nodes found.")
+    available = [n for n in ready if n.is_source_available(source)] or ready
+    return min(available, key=lambda n: n.rest_scheduler.queue_depth())
+
+
 def get_nodes_stats() -> list[NodeStats]:
     """
     Get the stats of all Nodes
@@ -0,0 +1,397 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Optional, Union
+
+from . import log
+from .queue import FairQueue, TrackQueue
+from .rest_api import PendingTrack, Track
+
+if TYPE_CHECKING:
+    from .player import Player
+
+__all__ = ["QueueJournal"]
+
+
+class _StoredEntry:
+    """A serialized queue entry, with the attributes used by the queues to order it"""
+    __slots__ = ("data", "requester", "track_identifier", "length", "is_stream")
+
+    def __init__(self, data: dict[str, Any]):
+        info = data.get("info") or {}
+        self.data = data
+        self.requester = data.get("requester")
+        self.track_identifier = data.get("track")
+        self.length = info.get("length", 0)
+        self.is_stream = info.get("isStream", False)
+
+
+class _GuildState:
+    __slots__ = ("queue", "current", "position")
+
+    def __init__(self, queue: Union[TrackQueue, FairQueue]):
+        self.queue = queue
+        self.current: Optional[_StoredEntry] = None
+        self.position = 0
+
+
+def _dump_entry(entry: Union[Track, PendingTrack, _StoredEntry]) -> dict[str, Any]:
+    if isinstance(entry, _StoredEntry):
+        return entry.data
+    if isinstance(entry, PendingTrack):
+        data = {"query": entry.query}
+    else:
+        data = {
+            "track": entry.track_identifier,
+            "info": {
+                "identifier": entry.identifier,
+                "isSeekable": entry.seekable,
+                "author": entry.author,
+                "length": entry.length,
+                "isStream": entry.is_stream,
+                "position": entry.position,
+                "title": entry.title,
+                "uri": entry.uri,
+                "sourceName": entry.source,
+                "timestamp": entry.start_timestamp,
+            },
+        }
+    requester = entry.requester
+    data["requester"] = getattr(requester, "id", requester)
+    if entry._extras:
+        data["extras"] = dict(entry._extras)
+    return data
+
+
+def _load_entry(data: dict[str, Any]) -> Union[Track, PendingTrack]:
+    if "query" in data:
+        entry = PendingTrack(data["query"], data.get("requester"))
+        entry._extras = data.get("extras")
+    else:
+        entry = Track(data)
+        entry.requester = data.get("requester")
+    return entry
+
+
+def _dump_record(record: dict[str, Any]) -> dict[str, Any]:
+    """Serialize the entries of a record, they are kept as references until it's written"""
+    if "entries" in record:
+        record["entries"] = [_dump_entry(entry) for entry in record["entries"]]
+    if record.get("entry") is not None:
+        record["entry"] = _dump_entry(record["entry"])
+    if record.get("current") is not None:
+        record["current"] = _dump_entry(record["current"])
+    return record
+
+
+def _new_queue(data: dict[str, Any]) -> Union[TrackQueue, FairQueue]:
+    entries = [_StoredEntry(entry) for entry in data.get("entries", ())]
+    if data.get("fair"):
+        return FairQueue(entries, weighted=data.get("weighted", False), quantum=data.get("quantum", 600_000))
+    return TrackQueue(entries)
+
+
+def _apply(states: dict[int, _GuildState], record: dict[str, Any]):
+    """Replay a journal record on the state of its guild"""
+    guild_id = record["g"]
+    op = record["op"]
+    if op == "drop":
+        states.pop(guild_id, None)
+        return
+    if op == "snapshot":
+        state = states[guild_id] = _GuildState(_new_queue(record))
+        state.current = _StoredEntry(record["current"]) if record.get("current") else None
+        state.position = record.get("position", 0)
+        return
+
+    state = states.get(guild_id)
+    if state is None:
+        state = states[guild_id] = _GuildState(TrackQueue())
+    queue = state.queue
+
+    if op == "add":
+        entries = [_StoredEntry(entry) for entry in record["entries"]]
+        index = record.get("index")
+        if index is None:
+            queue.extend(entries)
+        elif index == 0 and len(entries) == 1:
+            queue.appendleft(entries[0])
+        else:
+            for offset, entry in enumerate(entries):
+                queue.insert(index + offset, entry)
+    elif op == "remove":
+        if record["index"] == 0:
+            queue.popleft()
+        else:
+            queue.pop(record["index"])
+    elif op == "set":
+        queue[record["index"]] = _StoredEntry(record["entry"])
+    elif op == "move":
+        queue.move(record["source"], record["destination"])
+    elif op == "dedupe":
+        queue.dedupe()
+    elif op == "current":
+        state.current = _StoredEntry(record["entry"]) if record.get("entry") else None
+        state.position = 0
+    elif op == "position":
+        state.position = record["position"]
+    elif op == "clear":
+        queue.clear()
+        state.current = None
+        state.position = 0
+
+
+class QueueJournal:
+    """
+    Persists the queues of the players in an append-only journal, to restore them after a crash.
+
+    The changes of the queues are collected in memory and written in batches, every
+    ``flush_interval`` seconds, by a dedicated thread. Each shard has its own journal,
+    which is compacted into a snapshot file when it grows over ``compact_after`` records.
+    The positions of the players are coalesced, only the last one of each batch is written.
+
+    The queues of the players disconnected by :func:`lavalink.close` are kept, so they can be
+    restored after a restart. Call :meth:`close` afterwards to write the last changes.
+
+    Changes made directly on :attr:`Player.queue`, bypassing the methods of :class:`Player`,
+    are not recorded. Requesters are stored by their ID, so the restored entries have
+    the user ID as requester.
+
+    Attributes
+    ----------
+    directory : str
+        The directory of the journal and snapshot files
+    flush_interval : float
+        How often the changes are written, in seconds
+    compact_after : int
+        The number of records of a journal that triggers a compaction
+    """
+    directory: str
+    flush_interval: float
+    compact_after: int
+
+    def __init__(self, directory: str, flush_interval: float = 1.0, compact_after: int = 50_000):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.compact_after = compact_after
+        # shard ID -> pending records
+        self._pending: dict[int, list[dict[str, Any]]] = {}
+        self._positions: dict[tuple[int, int], int] = {}
+        self._records: dict[int, int] = {}
+        self._states: dict[int, _GuildState] = {}
+        # A single thread, so the file operations are applied in order
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="lavalink-journal")
+        self._task: Optional[asyncio.Task] = None
+        self._attached = False
+
+    def __repr__(self) -> str:
+        return f"<QueueJournal: directory={self.directory!r}, guilds={len(self._states)}>"
+
+    def _journal_path(self, shard_id: int) -> str:
+        return os.path.join(self.directory, f"shard-{shard_id}.journal")
+
+    def _snapshot_path(self, shard_id: int) -> str:
+        return os.path.join(self.directory, f"shard-{shard_id}.snapshot")
+
+    def start(self):
+        """
+        Start recording the changes of the queues and writing them in background
+        """
+        from .player import _queue_listeners
+
+        os.makedirs(self.directory, exist_ok=True)
+        if not self._attached:
+            _queue_listeners.append(self.record)
+            self._attached = True
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._flush_loop())
+
+    async def close(self):
+        """
+        Stop recording the changes and write the pending ones
+        """
+        from .player import _queue_listeners
+
+        if self._attached:
+            _queue_listeners.remove(self.record)
+            self._attached = False
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+        self._executor.shutdown(wait=True)
+
+    def record(self, player: Player, op: str, data: dict[str, Any]):
+        """
+        Add a change of a queue to the next batch. It's called by the players.
+
+        Parameters
+        ----------
+        player : Player
+        op : str
+            The name of the change
+        data : dict[str, Any]
+            The arguments of the change
+        """
+        guild_id = player.guild.id
+        shard_id = getattr(player.guild, "shard_id", None) or 0
+        if op == "position":
+            self._positions[(shard_id, guild_id)] = data["position"]
+            return
+        if op == "drop" and data.get("shutdown"):
+            # The players are disconnected by the shutdown, their queues are kept to be restored
+            return
+        if op in ("current", "clear", "snapshot", "drop"):
+            # The position is written after the batch, it belongs to the previous track
+            self._positions.pop((shard_id, guild_id), None)
+
+        # Only the references are taken here, the entries are serialized by the writer thread
+        record = {"g": guild_id, "op": op}
+        if op == "snapshot":
+            queue = player.queue
+            record["entries"] = list(queue)
+            if isinstance(queue, FairQueue):
+                record.update(fair=True, weighted=queue.weighted, quantum=queue.quantum)
+            record["current"] = player.current
+            record["position"] = player.position
+        else:
+            record.update(data)
+        self._pending.setdefault(shard_id, []).append(record)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                log.exception("Failed to write the queue journal.")
+
+    async def flush(self):
+        """
+        Write the pending changes, and compact the journals that grew too much
+        """
+        positions, self._positions = self._positions, {}
+        for (shard_id, guild_id), position in positions.items():
+            self._pending.setdefault(shard_id, []).append({"g": guild_id, "op": "position", "position": position})
+
+        pending, self._pending = self._pending, {}
+        loop = asyncio.get_running_loop()
+        for shard_id, records in pending.items():
+            await loop.run_in_executor(self._executor, self._write, shard_id, records)
+            self._records[shard_id] = self._records.get(shard_id, 0) + len(records)
+            if self._records[shard_id] >= self.compact_after:
+                await loop.run_in_executor(self._executor, self._compact, shard_id)
+                self._records[shard_id] = 0
+
+    def _write(self, shard_id: int, records: list[dict[str, Any]]):
+        lines = "".join(
+            json.dumps(_dump_record(record), separators=(",", ":"), default=str) + "\n" for record in records
+        )
+        with open(self._journal_path(shard_id), "a", encoding="utf-8") as file:
+            file.write(lines)
+            file.flush()
+            os.fsync(file.fileno())
+
+    def _read_shard(self, shard_id: int) -> dict[int, _GuildState]:
+        states: dict[int, _GuildState] = {}
+        for path in (self._snapshot_path(shard_id), self._journal_path(shard_id)):
+            try:
+                file = open(path, encoding="utf-8")
+            except FileNotFoundError:
+                continue
+            with file:
+                for line in file:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # The last line is incomplete if the process died while writing it
+                        log.warning("Skipping a truncated record of %s", path)
+                        continue
+                    try:
+                        _apply(states, record)
+                    except (IndexError, KeyError):
+                        log.warning("Skipping an inconsistent record of %s: %r", path, record)
+        return states
+
+    def _compact(self, shard_id: int):
+        states = self._read_shard(shard_id)
+        path = self._snapshot_path(shard_id)
+        with open(path + ".tmp", "w", encoding="utf-8") as file:
+            for guild_id, state in states.items():
+                record = {
+                    "g": guild_id,
+                    "op": "snapshot",
+                    "entries": [_dump_entry(entry) for entry in state.queue],
+                    "current": state.current.data if state.current is not None else None,
+                    "position": state.position,
+                }
+                if isinstance(state.queue, FairQueue):
+                    record.update(fair=True, weighted=state.queue.weighted, quantum=state.queue.quantum)
+                file.write(json.dumps(record, separators=(",", ":"), default=str) + "\n")
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(path + ".tmp", path)
+        # The snapshot contains every record of the journal
+        open(self._journal_path(shard_id), "w").close()
+
+    def _shard_ids(self) -> list[int]:
+        shard_ids = set()
+        for name in os.listdir(self.directory):
+            prefix, _, extension = name.partition(".")
+            if prefix.startswith("shard-") and extension in ("journal", "snapshot"):
+                shard_ids.add(int(prefix[len("shard-"):]))
+        return sorted(shard_ids)
+
+    def _load_all(self) -> dict[int, _GuildState]:
+        states = {}
+        if os.path.isdir(self.directory):
+            for shard_id in self._shard_ids():
+                states.update(self._read_shard(shard_id))
+        return states
+
+    async def load(self) -> list[int]:
+        """
+        Read the snapshots and the journals of all the shards, in a single pass.
+        It should be called at startup, before :meth:`start`.
+
+        Returns
+        -------
+        list[int]
+            The IDs of the guilds with a saved queue
+        """
+        loop = asyncio.get_running_loop()
+        self._states = await loop.run_in_executor(self._executor, self._load_all)
+        return list(self._states)
+
+    def restore(self, player: Player) -> bool:
+        """
+        Restore the queue, the current track and the position of a player from the loaded state.
+
+        The playback isn't started, the current track can be played again with
+        ``player.resume(player.current, start=player.position)``.
+
+        Parameters
+        ----------
+        player : Player
+
+        Returns
+        -------
+        bool
+            False if there isn't a saved queue for the guild of the player
+        """
+        state = self._states.pop(player.guild.id, None)
+        if state is None:
+            return False
+
+        entries = [_load_entry(entry.data) for entry in state.queue]
+        if isinstance(state.queue, FairQueue):
+            player.queue = FairQueue(entries, weighted=state.queue.weighted, quantum=state.queue.quantum)
+        else:
+            player.queue = TrackQueue(entries)
+        player.current = _load_entry(state.current.data) if state.current is not None else None
+        player.position = state.position
+        player._queue_changed("snapshot")
+        return True
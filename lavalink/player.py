@@ -1,11 +1,12 @@
 from __future__ import annotations
 
 import asyncio
+import copy
 import datetime
 import random
-from collections import deque
-from random import shuffle
-from typing import TYPE_CHECKING, Optional, Any, Union
+import time
+from itertools import count, islice
+from typing import TYPE_CHECKING, Optional, Any, Callable, Iterable, Union
 
 import discord
 from discord.backoff import ExponentialBackoff
@@ -16,18 +17,38 @@ from . import log, ws_rll_log
 from .enums import (
     LavalinkEvents,
     LavalinkIncomingOp,
-    LavalinkOutgoingOp,
     PlayerState,
+    QueueChangeType,
+    RequestPriority,
     TrackEndReason,
 )
-from .rest_api import RESTClient, Track
-from .tuples import EqualizerBands, PositionTime
+from .autoplay import related_tracks
+from .filters import FilterState
+from .queue import CompactTrackQueue, FairQueue, PlayHistory, TrackQueue
+from .rest_api import PendingTrack, RESTClient, Track
+from .tuples import EqualizerBands, PositionTime, QueueChange
 
 if TYPE_CHECKING:
     from .node import Node
 
 __all__ = ["Player"]
 
+# Coroutines called by the players on the upcoming tracks, see register_prefetch_listener
+_prefetch_listeners = []
+# Functions called on every change of the queue of a player, see register_queue_listener
+_queue_listeners = []
+
+
+def _is_bumped(track: Union[Track, PendingTrack]) -> bool:
+    # Avoids creating the extras of every track
+    return bool(track._extras and track._extras.get("bumped"))
+
+
+# The fields taken from the loaded track when an unresolved track is resolved
+_RESOLVED_FIELDS = (
+    "track_identifier", "identifier", "source", "seekable", "author", "length", "is_stream", "title", "uri"
+)
+
 
 class Player(RESTClient, VoiceProtocol):
     """
@@ -41,8 +62,10 @@ class Player(RESTClient, VoiceProtocol):
     ----------
     channel: discord.VoiceChannel
         The channel the bot is connected to.
-    queue : deque[Track]
-        list of Track
+    queue : Union[TrackQueue, FairQueue]
+        The tracks to play, the entries added by query are resolved when they are about to be played
+    history : PlayHistory
+        The last played tracks, used by :meth:`previous`
     position : int
         The seeked position in the track of the current playback.
     current : Track
@@ -53,14 +76,28 @@ class Player(RESTClient, VoiceProtocol):
         Repeat the current queue
     shuffle : bool
         The newly added tracks to the queue gets shuffled
+    prefetch_depth : int
+        How many upcoming tracks of the queue are prepared in the background, 0 disables the prefetch
+    autoplay : bool
+        Play related tracks when the queue runs dry
+    filters : FilterState
+        The filters applied to the player
+    filter_delay : float
+        The minimum time between two filter updates sent to the node, in seconds.
+        The changes made in between are coalesced. 0 sends every change.
     """
     channel: discord.VoiceChannel
-    queue: deque[Track]
+    queue: Union[TrackQueue, FairQueue]
+    history: PlayHistory
     position: int
     current: Track
     repeat: bool
     loop_queue: bool
     shuffle: bool
+    prefetch_depth: int
+    autoplay: bool
+    filters: FilterState
+    filter_delay: float
 
     def __call__(self, client: Bot, channel: discord.VoiceChannel):
         self.client: Bot = client
@@ -89,7 +126,8 @@ class Player(RESTClient, VoiceProtocol):
         self.channel: discord.VoiceChannel = channel
         self.guild: discord.Guild = channel.guild
         self._last_channel_id: int = channel.id
-        self.queue: deque[Track] = deque()
+        self.queue = TrackQueue()
+        self.history = PlayHistory()
         self.position = 0
         self.current: Optional[Track] = None
         self._paused = False
@@ -97,9 +135,21 @@ class Player(RESTClient, VoiceProtocol):
         self.loop_queue = False
         self.shuffle = False
         self.shuffle_bumped = True
+        self.autoplay = False
         self._is_autoplaying = False
         self._auto_play_sent = False
+        # The related tracks of the current track, looked up while it plays
+        self._autoplay_seed: Optional[Track] = None
+        self._autoplay_task: Optional[asyncio.Task] = None
+        self._autoplay_candidates: list[Track] = []
         self._volume = 100
+        # Sent as a whole on every change, Lavalink replaces the filter set of a player
+        self.filters = FilterState()
+        self.filter_delay = 0.1
+        # The changes made less than filter_delay after a send are sent together by this task
+        self._filters_task: Optional[asyncio.Task] = None
+        self._filters_pending = False
+        self._filters_sent_at = 0.0
         self.state = PlayerState.CREATED
         self._voice_state = {}
         self.connected_at = None
@@ -107,6 +157,12 @@ class Player(RESTClient, VoiceProtocol):
 
         self._is_playing = False
         self._metadata = {}
+        self.prefetch_depth = 2
+        self._prefetch_tasks: dict[int, tuple[Union[Track, PendingTrack], asyncio.Task]] = {}
+        # The first track of the queue, with the node and the payload that plays it
+        self._prepared: Optional[tuple[Track, Any, dict[str, Any]]] = None
+        # Whether the node started the next track when it received the end of the current one
+        self._fast_advanced = False
 
         if node is None:
             from .node import get_node
@@ -212,13 +268,8 @@ class Player(RESTClient, VoiceProtocol):
 
     async def _send_lavalink_voice_update(self, voice_state: dict):
         if self._voice_state.keys() == {"sessionId", "event"}:
-            await self.node.send(
-                {
-                    "op": LavalinkOutgoingOp.VOICE_UPDATE.value,
-                    "guildId": str(self.guild.id),
-                    "sessionId": voice_state["sessionId"],
-                    "event": voice_state["event"],
-                }
+            await self.node.send_lavalink_voice_update(
+                self.guild.id, voice_state["sessionId"], voice_state["event"]
             )
 
     async def wait_until_ready(
@@ -293,6 +344,8 @@ class Player(RESTClient, VoiceProtocol):
             await self.resume(
                 track=self.current, replace=True, start=self.position, pause=self._paused
             )
+        elif self.filters:
+            await self.apply_filters()
 
     async def disconnect(self, force: bool = False):
         """
@@ -328,6 +381,10 @@ class Player(RESTClient, VoiceProtocol):
         await self.guild.change_voice_state(channel=None)
         await self.node.destroy_guild(guild_id)
         self.node.remove_player(self)
+        self._cancel_prefetch()
+        self._cancel_filters()
+        self.history.clear()
+        self._queue_changed("drop", shutdown=self.node._is_shutdown)
         self.cleanup()
 
     def store(self, key: Union[str, int], value: Any):
@@ -396,7 +453,10 @@ class Player(RESTClient, VoiceProtocol):
 
         if event == LavalinkEvents.TRACK_END:
             if extra == TrackEndReason.FINISHED:
-                await self.play()
+                if self._fast_advanced:
+                    self._fast_advanced = False
+                else:
+                    await self.play()
             else:
                 self._is_playing = False
         elif event == LavalinkEvents.WEBSOCKET_CLOSED:
@@ -417,9 +477,51 @@ class Player(RESTClient, VoiceProtocol):
             self._is_playing = True
         log.debug("Updated player position for player: %r - %ds.", self, state.position // 1000)
         self.position = state.position
+        self._queue_changed("position", position=state.position)
+
+    def _queue_changed(self, op: str, **data: Any):
+        """
+        Notify the queue listeners of a change of the queue, the current track or the position,
+        and dispatch the changes of the queue as QUEUE_UPDATE events
+        """
+        for listener in _queue_listeners:
+            try:
+                listener(self, op, data)
+            except Exception:
+                log.exception("Queue listener %r failed for %r.", listener, self)
+
+        change = self._describe_change(op, data)
+        if change is not None:
+            self.node.event_handler(
+                LavalinkIncomingOp.EVENT,
+                LavalinkEvents.QUEUE_UPDATE,
+                {"guildId": str(self.guild.id), "change": change},
+            )
+
+    def _describe_change(self, op: str, data: dict[str, Any]) -> Optional[QueueChange]:
+        if op in ("current", "position", "drop"):
+            return None
+        if op == "clear":
+            return QueueChange(QueueChangeType.CLEARED)
+        if "change" in data:
+            return data["change"]
+        fair = isinstance(self.queue, FairQueue)
+        if op == "add" and not fair:
+            entries = tuple(data["entries"])
+            index = data["index"] if data["index"] is not None else len(self.queue) - len(entries)
+            return QueueChange(QueueChangeType.INSERTED, index, len(entries), entries=entries)
+        if op == "remove" and (not fair or data["index"] == 0):
+            # Taking the next entry of a fair queue keeps the order of the other ones
+            return QueueChange(QueueChangeType.REMOVED, data["index"], 1)
+        if op == "set":
+            # The resolved track keeps the requester, so its position in a fair queue
+            return QueueChange(QueueChangeType.REPLACED, data["index"], 1, entries=(data["entry"],))
+        if op == "move" and not fair:
+            return QueueChange(QueueChangeType.MOVED, data["source"], 1, destination=data["destination"])
+        return QueueChange(QueueChangeType.RESET)
 
     # Play commands
-    def add(self, requester: discord.User, track: Track):
+    def add(self, requester: discord.User, track: Track, dedupe: bool = False) -> bool:
         """
         Adds a track to the queue.
 
@@ -429,9 +531,482 @@ class Player(RESTClient, VoiceProtocol):
             Who requested the track.
         track : Track
             Result from any of the lavalink track search methods.
+        dedupe : bool
+            If set to True, the track isn't added when it's already in the queue
+
+        Returns
+        -------
+        bool
+            Whether the track was added
         """
+        if dedupe and track in self.queue:
+            return False
         track.requester = requester
         self.queue.append(track)
+        self._queue_changed("add", index=None, entries=(track,))
+        self._schedule_prefetch()
+        return True
+
+    def contains(self, track: Track) -> bool:
+        """
+        Checks if a track is in the queue, in constant time.
+
+        Parameters
+        ----------
+        track : Track
+
+        Returns
+        -------
+        bool
+        """
+        return track in self.queue
+
+    def dedupe(self) -> int:
+        """
+        Removes the repeated tracks from the queue, keeping the first occurrence of each one.
+
+        Returns
+        -------
+        int
+            The number of removed tracks
+        """
+        removed = self.queue.dedupe()
+        if removed:
+            self._queue_changed("dedupe")
+            self._schedule_prefetch()
+        return removed
+
+    def add_queries(self, requester: discord.User, queries: Iterable[str]):
+        """
+        Adds tracks to the queue by query, without loading them.
+
+        The queries are resolved to tracks just in time, when they enter the prefetch window
+        or reach the head of the queue. The first track found for a query is used,
+        the queries without results are skipped.
+
+        Parameters
+        ----------
+        requester : discord.User
+            Who requested the tracks.
+        queries : Iterable[str]
+            Search terms or URLs of the tracks
+        """
+        entries = [PendingTrack(str(query), requester) for query in queries]
+        self.queue.extend(entries)
+        self._queue_changed("add", index=None, entries=entries)
+        self._schedule_prefetch()
+
+    def insert(self, index: int, requester: discord.User, track: Union[Track, PendingTrack]):
+        """
+        Inserts a track in the queue before the entry at index.
+
+        Parameters
+        ----------
+        index : int
+        requester : discord.User
+            Who requested the track.
+        track : Union[Track, PendingTrack]
+        """
+        track.requester = requester
+        self.queue.insert(index, track)
+        self._queue_changed("add", index=index, entries=(track,))
+        self._schedule_prefetch()
+
+    def remove(self, index: int) -> Union[Track, PendingTrack]:
+        """
+        Removes the entry at index from the queue.
+
+        Parameters
+        ----------
+        index : int
+
+        Returns
+        -------
+        Union[Track, PendingTrack]
+            The removed entry
+
+        Raises
+        ------
+        IndexError
+            If the index is out of range
+        """
+        entry = self.queue.pop(index)
+        self._queue_changed("remove", index=index)
+        self._schedule_prefetch()
+        return entry
+
+    def move(self, source: int, destination: int):
+        """
+        Moves an entry of the queue.
+
+        Parameters
+        ----------
+        source : int
+            The current index of the entry
+        destination : int
+            The index of the entry after the move
+
+        Raises
+        ------
+        IndexError
+            If the source index is out of range
+        """
+        self.queue.move(source, destination)
+        self._queue_changed("move", source=source, destination=destination)
+        self._schedule_prefetch()
+
+    # Bulk commands, a single pass over the queue and a single notification
+
+    def add_many(self, requester: discord.User, tracks: Iterable[Union[Track, PendingTrack]]):
+        """
+        Adds many tracks to the queue, like a playlist.
+
+        Parameters
+        ----------
+        requester : discord.User
+            Who requested the tracks.
+        tracks : Iterable[Union[Track, PendingTrack]]
+        """
+        entries = list(tracks)
+        for track in entries:
+            track.requester = requester
+        self.queue.extend(entries)
+        self._queue_changed("add", index=None, entries=entries)
+        self._schedule_prefetch()
+
+    def insert_many(self, index: int, requester: discord.User, tracks: Iterable[Union[Track, PendingTrack]]):
+        """
+        Inserts many tracks in the queue before the entry at index, in their order.
+
+        Parameters
+        ----------
+        index : int
+        requester : discord.User
+            Who requested the tracks.
+        tracks : Iterable[Union[Track, PendingTrack]]
+        """
+        entries = list(tracks)
+        for track in entries:
+            track.requester = requester
+        index = min(max(index + len(self.queue) if index < 0 else index, 0), len(self.queue))
+        self.queue.insert_many(index, entries)
+        self._queue_changed("add", index=index, entries=entries)
+        self._schedule_prefetch()
+
+    def remove_where(self, predicate: Callable[[Union[Track, PendingTrack]], bool]) -> list[Union[Track, PendingTrack]]:
+        """
+        Removes the entries of the queue for which predicate returns True.
+
+        Parameters
+        ----------
+        predicate : Callable[[Union[Track, PendingTrack]], bool]
+
+        Returns
+        -------
+        list[Union[Track, PendingTrack]]
+            The removed entries
+        """
+        if isinstance(self.queue, FairQueue):
+            # The sub-queues are filtered one by one, the indices aren't known
+            removed = self.queue.remove_where(predicate)
+            change = QueueChange(QueueChangeType.RESET)
+        else:
+            indices = []
+            positions = count()
+
+            def matches(entry: Union[Track, PendingTrack]) -> bool:
+                index = next(positions)
+                if predicate(entry):
+                    indices.append(index)
+                    return True
+                return False
+
+            removed = self.queue.remove_where(matches)
+            change = QueueChange(
+                QueueChangeType.REMOVED, indices[0] if indices else 0, len(indices), indices=tuple(indices)
+            )
+        if removed:
+            self._queue_changed("snapshot", change=change)
+            self._schedule_prefetch()
+        return removed
+
+    def clear_requester(self, requester: Union[discord.abc.Snowflake, int]) -> list[Union[Track, PendingTrack]]:
+        """
+        Removes all the entries of the queue requested by a user.
+
+        Parameters
+        ----------
+        requester : Union[discord.abc.Snowflake, int]
+            The user or its ID
+
+        Returns
+        -------
+        list[Union[Track, PendingTrack]]
+            The removed entries
+        """
+        requester_id = getattr(requester, "id", requester)
+        return self.remove_where(
+            lambda entry: getattr(entry.requester, "id", entry.requester) == requester_id
+        )
+
+    def move_range(self, start: int, stop: int, destination: int):
+        """
+        Moves the entries of the queue from index start to stop, excluded, keeping their order.
+
+        Parameters
+        ----------
+        start : int
+        stop : int
+        destination : int
+            The index of the first moved entry after the move
+        """
+        start, stop, _ = slice(start, stop).indices(len(self.queue))
+        if start >= stop:
+            return
+        remaining = len(self.queue) - (stop - start)
+        destination = min(max(destination + remaining if destination < 0 else destination, 0), remaining)
+        self.queue.move_range(start, stop, destination)
+        if isinstance(self.queue, FairQueue):
+            change = QueueChange(QueueChangeType.RESET)
+        else:
+            change = QueueChange(QueueChangeType.MOVED, start, stop - start, destination=destination)
+        self._queue_changed("snapshot", change=change)
+        self._schedule_prefetch()
+
+    @property
+    def fair_queue(self) -> bool:
+        """
+        Whether the queue interleaves the tracks of the different requesters
+        """
+        return isinstance(self.queue, FairQueue)
+
+    def set_fair_queue(self, enabled: bool = True, weighted: bool = False, quantum: int = 600_000):
+        """
+        Enables or disables the fair queue mode.
+
+        In fair mode, every requester has its own sub-queue and the requesters take turns,
+        so a long playlist added by someone doesn't delay the tracks of the others.
+        The entries already in the queue are kept, but enabling the mode reorders them.
+
+        Parameters
+        ----------
+        enabled : bool
+            Whether to use the fair mode
+        weighted : bool
+            If set to True, the requesters get the same playback time instead of the same number of tracks
+        quantum : int
+            The playback time in milliseconds given to a requester on each turn, when weighted
+        """
+        entries = list(self.queue)
+        if enabled:
+            self.queue = FairQueue(entries, weighted=weighted, quantum=quantum)
+        else:
+            self.queue = TrackQueue(entries)
+        self._queue_changed("snapshot")
+        self._schedule_prefetch()
+
+    @property
+    def compact_queue(self) -> bool:
+        """
+        Whether the queue stores the tracks in the compact representation
+        """
+        return isinstance(self.queue, CompactTrackQueue)
+
+    def set_compact_queue(self, enabled: bool = True):
+        """
+        Enables or disables the compact storage of the queue.
+
+        The compact queue takes a fraction of the memory for large queues, but the tracks
+        are materialized when they are accessed and their requester is looked up by ID
+        in the cache of the bot. It disables the fair queue mode.
+
+        Parameters
+        ----------
+        enabled : bool
+            Whether to use the compact storage
+        """
+        entries = list(self.queue)
+        if enabled:
+            self.queue = CompactTrackQueue(entries, resolve_requester=self.client.get_user)
+        else:
+            self.queue = TrackQueue(entries)
+        self._queue_changed("snapshot")
+        self._schedule_prefetch()
+
+    def _schedule_prefetch(self):
+        """Start the prefetch of the tracks entering the prefetch window"""
+        window = {id(track): track for track in islice(self.queue, max(0, self.prefetch_depth))}
+        for key in tuple(self._prefetch_tasks):
+            if key not in window:
+                # The track left the window, e.g. after a shuffle or a removal
+                self._prefetch_tasks.pop(key)[1].cancel()
+
+        for key, track in window.items():
+            if key in self._prefetch_tasks:
+                continue
+            if track.track_identifier is not None and not _prefetch_listeners:
+                continue
+            task = self.node.loop.create_task(self._prefetch(track))
+            self._prefetch_tasks[key] = (track, task)
+        self._prepare_next()
+        self._schedule_autoplay()
+
+    def _schedule_autoplay(self):
+        """Look up the related tracks of the last track of the queue while it plays"""
+        if not self.autoplay or self.queue or self.current is None or self._autoplay_seed is self.current:
+            return
+        if self._autoplay_task is not None:
+            self._autoplay_task.cancel()
+        self._autoplay_seed = self.current
+        self._autoplay_task = self.node.loop.create_task(self._find_related(self.current))
+
+    async def _find_related(self, seed: Track):
+        recent = {track.identifier for track in self.history}
+        recent.add(seed.identifier)
+        # The previous tracks are used when the current one has no related tracks
+        for track in (seed, *islice(reversed(self.history), 2)):
+            try:
+                related = await related_tracks.get(self, track)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.debug("Failed to find the tracks related to %r for player: %r.", track, self, exc_info=True)
+                continue
+            candidates = [candidate for candidate in related if candidate.identifier not in recent]
+            if candidates:
+                self._autoplay_candidates = candidates
+                return
+
+    async def _next_autoplay(self) -> Optional[Track]:
+        task = self._autoplay_task
+        if task is not None and not task.done():
+            # The lookup started while the previous track was playing, it's usually done by now
+            await asyncio.wait((task,))
+
+        recent = {track.identifier for track in self.history}
+        while self._autoplay_candidates:
+            candidate = self._autoplay_candidates.pop(0)
+            if candidate.identifier in recent:
+                continue
+            # The cached tracks are shared by the players
+            track = copy.copy(candidate)
+            track.requester = self.client.user
+            track._extras = {"autoplay": True}
+            return track
+        return None
+
+    def _prepare_next(self):
+        """Build the payload that plays the first track of the queue, for the next transition"""
+        head = self.queue[0] if self.queue else None
+        if not isinstance(head, Track) or head.track_identifier is None:
+            self._prepared = None
+        elif self._prepared is None or self._prepared[0] is not head or self._prepared[1] is not self.node:
+            payload = self.node._play_payload(self.guild.id, head, start=head.start_timestamp)
+            self._prepared = (head, self.node, payload)
+
+    def _fast_advance(self) -> Optional[dict[str, Any]]:
+        """
+        Make the prepared track the current one when the current track finished.
+        Returns the payload to send, or None if :meth:`play` has to be used.
+        """
+        prepared = self._prepared
+        if prepared is None or self.repeat or not self.queue:
+            return None
+        track, node, payload = prepared
+        if node is not self.node or self.queue[0] is not track:
+            return None
+
+        self._prepared = None
+        self._fast_advanced = True
+        if self.current is not None:
+            self.history.append(self.current)
+        self.current = None
+        self.position = 0
+        self._paused = False
+        self.queue.popleft()
+        self._queue_changed("remove", index=0)
+        self._prefetch_tasks.pop(id(track), None)
+        self._start(track)
+        # The prepared track comes from the queue
+        self._auto_play_sent = False
+        return payload
+
+    def _cancel_prefetch(self):
+        for _, task in self._prefetch_tasks.values():
+            task.cancel()
+        self._prefetch_tasks.clear()
+        if self._autoplay_task is not None:
+            self._autoplay_task.cancel()
+            self._autoplay_task = None
+        self._autoplay_seed = None
+        self._autoplay_candidates = []
+
+    async def _resolve(self, entry: PendingTrack) -> Optional[Track]:
+        try:
+            result = await self.load_tracks(entry.query, priority=RequestPriority.BULK)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            log.debug("Failed to resolve %r for player: %r.", entry, self, exc_info=True)
+            return None
+        if not result.tracks:
+            log.debug("No track found for %r, skipping it.", entry)
+            return None
+
+        track = result.tracks[0]
+        track.requester = entry.requester
+        if entry._extras:
+            track.extras.update(entry._extras)
+        return track
+
+    def _replace_entry(self, entry: Union[Track, PendingTrack], track: Optional[Track]):
+        # The entry is usually among the first ones, in the prefetch window
+        for i, queued in enumerate(self.queue):
+            if queued is entry:
+                if track is None:
+                    del self.queue[i]
+                    self._queue_changed("remove", index=i)
+                else:
+                    self.queue[i] = track
+                    self._queue_changed("set", index=i, entry=track)
+                return
+
+    async def _prefetch(self, track: Union[Track, PendingTrack]):
+        if isinstance(track, PendingTrack):
+            resolved = await self._resolve(track)
+            self._prefetch_tasks.pop(id(track), None)
+            self._replace_entry(track, resolved)
+            # The listeners run on the resolved track, the next entry enters the window if it failed
+            self._schedule_prefetch()
+            return
+
+        if track.track_identifier is None and track.uri:
+            try:
+                result = await self.load_tracks(track.uri, priority=RequestPriority.BULK)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.debug("Failed to resolve %r for player: %r.", track, self, exc_info=True)
+            else:
+                if result.tracks:
+                    # A copy replaces the entry, the queue indexes its entries by track identifier
+                    resolved = copy.copy(track)
+                    loaded = result.tracks[0]
+                    for field in _RESOLVED_FIELDS:
+                        setattr(resolved, field, getattr(loaded, field))
+                    self._prefetch_tasks.pop(id(track), None)
+                    self._replace_entry(track, resolved)
+                    # The listeners run on the resolved track
+                    self._schedule_prefetch()
+                    return
+
+        for listener in tuple(_prefetch_listeners):
+            try:
+                await listener(self, track)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception("Prefetch listener %r failed for %r.", listener, track)
 
     def maybe_shuffle(self, sticky_songs: int = 1):
         """Shuffle"""
@@ -439,54 +1014,97 @@ class Player(RESTClient, VoiceProtocol):
             self.force_shuffle(sticky_songs)
 
     def force_shuffle(self, sticky_songs: int = 1):
-        """Shuffle the queue"""
+        """
+        Shuffle the queue in place.
+
+        The order before the shuffle can be restored with :meth:`unshuffle`.
+
+        Parameters
+        ----------
+        sticky_songs : int
+            The number of tracks at the start of the queue that bypass the shuffle
+        """
         if not self.queue:
             return
         sticky = max(0, sticky_songs)  # Songs to  bypass shuffle
-        # Keeps queue order consistent unless adding new tracks
-        if sticky > 0:
-            to_keep = self.queue[:sticky]
-            to_shuffle = self.queue[sticky:]
-        else:
-            to_shuffle = self.queue
-            to_keep = []
-        if not self.shuffle_bumped:
-            to_keep_bumped = [t for t in to_shuffle if t.extras.get("bumped", None)]
-            to_shuffle = [t for t in to_shuffle if not t.extras.get("bumped", None)]
-            to_keep.extend(to_keep_bumped)
-            # Shuffles whole queue
-        shuffle(to_shuffle)
-        to_keep.extend(to_shuffle)
-        # Keep next track in queue consistent while adding new tracks
-        self.queue = to_keep
+        # Bumped tracks are kept, in their order, right after the sticky ones
+        self.queue.shuffle(sticky, keep_first=None if self.shuffle_bumped else _is_bumped)
+        self._queue_changed("snapshot", change=QueueChange(QueueChangeType.SHUFFLED, sticky, len(self.queue) - sticky))
+        self._schedule_prefetch()
+
+    def unshuffle(self) -> bool:
+        """
+        Restore the order the queue had before the last shuffle.
+
+        Tracks removed or played in the meantime stay removed. If tracks were inserted
+        among the shuffled ones, the previous order is lost.
+
+        Returns
+        -------
+        bool
+            False if there is no shuffle to revert
+        """
+        if not self.queue.unshuffle():
+            return False
+        self._queue_changed("snapshot", change=QueueChange(QueueChangeType.SHUFFLED, 0, len(self.queue)))
+        self._schedule_prefetch()
+        return True
 
     async def play(self):
         """
         Starts playback from lavalink.
         """
         if self.repeat and self.current is not None:
-            self.queue.append(self.current)
+            self.queue.appendleft(self.current)
+            self._queue_changed("add", index=0, entries=(self.current,))
+        elif self.current is not None:
+            self.history.append(self.current)
 
         self.current = None
         self.position = 0
         self._paused = False
 
-        if not self.queue:
+        track = None
+        while track is None and self.queue:
+            entry = self.queue.popleft()
+            self._queue_changed("remove", index=0)
+            prefetch = self._prefetch_tasks.pop(id(entry), None)
+            if isinstance(entry, PendingTrack):
+                # The entry reached the head before the prefetch resolved it.
+                # The prefetch request, if any, is shared by the loads of the same query.
+                if prefetch is not None:
+                    prefetch[1].cancel()
+                track = await self._resolve(entry)
+            else:
+                # The prefetch already ran or keeps running in background, the track is never waited
+                track = entry
+
+        autoplayed = False
+        if track is None and self.autoplay:
+            track = await self._next_autoplay()
+            autoplayed = track is not None
+
+        if track is None:
             await self.stop()
         else:
-            self._is_playing = True
+            self._start(track, autoplayed)
+            await self.node.play(self.guild.id, track, start=track.start_timestamp, replace=True)
+            self._auto_play_sent = autoplayed
 
-            track = self.queue.pop()
+    def _start(self, track: Track, autoplayed: bool = False):
+        """Make a track the current one, before it's sent to the node"""
+        self._is_playing = True
+        self._is_autoplaying = autoplayed
 
-            if self.loop_queue:
-                if self.current is not None:
-                    self.queue.append(self.current)
-                else:
-                    self.queue.append(track)
+        if self.loop_queue:
+            requeued = self.current if self.current is not None else track
+            self.queue.append(requeued)
+            self._queue_changed("add", index=None, entries=(requeued,))
 
-            self.current = track
-            log.debug("Assigned current track for player: %r.", self)
-            await self.node.play(self.guild.id, track, start=track.start_timestamp, replace=True)
+        self.current = track
+        self._queue_changed("current", entry=track)
+        log.debug("Assigned current track for player: %r.", self)
+        self._schedule_prefetch()
 
     async def resume(
             self, track: Track, replace: bool = True, start: int = 0, pause: bool = False
@@ -494,7 +1112,17 @@ class Player(RESTClient, VoiceProtocol):
         log.debug("Resuming current track for player: %r.", self)
         self._is_playing = False
         self._paused = True
+        if self.node.api_version >= 4:
+            # The REST API applies the track, position and pause state at once
+            await self.node.play(self.guild.id, track, start=start, replace=replace, pause=pause)
+            self._paused = pause
+            if self.filters:
+                await self._send_filters()
+            return
         await self.node.play(self.guild.id, track, start=start, replace=replace, pause=True)
+        if self.filters:
+            # The player may be new on the node, after a move or a node change
+            await self._send_filters()
         await self.pause(True)
         await self.pause(pause, timed=1)
 
@@ -507,9 +1135,13 @@ class Player(RESTClient, VoiceProtocol):
             This method will clear the queue.
         """
         await self.node.stop(self.guild.id)
-        self.queue = deque()
+        self.queue.clear()
+        self._cancel_prefetch()
+        if self.current is not None:
+            self.history.append(self.current)
         self.current = None
         self.position = 0
+        self._queue_changed("clear")
         self._paused = False
         self._is_autoplaying = False
         self._auto_play_sent = False
@@ -520,6 +1152,29 @@ class Player(RESTClient, VoiceProtocol):
         """
         await self.play()
 
+    async def previous(self) -> bool:
+        """
+        Plays the last track of the history again.
+
+        The current track is put back at the start of the queue, so it's played next.
+
+        Returns
+        -------
+        bool
+            False if the history is empty
+        """
+        track = self.history.pop()
+        if track is None:
+            return False
+        entries = (track,) if self.current is None else (track, self.current)
+        for entry in reversed(entries):
+            self.queue.appendleft(entry)
+        self._queue_changed("add", index=0, entries=entries)
+        # The current track is in the queue, it isn't added to the history
+        self.current = None
+        await self.play()
+        return True
+
     async def pause(self, pause: bool = True, timed: Optional[int] = None):
         """
         Pauses the current song.
@@ -562,14 +1217,62 @@ class Player(RESTClient, VoiceProtocol):
             position = max(min(position, self.current.length), 0)
             await self.node.seek(self.guild.id, position)
 
+    async def apply_filters(self):
+        """
+        Send the whole filter set of :attr:`filters` to the node.
+
+        It's called by the filter methods of the player. Call it after changing
+        :attr:`filters` directly.
+
+        The changes made less than :attr:`filter_delay` seconds after the last send are
+        coalesced: they are sent together, with the final state, when the delay expires.
+        Use :meth:`flush_filters` to send them immediately.
+        """
+        self._filters_pending = True
+        if self._filters_task is not None:
+            # The pending send will carry this change too
+            return
+        delay = self._filters_sent_at + self.filter_delay - time.monotonic()
+        if delay <= 0:
+            await self._send_filters()
+        else:
+            self._filters_task = self.node.loop.create_task(self._send_filters_later(delay))
+
+    async def flush_filters(self):
+        """
+        Send the filter changes waiting for :attr:`filter_delay` now.
+        """
+        if self._filters_pending:
+            await self._send_filters()
+
+    async def _send_filters_later(self, delay: float):
+        await asyncio.sleep(delay)
+        self._filters_task = None
+        try:
+            await self._send_filters()
+        except Exception:
+            log.exception("Failed to send the filters of player: %r.", self)
+
+    async def _send_filters(self):
+        self._cancel_filters()
+        self._filters_pending = False
+        self._filters_sent_at = time.monotonic()
+        await self.node.set_filters(self.guild.id, self.filters.payload())
+
+    def _cancel_filters(self):
+        if self._filters_task is not None:
+            self._filters_task.cancel()
+            self._filters_task = None
+
     async def bass_boost(self):
         """Bass boost the song"""
-        await self.node.equalizer(self.guild.id,
-                                  [EqualizerBands(0, 0.15), EqualizerBands(1, 0.15), EqualizerBands(2, 0.15)])
+        self.filters.equalizer([EqualizerBands(0, 0.15), EqualizerBands(1, 0.15), EqualizerBands(2, 0.15)])
+        await self.apply_filters()
 
     async def nightcore(self):
         """Apply the effect nightcore on the song"""
-        await self.node.time_scale(self.guild.id, speed=1.20, pitch=1.1, rate=1.20)
+        self.filters.timescale(speed=1.20, pitch=1.1, rate=1.20)
+        await self.apply_filters()
 
     async def random_distortion(self):
         """
@@ -578,25 +1281,31 @@ class Player(RESTClient, VoiceProtocol):
         .. warning::
             It can be extremely painful to listen to
         """
-        await self.node.distortion(
-            self.guild.id,
-            random.randrange(0, 10),
-            random.randrange(0, 10),
-            random.randrange(0, 10),
-            random.randrange(0, 10),
-            random.randrange(0, 10),
-            random.randrange(0, 10),
-            random.randrange(0, 10),
-            random.randrange(0, 10)
-        )
+        self.filters.distortion(*(random.randrange(0, 10) for _ in range(8)))
+        await self.apply_filters()
 
     async def reset_filter(self):
         """Remove any applied filter"""
-        await self.node.reset_filter(self.guild.id)
+        self.filters.clear()
+        await self._send_filters()
+
+    async def filter_volume(self, volume: float = 1.0):
+        """
+        Change the volume with the volume filter, combined with the other filters
+
+        Parameters
+        ----------
+        volume : float
+            The multiplier of the volume of the player, 0 ≤ x ≤ 5
+        """
+        if not (0 <= volume <= 5):
+            raise ValueError("Volume must be 0 ≤ x ≤ 5")
+        self.filters.volume = volume
+        await self.apply_filters()
 
     async def equalizer(self, band: int, gain: float = 0.25):
         """
-        Change the equalizer
+        Change the equalizer, the other bands are kept
 
         Parameters
         ----------
@@ -606,7 +1315,8 @@ class Player(RESTClient, VoiceProtocol):
             is the multiplier for the given band
             -0.25 ≤ x ≤ 1
         """
-        await self.node.equalizer(self.guild.id, [EqualizerBands(band, gain)])
+        self.filters.equalizer([EqualizerBands(band, gain)])
+        await self.apply_filters()
 
     async def karaoke(self, level: float = 1.0, mono_level: float = 1.0, filter_band: float = 220.0,
                       filter_width: float = 100.0):
@@ -624,7 +1334,8 @@ class Player(RESTClient, VoiceProtocol):
         filter_width : float
             the frequency width to filter
         """
-        await self.node.karaoke(self.guild.id, level, mono_level, filter_band, filter_width)
+        self.filters.karaoke(level, mono_level, filter_band, filter_width)
+        await self.apply_filters()
 
     async def rotation(self, rotation: Optional[int] = None):
         """
@@ -639,7 +1350,8 @@ class Player(RESTClient, VoiceProtocol):
         if rotation is None:
             rotation = random.randint(0, 60)
 
-        await self.node.rotation(self.guild.id, rotation=rotation)
+        self.filters.rotation(rotation)
+        await self.apply_filters()
 
     async def timescale(self, speed: float = 1.0, pitch: float = 1.0, rate: float = 1.0):
         """
@@ -654,7 +1366,8 @@ class Player(RESTClient, VoiceProtocol):
         rate : float
             Should be >= 0
         """
-        await self.node.time_scale(self.guild.id, speed, pitch, rate)
+        self.filters.timescale(speed, pitch, rate)
+        await self.apply_filters()
 
     async def vibrato(self, frequency: float = 2.0, depth: float = 0.5):
         """
@@ -667,7 +1380,8 @@ class Player(RESTClient, VoiceProtocol):
         depth : float
             0 < x ≤ 1
         """
-        await self.node.vibrato(self.guild.id, frequency, depth)
+        self.filters.vibrato(frequency, depth)
+        await self.apply_filters()
 
     async def tremolo(self, frequency: float = 2.0, depth: float = 0.5):
         """
@@ -681,7 +1395,8 @@ class Player(RESTClient, VoiceProtocol):
         depth : float
             0 < x ≤ 1
         """
-        await self.node.tremolo(self.guild.id, frequency, depth)
+        self.filters.tremolo(frequency, depth)
+        await self.apply_filters()
 
     async def distortion(self, sin_offset: float = 0, sin_scale: float = 1, cos_offset: float = 0, cos_scale: float = 1,
                          tan_offset: float = 0, tan_scale: float = 1, offset: float = 0, scale: float = 1):
@@ -699,8 +1414,8 @@ class Player(RESTClient, VoiceProtocol):
         offset : float
         scale : float
         """
-        await self.node.distortion(self.guild.id, sin_offset, sin_scale, cos_offset, cos_scale, tan_offset, tan_scale,
-                                   offset, scale)
+        self.filters.distortion(sin_offset, sin_scale, cos_offset, cos_scale, tan_offset, tan_scale, offset, scale)
+        await self.apply_filters()
 
     async def channel_mix(self, left_to_left: float = 1.0, left_to_right: float = 0.0, right_to_left: float = 0.0,
                           right_to_right: float = 1.0):
@@ -714,7 +1429,8 @@ class Player(RESTClient, VoiceProtocol):
         right_to_left : float
         right_to_right : float
         """
-        await self.node.channel_mix(self.guild.id, left_to_left, left_to_right, right_to_left, right_to_right)
+        self.filters.channel_mix(left_to_left, left_to_right, right_to_left, right_to_right)
+        await self.apply_filters()
 
     async def low_pass(self, smoothing: float = 20.0):
         """
@@ -725,4 +1441,5 @@ class Player(RESTClient, VoiceProtocol):
         smoothing : float
             how much to suppress
         """
-        await self.node.low_pass(self.guild.id, smoothing)
+        self.filters.low_pass(smoothing)
+        await self.apply_filters()
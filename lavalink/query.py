@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import re
+from functools import lru_cache
+from typing import Optional
+
+from yarl import URL
+
+from .tuples import QueryInfo
+
+__all__ = ["analyze_query"]
+
+_SEARCH_PREFIXES = {
+    "ytsearch:": "youtube",
+    "ytmsearch:": "youtube",
+    "scsearch:": "soundcloud",
+}
+
+_YOUTUBE_HOSTS = {"youtube.com", "www.youtube.com", "m.youtube.com", "music.youtube.com", "youtu.be"}
+_SOUNDCLOUD_HOSTS = {"soundcloud.com", "www.soundcloud.com", "m.soundcloud.com"}
+_TWITCH_HOSTS = {"twitch.tv", "www.twitch.tv", "m.twitch.tv"}
+
+# Query parameters used only for tracking, they never change the loaded tracks
+_TRACKING_PARAMS = {"si", "feature", "pp", "fbclid", "gclid", "igshid", "ref", "ref_src"}
+
+_re_youtube_id_path = re.compile(r"^/(?:shorts|embed|live|v)/([\w-]+)")
+_re_hms_timestamp = re.compile(r"^(?:(\d+)h)?(?:(\d+)m)?(?:(\d+)s?)?$")
+_re_soundcloud_timestamp = re.compile(r"t=(\d+):(\d+)")
+_re_whitespaces = re.compile(r"\s+")
+
+
+def _parse_hms(value: Optional[str]) -> int:
+    """Parse timestamps like ``90``, ``90s`` or ``1h2m3s`` to milliseconds"""
+    if not value:
+        return 0
+    match = _re_hms_timestamp.match(value)
+    if match is None:
+        return 0
+    hours, minutes, seconds = (int(x) if x else 0 for x in match.groups())
+    return ((hours * 60 + minutes) * 60 + seconds) * 1000
+
+
+def _strip_tracking(url: URL) -> URL:
+    query = [(k, v) for k, v in url.query.items() if k not in _TRACKING_PARAMS and not k.startswith("utm_")]
+    return url.with_query(query).with_fragment(None)
+
+
+def _analyze_search(query: str, prefix: str) -> QueryInfo:
+    terms = _re_whitespaces.sub(" ", query[len(prefix):]).strip()
+    start_time = 0
+    # Kept for compatibility with the previous behaviour
+    if prefix == "ytsearch:" and ("&t=" in query or "?t=" in query):
+        match = re.search(r"[&?]t=(\d+)s?", query)
+        if match:
+            start_time = int(match.group(1)) * 1000
+    return QueryInfo(
+        query=query,
+        canonical=f"{prefix}{terms}",
+        source=_SEARCH_PREFIXES[prefix],
+        identifier=None,
+        start_time=start_time,
+        cache_key=f"{prefix}{terms.lower()}",
+        is_search=True,
+    )
+
+
+def _analyze_youtube(query: str, url: URL) -> QueryInfo:
+    video_id = None
+    if url.host == "youtu.be":
+        video_id = url.path.strip("/") or None
+    elif url.path == "/watch":
+        video_id = url.query.get("v")
+    else:
+        match = _re_youtube_id_path.match(url.path)
+        if match:
+            video_id = match.group(1)
+    playlist_id = url.query.get("list")
+
+    start_time = 0
+    if video_id is not None:
+        canonical = f"https://www.youtube.com/watch?v={video_id}"
+        cache_key = f"youtube:{video_id}"
+        if playlist_id:
+            canonical += f"&list={playlist_id}"
+            cache_key += f":{playlist_id}"
+        start_time = _parse_hms(url.query.get("t") or url.query.get("start"))
+    elif playlist_id:
+        canonical = f"https://www.youtube.com/playlist?list={playlist_id}"
+        cache_key = f"youtube::{playlist_id}"
+    else:
+        canonical = str(_strip_tracking(url.with_host("www.youtube.com")))
+        cache_key = canonical
+
+    return QueryInfo(
+        query=query,
+        canonical=canonical,
+        source="youtube",
+        identifier=video_id or playlist_id,
+        start_time=start_time,
+        cache_key=cache_key,
+        is_search=False,
+    )
+
+
+def _analyze_soundcloud(query: str, url: URL) -> QueryInfo:
+    path = url.path.rstrip("/")
+    start_time = 0
+    # A timestamp in a set makes sense only when a track of the set is linked
+    if "/sets/" not in path or "in" in url.query:
+        match = _re_soundcloud_timestamp.match(url.fragment)
+        if match:
+            start_time = (int(match.group(1)) * 60 + int(match.group(2))) * 1000
+
+    canonical = str(_strip_tracking(url.with_host("soundcloud.com").with_path(path or "/")))
+    return QueryInfo(
+        query=query,
+        canonical=canonical,
+        source="soundcloud",
+        identifier=path.strip("/") or None,
+        start_time=start_time,
+        cache_key=f"soundcloud:{path.lower()}",
+        is_search=False,
+    )
+
+
+def _analyze_twitch(query: str, url: URL) -> QueryInfo:
+    path = url.path.rstrip("/")
+    canonical = str(url.with_host("www.twitch.tv").with_path(path or "/").with_query(None).with_fragment(None))
+    return QueryInfo(
+        query=query,
+        canonical=canonical,
+        source="twitch",
+        identifier=path.strip("/") or None,
+        start_time=_parse_hms(url.query.get("t")),
+        cache_key=f"twitch:{path.lower()}",
+        is_search=False,
+    )
+
+
+@lru_cache(maxsize=2048)
+def analyze_query(query: str) -> QueryInfo:
+    """
+    Analyze a loadtracks query once, so the result can be reused.
+
+    URLs of the known sources are canonicalized: alternative hosts like ``youtu.be`` or ``m.youtube.com``
+    are replaced and the tracking parameters are removed. The start timestamp is extracted from the query,
+    so it is not sent to Lavalink, and the same song gets the same cache key whatever the link.
+    The other queries, URLs of other hosts included, are kept as they are.
+
+    Parameters
+    ----------
+    query : str
+
+    Returns
+    -------
+    QueryInfo
+    """
+    stripped = query.strip()
+    for prefix in _SEARCH_PREFIXES:
+        if stripped.startswith(prefix):
+            return _analyze_search(stripped, prefix)
+
+    try:
+        url = URL(stripped)
+    except ValueError:
+        url = None
+
+    if url is not None and url.scheme in ("http", "https") and url.host:
+        host = url.host.lower()
+        if host in _YOUTUBE_HOSTS:
+            return _analyze_youtube(query, url)
+        elif host in _SOUNDCLOUD_HOSTS:
+            return _analyze_soundcloud(query, url)
+        elif host in _TWITCH_HOSTS:
+            return _analyze_twitch(query, url)
+
+    # Other URLs, local files and identifiers are passed to Lavalink as they are,
+    # their query parameters may be needed to load them
+    return QueryInfo(
+        query=query,
+        canonical=stripped,
+        source=None,
+        identifier=None,
+        start_time=0,
+        cache_key=stripped,
+        is_search=False,
+    )
@@ -0,0 +1,1595 @@
+from __future__ import annotations
+
+import binascii
+import random
+import weakref
+from array import array
+from base64 import b64decode, b64encode
+from bisect import bisect_right
+from collections import deque
+from collections.abc import MutableSequence
+from itertools import accumulate, chain, count
+from typing import Any, Callable, Hashable, Iterable, Iterator, Optional, Union
+
+from .rest_api import Track
+
+__all__ = ["TrackQueue", "CompactTrackQueue", "FairQueue", "PlayHistory"]
+
+
+class _IdentifierIndex(MutableSequence):
+    """Counts the entries of a queue by track identifier"""
+    _counts: dict[str, int]
+
+    def _count_add(self, value: Any):
+        key = getattr(value, "track_identifier", None)
+        if key is not None:
+            self._counts[key] = self._counts.get(key, 0) + 1
+
+    def _count_remove(self, value: Any):
+        key = getattr(value, "track_identifier", None)
+        if key is not None:
+            count = self._counts[key] - 1
+            if count:
+                self._counts[key] = count
+            else:
+                del self._counts[key]
+
+    def __contains__(self, value: Any) -> bool:
+        key = getattr(value, "track_identifier", None)
+        if key is not None:
+            return key in self._counts
+        return any(entry is value or entry == value for entry in self)
+
+    def count(self, value: Any) -> int:
+        """Return the number of occurrences of value"""
+        key = getattr(value, "track_identifier", None)
+        if key is not None:
+            return self._counts.get(key, 0)
+        return sum(1 for entry in self if entry is value or entry == value)
+
+    def dedupe(self) -> int:
+        """
+        Remove the repeated tracks, keeping the first occurrence of each one
+
+        Returns
+        -------
+        int
+            The number of removed entries
+        """
+        if len(self._counts) == sum(self._counts.values()):
+            return 0
+        seen = set()
+        kept = []
+        for entry in self:
+            key = getattr(entry, "track_identifier", None)
+            if key is not None:
+                if key in seen:
+                    continue
+                seen.add(key)
+            kept.append(entry)
+        removed = len(self) - len(kept)
+        self.clear()
+        self.extend(kept)
+        return removed
+
+
+class TrackQueue(_IdentifierIndex):
+    """
+    A list-like queue with logarithmic positional operations.
+
+    The entries are kept in blocks of bounded size, and the sizes of the blocks are indexed
+    by a Fenwick tree. Accessing, inserting, removing or moving the entry at any index
+    locates its block in ``O(log n)`` and then works on a block of at most ``2 * block_size``
+    entries. Besides the :class:`list` methods, it has the :class:`collections.deque`
+    methods used on the queue of a player, like ``appendleft`` and ``popleft``.
+
+    Slicing returns a :class:`list` with the entries in the slice.
+
+    The entries with a ``track_identifier`` are counted by identifier, so membership tests
+    and :meth:`count` take constant time for tracks.
+
+    :meth:`shuffle` moves the entries in place and records the permutation as an array of
+    integers, so :meth:`unshuffle` can restore the previous order. Removing entries keeps the
+    permutation valid, while inserting entries inside the shuffled range discards it.
+    """
+
+    def __init__(self, iterable: Iterable[Any] = (), block_size: int = 512):
+        """
+        Parameters
+        ----------
+        iterable : Iterable[Any]
+            The initial entries of the queue
+        block_size : int
+            The target number of entries of a block
+        """
+        if block_size < 1:
+            raise ValueError("block_size must be positive")
+        self._block_size = block_size
+        self._blocks: list[list[Any]] = []
+        self._tree: list[int] = [0]
+        self._len = 0
+        self._counts: dict[str, int] = {}
+        # For each position of the shuffled range, the position of the entry before the shuffle
+        self._perm: Optional[array] = None
+        self._perm_start = 0
+        self.extend(iterable)
+
+    def __repr__(self) -> str:
+        return f"<TrackQueue: size={self._len}>"
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __bool__(self) -> bool:
+        return self._len > 0
+
+    def __iter__(self) -> Iterator[Any]:
+        return chain.from_iterable(self._blocks)
+
+    def __reversed__(self) -> Iterator[Any]:
+        for block in reversed(self._blocks):
+            yield from reversed(block)
+
+    # Shuffle
+
+    @property
+    def shuffled(self) -> bool:
+        """Whether the order before the last shuffle can be restored"""
+        return self._perm is not None
+
+    def shuffle(
+            self,
+            start: int = 0,
+            keep_first: Optional[Callable[[Any], bool]] = None,
+            rng: Optional[random.Random] = None,
+    ):
+        """
+        Shuffle the entries from index start, in place, with the Fisher-Yates algorithm
+
+        Parameters
+        ----------
+        start : int
+            The entries before this index are not moved
+        keep_first : Optional[Callable[[Any], bool]]
+            The entries for which it returns True are not shuffled, but moved
+            in their order right after start
+        rng : Optional[random.Random]
+            The random generator to use
+        """
+        start = self._normalize(start, insert=True)
+        size = self._len - start
+        if size < 2:
+            return
+
+        kept = array("l")
+        if keep_first is None:
+            order = array("l", range(size))
+        else:
+            order = array("l")
+            for i, entry in enumerate(self._iter_from(start)):
+                (kept if keep_first(entry) else order).append(i)
+
+        # Fisher-Yates over the positions, then the entries are moved once
+        randbelow = (rng or random).randrange
+        for i in range(len(order) - 1, 0, -1):
+            j = randbelow(i + 1)
+            order[i], order[j] = order[j], order[i]
+        order = kept + order
+        self._permute(start, order)
+
+        if self._perm is not None and self._perm_start == start and len(self._perm) == size:
+            # Shuffling again, the positions keep referring to the order before the first shuffle
+            previous = self._perm
+            order = array("l", (previous[i] for i in order))
+        self._perm = order
+        self._perm_start = start
+
+    def unshuffle(self) -> bool:
+        """
+        Restore the order the entries had before the last shuffle, in ``O(n)``
+
+        Returns
+        -------
+        bool
+            False if there is no shuffle to revert
+        """
+        if self._perm is None:
+            return False
+        perm, start = self._perm, self._perm_start
+        self._perm = None
+
+        # The removed entries leave holes in the original positions
+        slots = array("l", [-1]) * (max(perm) + 1)
+        for position, original in enumerate(perm):
+            slots[original] = position
+        self._permute(start, array("l", (position for position in slots if position >= 0)))
+        return True
+
+    def _iter_from(self, start: int) -> Iterator[Any]:
+        block_index, offset = self._locate(start)
+        if block_index < len(self._blocks):
+            yield from self._blocks[block_index][offset:]
+            yield from chain.from_iterable(self._blocks[block_index + 1:])
+
+    def _permute(self, start: int, order: array):
+        """Move the entry at start + order[i] to start + i, following the cycles of the permutation"""
+        blocks = self._blocks
+        starts = list(accumulate((len(block) for block in blocks), initial=0))
+
+        def locate(index):
+            block_index = bisect_right(starts, index) - 1
+            return blocks[block_index], index - starts[block_index]
+
+        visited = bytearray(len(order))
+        for i in range(len(order)):
+            if visited[i] or order[i] == i:
+                continue
+            block, offset = locate(start + i)
+            first = block[offset]
+            current = i
+            while True:
+                visited[current] = 1
+                source = order[current]
+                block, offset = locate(start + current)
+                if source == i:
+                    block[offset] = first
+                    break
+                source_block, source_offset = locate(start + source)
+                block[offset] = source_block[source_offset]
+                current = source
+
+    def _perm_removed(self, index: int):
+        if self._perm is None:
+            return
+        if index < self._perm_start:
+            self._perm_start -= 1
+        elif index < self._perm_start + len(self._perm):
+            del self._perm[index - self._perm_start]
+            if not self._perm:
+                self._perm = None
+
+    def _perm_inserted(self, index: int):
+        if self._perm is None:
+            return
+        if index <= self._perm_start:
+            self._perm_start += 1
+        elif index < self._perm_start + len(self._perm):
+            self._perm = None
+
+    # Fenwick tree over the block sizes
+
+    def _rebuild(self):
+        tree = [0] * (len(self._blocks) + 1)
+        for i, block in enumerate(self._blocks, 1):
+            tree[i] += len(block)
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _update(self, block_index: int, delta: int):
+        i = block_index + 1
+        tree = self._tree
+        while i < len(tree):
+            tree[i] += delta
+            i += i & -i
+
+    def _locate(self, index: int) -> tuple[int, int]:
+        """Find the block of the entry at index and the offset in the block"""
+        tree = self._tree
+        pos = 0
+        step = 1 << (len(tree) - 1).bit_length()
+        while step:
+            nxt = pos + step
+            if nxt < len(tree) and tree[nxt] <= index:
+                pos = nxt
+                index -= tree[nxt]
+            step >>= 1
+        return pos, index
+
+    def _normalize(self, index: int, insert: bool = False) -> int:
+        if index < 0:
+            index += self._len
+        if insert:
+            return min(max(index, 0), self._len)
+        if not 0 <= index < self._len:
+            raise IndexError("queue index out of range")
+        return index
+
+    def _after_insert(self, block_index: int):
+        block = self._blocks[block_index]
+        if len(block) > 2 * self._block_size:
+            half = len(block) // 2
+            self._blocks[block_index:block_index + 1] = [block[:half], block[half:]]
+            self._rebuild()
+        else:
+            self._update(block_index, 1)
+
+    def _after_delete(self, block_index: int):
+        if self._blocks[block_index]:
+            self._update(block_index, -1)
+        else:
+            del self._blocks[block_index]
+            self._rebuild()
+
+    # Sequence methods
+
+    def __getitem__(self, index: Union[int, slice]) -> Any:
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._len)
+            if step == 1:
+                return self._range(start, stop)
+            return [self[i] for i in range(start, stop, step)]
+        block_index, offset = self._locate(self._normalize(index))
+        return self._blocks[block_index][offset]
+
+    def _range(self, start: int, stop: int) -> list[Any]:
+        if start >= stop:
+            return []
+        block_index, offset = self._locate(start)
+        result = []
+        remaining = stop - start
+        while remaining > 0:
+            chunk = self._blocks[block_index][offset:offset + remaining]
+            result.extend(chunk)
+            remaining -= len(chunk)
+            block_index += 1
+            offset = 0
+        return result
+
+    def __setitem__(self, index: int, value: Any):
+        if isinstance(index, slice):
+            raise TypeError("TrackQueue doesn't support slice assignment")
+        block_index, offset = self._locate(self._normalize(index))
+        block = self._blocks[block_index]
+        self._count_remove(block[offset])
+        self._count_add(value)
+        block[offset] = value
+
+    def __delitem__(self, index: int):
+        if isinstance(index, slice):
+            raise TypeError("TrackQueue doesn't support slice deletion")
+        index = self._normalize(index)
+        block_index, offset = self._locate(index)
+        self._count_remove(self._blocks[block_index].pop(offset))
+        self._perm_removed(index)
+        self._len -= 1
+        self._after_delete(block_index)
+
+    def insert(self, index: int, value: Any):
+        """
+        Insert an entry before index
+
+        Parameters
+        ----------
+        index : int
+        value : Any
+        """
+        index = self._normalize(index, insert=True)
+        self._count_add(value)
+        self._perm_inserted(index)
+        if not self._blocks:
+            self._blocks.append([value])
+            self._len = 1
+            self._rebuild()
+            return
+        if index == self._len:
+            block_index, offset = len(self._blocks) - 1, len(self._blocks[-1])
+        else:
+            block_index, offset = self._locate(index)
+        self._blocks[block_index].insert(offset, value)
+        self._len += 1
+        self._after_insert(block_index)
+
+    def append(self, value: Any):
+        """Add an entry to the end of the queue"""
+        if not self._blocks:
+            self.insert(0, value)
+            return
+        self._count_add(value)
+        self._blocks[-1].append(value)
+        self._len += 1
+        self._after_insert(len(self._blocks) - 1)
+
+    def appendleft(self, value: Any):
+        """Add an entry to the start of the queue"""
+        self.insert(0, value)
+
+    def extend(self, values: Iterable[Any]):
+        """
+        Add many entries to the end of the queue
+
+        Parameters
+        ----------
+        values : Iterable[Any]
+        """
+        values = list(values)
+        if not values:
+            return
+        for value in values:
+            self._count_add(value)
+        size = self._block_size
+        if self._blocks and len(self._blocks[-1]) < size:
+            fill = size - len(self._blocks[-1])
+            self._blocks[-1].extend(values[:fill])
+            values = values[fill:]
+        self._blocks.extend(values[i:i + size] for i in range(0, len(values), size))
+        self._len = sum(map(len, self._blocks))
+        self._rebuild()
+
+    def pop(self, index: int = -1) -> Any:
+        """
+        Remove and return the entry at index, the last one by default
+
+        Raises
+        ------
+        IndexError
+            If the queue is empty or the index is out of range
+        """
+        if not self._len:
+            raise IndexError("pop from an empty queue")
+        index = self._normalize(index)
+        block_index, offset = self._locate(index)
+        value = self._blocks[block_index].pop(offset)
+        self._count_remove(value)
+        self._perm_removed(index)
+        self._len -= 1
+        self._after_delete(block_index)
+        return value
+
+    def popleft(self) -> Any:
+        """
+        Remove and return the first entry
+
+        Raises
+        ------
+        IndexError
+            If the queue is empty
+        """
+        if not self._len:
+            raise IndexError("pop from an empty queue")
+        value = self._blocks[0].pop(0)
+        self._count_remove(value)
+        self._perm_removed(0)
+        self._len -= 1
+        self._after_delete(0)
+        return value
+
+    def move(self, source: int, destination: int):
+        """
+        Move the entry at index source to index destination
+
+        Parameters
+        ----------
+        source : int
+        destination : int
+            The index of the entry after the move
+        """
+        value = self.pop(source)
+        self.insert(destination, value)
+
+    # Bulk methods
+
+    def _set_entries(self, values: list[Any]):
+        size = self._block_size
+        self._blocks = [values[i:i + size] for i in range(0, len(values), size)]
+        self._len = len(values)
+        self._rebuild()
+
+    def insert_many(self, index: int, values: Iterable[Any]):
+        """
+        Insert many entries before index, in their order
+
+        Parameters
+        ----------
+        index : int
+        values : Iterable[Any]
+        """
+        values = list(values)
+        if not values:
+            return
+        index = self._normalize(index, insert=True)
+        for value in values:
+            self._count_add(value)
+        if self._perm is not None:
+            if index <= self._perm_start:
+                self._perm_start += len(values)
+            elif index < self._perm_start + len(self._perm):
+                self._perm = None
+        if not self._blocks:
+            self._set_entries(values)
+            return
+
+        if index == self._len:
+            block_index, offset = len(self._blocks) - 1, len(self._blocks[-1])
+        else:
+            block_index, offset = self._locate(index)
+        block = self._blocks[block_index]
+        merged = block[:offset] + values + block[offset:]
+        size = self._block_size
+        self._blocks[block_index:block_index + 1] = [merged[i:i + size] for i in range(0, len(merged), size)]
+        self._len += len(values)
+        self._rebuild()
+
+    def remove_where(self, predicate: Callable[[Any], bool]) -> list[Any]:
+        """
+        Remove the entries for which predicate returns True, in a single pass
+
+        Parameters
+        ----------
+        predicate : Callable[[Any], bool]
+
+        Returns
+        -------
+        list[Any]
+            The removed entries, in their order
+        """
+        perm, perm_start = self._perm, self._perm_start
+        kept_perm = array("l")
+        removed_before = 0
+        kept, removed = [], []
+        for index, value in enumerate(chain.from_iterable(self._blocks)):
+            if predicate(value):
+                removed.append(value)
+                self._count_remove(value)
+                if index < perm_start:
+                    removed_before += 1
+            else:
+                kept.append(value)
+                if perm is not None and perm_start <= index < perm_start + len(perm):
+                    kept_perm.append(perm[index - perm_start])
+        if removed:
+            self._set_entries(kept)
+            if perm is not None:
+                self._perm = kept_perm or None
+                self._perm_start = perm_start - removed_before
+        return removed
+
+    def move_range(self, start: int, stop: int, destination: int):
+        """
+        Move the entries from index start to stop, excluded, keeping their order.
+        It discards the order recorded by the last shuffle.
+
+        Parameters
+        ----------
+        start : int
+        stop : int
+        destination : int
+            The index of the first moved entry after the move
+        """
+        start, stop, _ = slice(start, stop).indices(self._len)
+        if start >= stop:
+            return
+        entries = list(chain.from_iterable(self._blocks))
+        moving = entries[start:stop]
+        del entries[start:stop]
+        if destination < 0:
+            destination += len(entries)
+        destination = min(max(destination, 0), len(entries))
+        entries[destination:destination] = moving
+        self._set_entries(entries)
+        self._perm = None
+
+    def clear(self):
+        """Remove all the entries"""
+        self._blocks = []
+        self._tree = [0]
+        self._len = 0
+        self._counts = {}
+        self._perm = None
+
+
+# Flags of the rows of CompactTrackQueue
+_SEEKABLE = 1
+_STREAM = 2
+_HAS_REQUESTER = 4
+_HAS_POSITION = 8
+_HAS_IDENTIFIER = 16
+_HAS_TITLE = 32
+_HAS_URI = 64
+# The uri is an interned prefix followed by the identifier, like the YouTube URLs
+_URI_FROM_IDENTIFIER = 128
+
+
+def _pack_blob(blob: Optional[str]) -> Union[bytes, str, None]:
+    """Decode a base64 track identifier, which takes 3/4 of the space as bytes"""
+    if blob is None:
+        return None
+    try:
+        raw = b64decode(blob, validate=True)
+    except (binascii.Error, ValueError):
+        return blob
+    # Only the canonical encodings can be restored exactly
+    return raw if b64encode(raw).decode() == blob else blob
+
+
+def _unpack_blob(blob: Union[bytes, str, None]) -> Optional[str]:
+    if isinstance(blob, bytes):
+        return b64encode(blob).decode()
+    return blob
+
+
+class CompactTrackQueue(TrackQueue):
+    """
+    A :class:`TrackQueue` that stores the tracks in columns instead of :class:`Track` objects.
+
+    The blobs of the tracks are kept decoded as bytes, the identifier, title and uri of a
+    track are packed in a single string, the numeric fields and the flags are kept in arrays,
+    the authors and sources are interned, and the requesters are stored by ID. A track takes
+    a bit more than half of the memory it takes in a :class:`TrackQueue`.
+    Entries that aren't tracks, like :class:`PendingTrack`, and tracks whose requester has
+    no ID are kept as they are.
+
+    Accessing an entry materializes a :class:`Track` view of it. The view is cached while
+    it is referenced, so accessing the same entry again returns the same object, and the
+    changes made to it are kept when it's removed from the queue. The changes made to a view
+    that is no longer referenced are lost, assign the track to its index to store them.
+
+    The requester of the views is the requester ID, or the result of ``resolve_requester``
+    called with it.
+    """
+
+    def __init__(
+            self,
+            iterable: Iterable[Any] = (),
+            block_size: int = 512,
+            resolve_requester: Optional[Callable[[int], Any]] = None,
+    ):
+        """
+        Parameters
+        ----------
+        iterable : Iterable[Any]
+            The initial entries of the queue
+        block_size : int
+            The target number of entries of a block
+        resolve_requester : Optional[Callable[[int], Any]]
+            Returns the requester of the views from its ID, like :meth:`discord.Client.get_user`
+        """
+        self.resolve_requester = resolve_requester
+        self._reset_columns()
+        super().__init__(iterable, block_size)
+
+    def __repr__(self) -> str:
+        return f"<CompactTrackQueue: size={self._len}>"
+
+    def _reset_columns(self):
+        self._blobs: list[Union[bytes, str, None]] = []
+        # identifier + title + uri, with the lengths of the identifier and the title in _text_offsets
+        self._texts: list[Optional[str]] = []
+        self._text_offsets = array("I")
+        self._authors = array("l")
+        self._sources = array("l")
+        self._uri_prefixes = array("l")
+        # length, position and start timestamp of each row
+        self._numbers = array("q")
+        self._flags = bytearray()
+        self._requesters = array("q")
+        self._extras: dict[int, dict[str, Any]] = {}
+        # The entries that aren't stored in the columns
+        self._objects: dict[int, Any] = {}
+        self._strings: list[Optional[str]] = []
+        self._string_ids: dict[Optional[str], int] = {}
+        self._free: list[int] = []
+        self._views: weakref.WeakValueDictionary[int, Track] = weakref.WeakValueDictionary()
+
+    def _intern(self, value: Optional[str]) -> int:
+        string_id = self._string_ids.get(value)
+        if string_id is None:
+            string_id = self._string_ids[value] = len(self._strings)
+            self._strings.append(value)
+        return string_id
+
+    # Rows
+
+    def _allocate(self) -> int:
+        if self._free:
+            return self._free.pop()
+        row = len(self._blobs)
+        self._blobs.append(None)
+        self._texts.append(None)
+        self._text_offsets.extend((0, 0))
+        self._authors.append(0)
+        self._sources.append(0)
+        self._uri_prefixes.append(0)
+        self._numbers.extend((0, 0, 0))
+        self._flags.append(0)
+        self._requesters.append(0)
+        return row
+
+    def _store(self, value: Any) -> int:
+        row = self._allocate()
+        if type(value) is not Track:
+            self._objects[row] = value
+            self._blobs[row] = _pack_blob(getattr(value, "track_identifier", None))
+            return row
+
+        requester = value.requester
+        requester_id = getattr(requester, "id", requester)
+        if requester is not None and not isinstance(requester_id, int):
+            self._objects[row] = value
+            self._blobs[row] = _pack_blob(value.track_identifier)
+            return row
+
+        flags = 0
+        if value.seekable:
+            flags |= _SEEKABLE
+        if value.is_stream:
+            flags |= _STREAM
+        if requester is not None:
+            flags |= _HAS_REQUESTER
+            self._requesters[row] = requester_id
+        if value.position is not None:
+            flags |= _HAS_POSITION
+
+        identifier, title, uri = value.identifier or "", value.title or "", value.uri or ""
+        if value.identifier is not None:
+            flags |= _HAS_IDENTIFIER
+        if value.title is not None:
+            flags |= _HAS_TITLE
+        if value.uri is not None:
+            flags |= _HAS_URI
+            if identifier and uri.endswith(identifier):
+                flags |= _URI_FROM_IDENTIFIER
+                self._uri_prefixes[row] = self._intern(uri[:-len(identifier)])
+                uri = ""
+        self._texts[row] = identifier + title + uri
+        self._text_offsets[2 * row] = len(identifier)
+        self._text_offsets[2 * row + 1] = len(identifier) + len(title)
+
+        self._flags[row] = flags
+        self._blobs[row] = _pack_blob(value.track_identifier)
+        self._authors[row] = self._intern(value.author)
+        self._sources[row] = self._intern(value.source)
+        i = 3 * row
+        self._numbers[i] = value.length or 0
+        self._numbers[i + 1] = value.position or 0
+        self._numbers[i + 2] = value.start_timestamp or 0
+        if value._extras:
+            self._extras[row] = value._extras
+        return row
+
+    def _load(self, row: int) -> Any:
+        view = self._views.get(row)
+        if view is not None:
+            return view
+        if row in self._objects:
+            return self._objects[row]
+
+        flags = self._flags[row]
+        text = self._texts[row]
+        title_start, uri_start = self._text_offsets[2 * row], self._text_offsets[2 * row + 1]
+        identifier = text[:title_start]
+        i = 3 * row
+        track = Track.__new__(Track)
+        track.track_identifier = _unpack_blob(self._blobs[row])
+        track.identifier = identifier if flags & _HAS_IDENTIFIER else None
+        track.source = self._strings[self._sources[row]]
+        track.seekable = bool(flags & _SEEKABLE)
+        track.author = self._strings[self._authors[row]]
+        track.length = self._numbers[i]
+        track.is_stream = bool(flags & _STREAM)
+        track.position = self._numbers[i + 1] if flags & _HAS_POSITION else None
+        track.title = text[title_start:uri_start] if flags & _HAS_TITLE else None
+        if flags & _URI_FROM_IDENTIFIER:
+            track.uri = self._strings[self._uri_prefixes[row]] + identifier
+        else:
+            track.uri = text[uri_start:] if flags & _HAS_URI else None
+        track.start_timestamp = self._numbers[i + 2]
+        track._extras = self._extras.get(row)
+        if flags & _HAS_REQUESTER:
+            requester_id = self._requesters[row]
+            requester = self.resolve_requester(requester_id) if self.resolve_requester else None
+            track.requester = requester if requester is not None else requester_id
+        else:
+            track.requester = None
+        self._views[row] = track
+        return track
+
+    def _release(self, row: int) -> Any:
+        """Return the entry of a row removed from the queue and free the row"""
+        value = self._load(row)
+        self._views.pop(row, None)
+        self._objects.pop(row, None)
+        self._extras.pop(row, None)
+        self._blobs[row] = self._texts[row] = None
+        self._free.append(row)
+        return value
+
+    def _maybe_compact_rows(self):
+        if len(self._free) > 1024 and 4 * len(self._free) > 3 * len(self._blobs):
+            self._compact_rows()
+
+    def _compact_rows(self):
+        """Renumber the rows in the order of the queue, to release the space of the free ones"""
+        rows = list(chain.from_iterable(self._blocks))
+        self._blobs = [self._blobs[row] for row in rows]
+        self._texts = [self._texts[row] for row in rows]
+        self._text_offsets = array("I", (self._text_offsets[2 * row + field] for row in rows for field in range(2)))
+        self._authors = array("l", (self._authors[row] for row in rows))
+        self._sources = array("l", (self._sources[row] for row in rows))
+        self._uri_prefixes = array("l", (self._uri_prefixes[row] for row in rows))
+        self._numbers = array("q", (self._numbers[3 * row + field] for row in rows for field in range(3)))
+        self._flags = bytearray(self._flags[row] for row in rows)
+        self._requesters = array("q", (self._requesters[row] for row in rows))
+
+        renumbered = {row: new for new, row in enumerate(rows)}
+        self._extras = {renumbered[row]: extras for row, extras in self._extras.items()}
+        self._objects = {renumbered[row]: value for row, value in self._objects.items()}
+        views = weakref.WeakValueDictionary()
+        for row, view in self._views.items():
+            views[renumbered[row]] = view
+        self._views = views
+        self._free = []
+
+        new = iter(range(len(rows)))
+        self._blocks = [[next(new) for _ in block] for block in self._blocks]
+
+    def _count_add(self, row: int):
+        key = self._blobs[row]
+        if key is not None:
+            self._counts[key] = self._counts.get(key, 0) + 1
+
+    def _count_remove(self, row: int):
+        key = self._blobs[row]
+        if key is not None:
+            count = self._counts[key] - 1
+            if count:
+                self._counts[key] = count
+            else:
+                del self._counts[key]
+
+    def __contains__(self, value: Any) -> bool:
+        key = getattr(value, "track_identifier", None)
+        if key is not None:
+            return _pack_blob(key) in self._counts
+        return any(entry is value or entry == value for entry in self)
+
+    def count(self, value: Any) -> int:
+        """Return the number of occurrences of value"""
+        key = getattr(value, "track_identifier", None)
+        if key is not None:
+            return self._counts.get(_pack_blob(key), 0)
+        return sum(1 for entry in self if entry is value or entry == value)
+
+    # Sequence methods, the blocks of the TrackQueue contain the rows
+
+    def __iter__(self) -> Iterator[Any]:
+        return map(self._load, super().__iter__())
+
+    def __reversed__(self) -> Iterator[Any]:
+        return map(self._load, super().__reversed__())
+
+    def _iter_from(self, start: int) -> Iterator[Any]:
+        return map(self._load, super()._iter_from(start))
+
+    def __getitem__(self, index: Union[int, slice]) -> Any:
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._len)
+            if step == 1:
+                rows = self._range(start, stop)
+            else:
+                rows = [super(CompactTrackQueue, self).__getitem__(i) for i in range(start, stop, step)]
+            return [self._load(row) for row in rows]
+        return self._load(super().__getitem__(index))
+
+    def __setitem__(self, index: int, value: Any):
+        if isinstance(index, slice):
+            raise TypeError("CompactTrackQueue doesn't support slice assignment")
+        block_index, offset = self._locate(self._normalize(index))
+        block = self._blocks[block_index]
+        old, row = block[offset], self._store(value)
+        self._count_remove(old)
+        self._count_add(row)
+        block[offset] = row
+        self._release(old)
+        self._maybe_compact_rows()
+
+    def __delitem__(self, index: int):
+        self.pop(index)
+
+    def insert(self, index: int, value: Any):
+        """
+        Insert an entry before index
+
+        Parameters
+        ----------
+        index : int
+        value : Any
+        """
+        super().insert(index, self._store(value))
+
+    def append(self, value: Any):
+        """Add an entry to the end of the queue"""
+        row = self._store(value)
+        if self._blocks:
+            super().append(row)
+        else:
+            super().insert(0, row)
+
+    def extend(self, values: Iterable[Any]):
+        """
+        Add many entries to the end of the queue
+
+        Parameters
+        ----------
+        values : Iterable[Any]
+        """
+        super().extend([self._store(value) for value in values])
+
+    def pop(self, index: int = -1) -> Any:
+        """
+        Remove and return the entry at index, the last one by default
+
+        Raises
+        ------
+        IndexError
+            If the queue is empty or the index is out of range
+        """
+        value = self._release(super().pop(index))
+        self._maybe_compact_rows()
+        return value
+
+    def popleft(self) -> Any:
+        """
+        Remove and return the first entry
+
+        Raises
+        ------
+        IndexError
+            If the queue is empty
+        """
+        value = self._release(super().popleft())
+        self._maybe_compact_rows()
+        return value
+
+    def move(self, source: int, destination: int):
+        """
+        Move the entry at index source to index destination
+
+        Parameters
+        ----------
+        source : int
+        destination : int
+            The index of the entry after the move
+        """
+        # The row is moved, the entry isn't materialized
+        super().insert(destination, super().pop(source))
+
+    def insert_many(self, index: int, values: Iterable[Any]):
+        """
+        Insert many entries before index, in their order
+
+        Parameters
+        ----------
+        index : int
+        values : Iterable[Any]
+        """
+        super().insert_many(index, [self._store(value) for value in values])
+
+    def remove_where(self, predicate: Callable[[Any], bool]) -> list[Any]:
+        """
+        Remove the entries for which predicate returns True, in a single pass
+
+        Parameters
+        ----------
+        predicate : Callable[[Any], bool]
+
+        Returns
+        -------
+        list[Any]
+            The removed entries, in their order
+        """
+        rows = super().remove_where(lambda row: predicate(self._load(row)))
+        removed = [self._release(row) for row in rows]
+        self._maybe_compact_rows()
+        return removed
+
+    def clear(self):
+        """Remove all the entries"""
+        super().clear()
+        self._reset_columns()
+
+
+def _requester_key(entry: Any) -> Hashable:
+    requester = getattr(entry, "requester", None)
+    return getattr(requester, "id", requester)
+
+
+class FairQueue(_IdentifierIndex):
+    """
+    A queue that interleaves the entries of the different requesters.
+
+    Every requester has its own sub-queue, and the next entry is taken from the sub-queues
+    in round-robin, so a requester adding a long playlist doesn't delay the others.
+    With ``weighted`` set, the turns are weighted by duration with the deficit round-robin
+    algorithm: on each turn a requester receives ``quantum`` milliseconds of credit and plays
+    entries while the credit covers their length, so every requester gets the same playback time.
+    Taking the next entry with :meth:`popleft` is ``O(1)``.
+
+    It can be iterated, indexed and sliced like a :class:`TrackQueue`, in the order the
+    entries are going to be played. Reading the next entry, at index 0, is ``O(1)``. Other
+    indexes compute that order in ``O(n)`` and cache it until the queue changes. Inserting puts the entry among the ones of its requester,
+    inserting at index 0 also gives the next turn to the requester.
+    """
+
+    def __init__(self, iterable: Iterable[Any] = (), weighted: bool = False, quantum: int = 600_000):
+        """
+        Parameters
+        ----------
+        iterable : Iterable[Any]
+            The initial entries of the queue
+        weighted : bool
+            Whether the turns are weighted by the duration of the entries
+        quantum : int
+            The playback credit in milliseconds given on each turn when weighted.
+            Longer entries and streams count as long as the quantum.
+        """
+        if quantum < 1:
+            raise ValueError("quantum must be positive")
+        self.weighted = weighted
+        self.quantum = quantum
+        self._queues: dict[Hashable, deque] = {}
+        self._rotation: deque[Hashable] = deque()
+        self._deficits: dict[Hashable, int] = {}
+        # Whether the requester at the front of the rotation already received the credit of its turn
+        self._in_turn = False
+        self._len = 0
+        self._counts: dict[str, int] = {}
+        self._view: Optional[list[tuple[Hashable, int]]] = None
+        self.extend(iterable)
+
+    def __repr__(self) -> str:
+        return f"<FairQueue: size={self._len}, requesters={len(self._queues)}, weighted={self.weighted}>"
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __bool__(self) -> bool:
+        return self._len > 0
+
+    def __iter__(self) -> Iterator[Any]:
+        for key, index in self._schedule():
+            yield self._queues[key][index]
+
+    def __reversed__(self) -> Iterator[Any]:
+        for key, index in reversed(self._order()):
+            yield self._queues[key][index]
+
+    @property
+    def requesters(self) -> int:
+        """The number of requesters with entries in the queue"""
+        return len(self._queues)
+
+    def _cost(self, entry: Any) -> int:
+        length = getattr(entry, "length", 0) or 0
+        if getattr(entry, "is_stream", False) or length <= 0:
+            return self.quantum
+        return min(length, self.quantum)
+
+    def _schedule(self) -> Iterator[tuple[Hashable, int]]:
+        """Simulate the turns, yielding the requester and the index in its sub-queue of each entry"""
+        rotation = deque(self._rotation)
+        deficits = dict(self._deficits)
+        in_turn = self._in_turn
+        positions = dict.fromkeys(rotation, 0)
+        while rotation:
+            key = rotation[0]
+            index = positions[key]
+            queue = self._queues[key]
+            if self.weighted:
+                if not in_turn:
+                    deficits[key] = deficits.get(key, 0) + self.quantum
+                    in_turn = True
+                cost = self._cost(queue[index])
+                if deficits[key] < cost:
+                    rotation.rotate(-1)
+                    in_turn = False
+                    continue
+                deficits[key] -= cost
+            yield key, index
+            positions[key] = index + 1
+            if index + 1 == len(queue):
+                rotation.popleft()
+                deficits.pop(key, None)
+                in_turn = False
+            elif not self.weighted:
+                rotation.rotate(-1)
+
+    def _order(self) -> list[tuple[Hashable, int]]:
+        if self._view is None:
+            self._view = list(self._schedule())
+        return self._view
+
+    def _head(self) -> Hashable:
+        """The requester of the next entry, found without simulating the whole schedule"""
+        key = self._rotation[0]
+        if self.weighted and len(self._rotation) > 1:
+            deficit = self._deficits.get(key, 0) + (0 if self._in_turn else self.quantum)
+            if deficit < self._cost(self._queues[key][0]):
+                # Since the cost is at most the quantum, the next requester can always play
+                key = self._rotation[1]
+        return key
+
+    def _locate(self, index: int) -> tuple[Hashable, int]:
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError("queue index out of range")
+        if index == 0 and self._view is None:
+            # The next entry is read after every change, e.g. to prepare the next track
+            return self._head(), 0
+        return self._order()[index]
+
+    def _drop_requester(self, key: Hashable):
+        if self._rotation and self._rotation[0] == key:
+            self._in_turn = False
+        del self._queues[key]
+        self._rotation.remove(key)
+        self._deficits.pop(key, None)
+
+    def __getitem__(self, index: Union[int, slice]) -> Any:
+        if isinstance(index, slice):
+            return [self._queues[key][i] for key, i in self._order()[index]]
+        key, i = self._locate(index)
+        return self._queues[key][i]
+
+    def __setitem__(self, index: int, value: Any):
+        if isinstance(index, slice):
+            raise TypeError("FairQueue doesn't support slice assignment")
+        key, i = self._locate(index)
+        if _requester_key(value) != key:
+            # The entry belongs to another sub-queue
+            del self[index]
+            self.insert(index, value)
+            return
+        queue = self._queues[key]
+        self._count_remove(queue[i])
+        self._count_add(value)
+        queue[i] = value
+        self._view = None
+
+    def __delitem__(self, index: int):
+        self.pop(index)
+
+    def insert(self, index: int, value: Any):
+        """
+        Insert an entry among the ones of its requester, before index
+
+        Parameters
+        ----------
+        index : int
+        value : Any
+        """
+        if index < 0:
+            index += self._len
+        index = min(max(index, 0), self._len)
+        key = _requester_key(value)
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = deque()
+            if index == 0:
+                self._rotation.appendleft(key)
+            else:
+                self._rotation.append(key)
+        elif index == 0 and self._rotation[0] != key:
+            self._rotation.remove(key)
+            self._rotation.appendleft(key)
+        if index == 0 and self.weighted:
+            # The requester plays the entry right now, with the credit it needs
+            self._in_turn = True
+            self._deficits[key] = max(self._deficits.get(key, 0), self._cost(value))
+
+        position = sum(1 for k, _ in self._order()[:index] if k == key) if index else 0
+        queue.insert(position, value)
+        self._count_add(value)
+        self._len += 1
+        self._view = None
+
+    def append(self, value: Any):
+        """Add an entry to the end of the sub-queue of its requester"""
+        key = _requester_key(value)
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = deque()
+            self._rotation.append(key)
+        queue.append(value)
+        self._count_add(value)
+        self._len += 1
+        self._view = None
+
+    def appendleft(self, value: Any):
+        """Add an entry to be played next"""
+        self.insert(0, value)
+
+    def extend(self, values: Iterable[Any]):
+        """
+        Add many entries to the sub-queues of their requesters
+
+        Parameters
+        ----------
+        values : Iterable[Any]
+        """
+        for value in values:
+            self.append(value)
+
+    def pop(self, index: int = -1) -> Any:
+        """
+        Remove and return the entry at index, the last one by default
+
+        Raises
+        ------
+        IndexError
+            If the queue is empty or the index is out of range
+        """
+        if not self._len:
+            raise IndexError("pop from an empty queue")
+        if index == 0:
+            return self.popleft()
+        key, i = self._locate(index)
+        queue = self._queues[key]
+        value = queue[i]
+        del queue[i]
+        if not queue:
+            self._drop_requester(key)
+        self._count_remove(value)
+        self._len -= 1
+        self._view = None
+        return value
+
+    def popleft(self) -> Any:
+        """
+        Remove and return the next entry
+
+        Raises
+        ------
+        IndexError
+            If the queue is empty
+        """
+        if not self._len:
+            raise IndexError("pop from an empty queue")
+        while True:
+            key = self._rotation[0]
+            queue = self._queues[key]
+            if not self.weighted:
+                break
+            if not self._in_turn:
+                self._deficits[key] = self._deficits.get(key, 0) + self.quantum
+                self._in_turn = True
+            cost = self._cost(queue[0])
+            if self._deficits[key] >= cost:
+                self._deficits[key] -= cost
+                break
+            # Since the cost is at most the quantum, the next requester can always play
+            self._rotation.rotate(-1)
+            self._in_turn = False
+
+        value = queue.popleft()
+        if not queue:
+            self._drop_requester(key)
+        elif not self.weighted:
+            self._rotation.rotate(-1)
+        self._count_remove(value)
+        self._len -= 1
+        self._view = None
+        return value
+
+    def move(self, source: int, destination: int):
+        """
+        Move the entry at index source before the entry at index destination,
+        within the entries of the same requester
+
+        Parameters
+        ----------
+        source : int
+        destination : int
+        """
+        value = self.pop(source)
+        self.insert(destination, value)
+
+    def insert_many(self, index: int, values: Iterable[Any]):
+        """
+        Insert many entries among the ones of their requesters, before index.
+        Inserting at index 0 gives the next turn to the requester of the first entry.
+
+        Parameters
+        ----------
+        index : int
+        values : Iterable[Any]
+        """
+        values = list(values)
+        if not values:
+            return
+        if index < 0:
+            index += self._len
+        index = min(max(index, 0), self._len)
+        positions: dict[Hashable, int] = {}
+        for key, _ in self._order()[:index]:
+            positions[key] = positions.get(key, 0) + 1
+
+        first = index == 0
+        for value in values:
+            key = _requester_key(value)
+            queue = self._queues.get(key)
+            if queue is None:
+                queue = self._queues[key] = deque()
+                if first:
+                    self._rotation.appendleft(key)
+                else:
+                    self._rotation.append(key)
+            elif first and self._rotation[0] != key:
+                self._rotation.remove(key)
+                self._rotation.appendleft(key)
+            if first and self.weighted:
+                self._in_turn = True
+                self._deficits[key] = max(self._deficits.get(key, 0), self._cost(value))
+            first = False
+
+            position = positions.get(key, 0)
+            queue.insert(position, value)
+            positions[key] = position + 1
+            self._count_add(value)
+            self._len += 1
+        self._view = None
+
+    def remove_where(self, predicate: Callable[[Any], bool]) -> list[Any]:
+        """
+        Remove the entries for which predicate returns True, in a single pass
+
+        Parameters
+        ----------
+        predicate : Callable[[Any], bool]
+
+        Returns
+        -------
+        list[Any]
+            The removed entries, grouped by requester
+        """
+        removed = []
+        for key, queue in tuple(self._queues.items()):
+            kept = deque()
+            for value in queue:
+                if predicate(value):
+                    removed.append(value)
+                    self._count_remove(value)
+                else:
+                    kept.append(value)
+            if not kept:
+                self._drop_requester(key)
+            elif len(kept) != len(queue):
+                self._queues[key] = kept
+        if removed:
+            self._len -= len(removed)
+            self._view = None
+        return removed
+
+    def move_range(self, start: int, stop: int, destination: int):
+        """
+        Move the entries from index start to stop, excluded, each one within
+        the entries of its requester
+
+        Parameters
+        ----------
+        start : int
+        stop : int
+        destination : int
+            The index of the first moved entry after the move
+        """
+        start, stop, _ = slice(start, stop).indices(self._len)
+        if start >= stop:
+            return
+        moving = self._order()[start:stop]
+        values = [self._queues[key][i] for key, i in moving]
+        dropped: dict[Hashable, set[int]] = {}
+        for key, i in moving:
+            dropped.setdefault(key, set()).add(i)
+        for key, indexes in dropped.items():
+            queue = self._queues[key]
+            kept = deque(value for i, value in enumerate(queue) if i not in indexes)
+            if kept:
+                self._queues[key] = kept
+            else:
+                self._drop_requester(key)
+        for value in values:
+            self._count_remove(value)
+        self._len -= len(values)
+        self._view = None
+        if destination < 0:
+            destination += self._len
+        self.insert_many(destination, values)
+
+    def clear(self):
+        """Remove all the entries"""
+        self._queues = {}
+        self._rotation = deque()
+        self._deficits = {}
+        self._in_turn = False
+        self._len = 0
+        self._counts = {}
+        self._view = None
+
+    @property
+    def shuffled(self) -> bool:
+        """Always False, the order of the sub-queues can't be restored"""
+        return False
+
+    def shuffle(
+            self,
+            start: int = 0,
+            keep_first: Optional[Callable[[Any], bool]] = None,
+            rng: Optional[random.Random] = None,
+    ):
+        """
+        Shuffle the sub-queue of every requester, the turns of the requesters don't change
+
+        Parameters
+        ----------
+        start : int
+            The entries before this index are not moved
+        keep_first : Optional[Callable[[Any], bool]]
+            The entries for which it returns True are not shuffled, but moved
+            in their order at the start of the sub-queue, after the entries before start
+        rng : Optional[random.Random]
+            The random generator to use
+        """
+        fixed: dict[Hashable, int] = {}
+        for key, _ in self._order()[:max(0, start)]:
+            fixed[key] = fixed.get(key, 0) + 1
+
+        for key, queue in self._queues.items():
+            entries = list(queue)
+            head, rest = entries[:fixed.get(key, 0)], entries[fixed.get(key, 0):]
+            if keep_first is not None:
+                others = []
+                for entry in rest:
+                    (head if keep_first(entry) else others).append(entry)
+                rest = others
+            (rng or random).shuffle(rest)
+            self._queues[key] = deque(head + rest)
+        self._view = None
+
+    def unshuffle(self) -> bool:
+        """
+        The order before a shuffle is not kept
+
+        Returns
+        -------
+        bool
+            Always False
+        """
+        return False
+
+
+class _HistoryBudget:
+    """The cap on the number of entries of all the histories, the oldest entries are evicted first"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.total = 0
+        # (history, serial) for every entry, in the order they were added
+        self._order: deque[tuple[PlayHistory, int]] = deque()
+        self._serials = count()
+
+    def added(self, history: PlayHistory) -> int:
+        serial = next(self._serials)
+        self._order.append((history, serial))
+        self.total += 1
+        self.trim()
+        return serial
+
+    def trim(self):
+        while self.total > self.limit and self._order:
+            history, serial = self._order.popleft()
+            # The records of the entries already removed from their history are skipped
+            if history._len and history._serials[history._start] == serial:
+                history._drop_oldest()
+        if len(self._order) > 2 * max(self.limit, 1024):
+            self._compact()
+
+    def _compact(self):
+        histories = {id(history): history for history, _ in self._order}.values()
+        self._order = deque(
+            sorted(
+                ((history, serial) for history in histories for serial in history._iter_serials()),
+                key=lambda record: record[1],
+            )
+        )
+
+
+_history_budget = _HistoryBudget(10_000)
+
+
+class PlayHistory:
+    """
+    A fixed-capacity ring buffer of the tracks played by a player.
+
+    The tracks are kept by reference, and once ``size`` tracks are kept, adding another one
+    drops the oldest. All the histories also share a global cap on their total number of
+    entries, see :func:`set_history_limit`: when it's reached, the globally oldest entries
+    are dropped first, whatever player they belong to.
+    """
+
+    def __init__(self, size: int = 25):
+        """
+        Parameters
+        ----------
+        size : int
+            The maximum number of tracks kept
+        """
+        if size < 1:
+            raise ValueError("size must be positive")
+        self._tracks: list[Any] = [None] * size
+        self._serials = array("q", bytes(8 * size))
+        self._start = 0
+        self._len = 0
+
+    def __repr__(self) -> str:
+        return f"<PlayHistory: size={self._len}/{self.size}>"
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __bool__(self) -> bool:
+        return self._len > 0
+
+    def __iter__(self) -> Iterator[Any]:
+        """Iterate over the tracks, from the oldest to the most recent"""
+        size = len(self._tracks)
+        return (self._tracks[(self._start + i) % size] for i in range(self._len))
+
+    def __reversed__(self) -> Iterator[Any]:
+        size = len(self._tracks)
+        return (self._tracks[(self._start + i) % size] for i in range(self._len - 1, -1, -1))
+
+    def _iter_serials(self) -> Iterator[int]:
+        size = len(self._tracks)
+        return (self._serials[(self._start + i) % size] for i in range(self._len))
+
+    @property
+    def size(self) -> int:
+        """The maximum number of tracks kept"""
+        return len(self._tracks)
+
+    def append(self, track: Any):
+        """
+        Add a played track, dropping the oldest one when the history is full
+
+        Parameters
+        ----------
+        track : Any
+        """
+        if self._len == len(self._tracks):
+            self._drop_oldest()
+        index = (self._start + self._len) % len(self._tracks)
+        self._tracks[index] = track
+        self._len += 1
+        self._serials[index] = _history_budget.added(self)
+
+    def pop(self) -> Optional[Any]:
+        """
+        Remove and return the most recent track
+
+        Returns
+        -------
+        Optional[Any]
+            None if the history is empty
+        """
+        if not self._len:
+            return None
+        self._len -= 1
+        index = (self._start + self._len) % len(self._tracks)
+        track, self._tracks[index] = self._tracks[index], None
+        _history_budget.total -= 1
+        return track
+
+    def _drop_oldest(self):
+        self._tracks[self._start] = None
+        self._start = (self._start + 1) % len(self._tracks)
+        self._len -= 1
+        _history_budget.total -= 1
+
+    def clear(self):
+        """Remove all the tracks"""
+        _history_budget.total -= self._len
+        self._tracks = [None] * len(self._tracks)
+        self._start = 0
+        self._len = 0
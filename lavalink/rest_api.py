@@ -1,23 +1,28 @@
 from __future__ import annotations
 
-import re
+import asyncio
+import codecs
+import json
+import time
 from collections import deque
-from typing import Tuple, Any, Optional, TYPE_CHECKING
+from collections.abc import Sequence
+from typing import Any, Optional, TYPE_CHECKING, AsyncIterator, Iterable, Union
 from urllib.parse import quote
 
 import discord
 from aiohttp.client_exceptions import ServerDisconnectedError
-from yarl import URL
 
 from . import log
-from .enums import ExceptionSeverity, LoadType, PlayerState
-from .tuples import PlaylistInfo
+from .autocomplete import track_index
+from .enums import ExceptionSeverity, LoadType, NodeState, PlayerState, RequestPriority
+from .query import analyze_query
+from .tuples import PlaylistInfo, QueryInfo
 
 if TYPE_CHECKING:
     from node import Node
     from player import Player
 
-__all__ = ["Track", "RESTClient", "playlist_info", "LoadResult"]
+__all__ = ["Track", "PendingTrack", "RESTClient", "playlist_info", "LoadResult", "TrackStream", "HedgePolicy"]
 
 
 # This exists to preprocess rather than pull in dataclasses for __post_init__
@@ -29,60 +34,20 @@ def playlist_info(name: Optional[str] = None, selectedTrack: Optional[int] = Non
     )
 
 
-_re_youtube_timestamp = re.compile(r"[&?]t=(\d+)s?")
-_re_soundcloud_timestamp = re.compile(r"#t=(\d+):(\d+)s?")
-_re_twitch_timestamp = re.compile(r"\?t=(\d+)h(\d+)m(\d+)s")
-
-
-def parse_timestamps(data: dict[str, Any]) -> list[dict[str, Any]]:
-    if data["loadType"] == LoadType.PLAYLIST_LOADED:
-        return data["tracks"]
-
-    new_tracks = deque()
-    query = data["query"]
-    try:
-        query_url = URL(query)
-    except ValueError:
-        query_url = None
+def parse_timestamps(data: dict[str, Any], query_info: Optional[QueryInfo] = None) -> list[dict[str, Any]]:
+    """
+    Set the start timestamp requested by the query on the loaded tracks.
 
-    if query_url is None:
+    The query is analyzed only once, or not at all if ``query_info`` is given.
+    """
+    if LoadType(data["loadType"]) == LoadType.PLAYLIST_LOADED:
         return data["tracks"]
 
+    if query_info is None:
+        query_info = analyze_query(data["query"])
     for track in data["tracks"]:
-        start_time = 0
-
-        try:
-            if all([query_url.scheme, query_url.host, query_url.path]) or any(
-                    x in query for x in ["ytsearch:", "scsearch:"]
-            ):
-                if (
-                        (query_url.host in ["youtube.com", "youtu.be"] or "ytsearch:" in query)
-                        and any(x in query for x in ["&t=", "?t="])
-                        and not all(k in query for k in ["playlist?", "&list="])
-                ):
-                    match = re.search(_re_youtube_timestamp, query)
-                    if match:
-                        start_time = int(match.group(1))
-                elif (query_url.host == "soundcloud.com" or "scsearch:" in query) and "#t=" in query:
-                    if "/sets/" not in query or ("/sets/" in query and "?in=" in query):
-                        match = re.search(_re_soundcloud_timestamp, query)
-                        if match:
-                            start_time = (int(match.group(1)) * 60) + int(match.group(2))
-                elif query_url.host == "twitch.tv" and "?t=" in query:
-                    match = re.search(_re_twitch_timestamp, query)
-                    if match:
-                        start_time = (
-                                (int(match.group(1)) * 60 * 60)
-                                + (int(match.group(2)) * 60)
-                                + int(match.group(3))
-                        )
-        except (AttributeError, IndexError):
-            pass
-
-        track["info"]["timestamp"] = start_time * 1000
-        new_tracks.append(track)
-
-    return new_tracks
+        track["info"]["timestamp"] = query_info.start_time
+    return list(data["tracks"])
 
 
 class Track:
@@ -113,7 +78,27 @@ class Track:
         The playback url of this track.
     start_timestamp: int
         The track start time in milliseconds as provided by the query.
+    extras : dict[str, Any]
+        Additional data attached to the track.
     """
+    __slots__ = (
+        "requester",
+        "track_identifier",
+        "identifier",
+        "source",
+        "seekable",
+        "author",
+        "length",
+        "is_stream",
+        "position",
+        "title",
+        "uri",
+        "start_timestamp",
+        "_extras",
+        # Lets CompactTrackQueue cache the views of its entries
+        "__weakref__",
+    )
+
     requester: discord.User
     track_identifier: str
     identifier: str
@@ -125,12 +110,11 @@ class Track:
     title: str
     uri: str
     start_timestamp: int
-    extras: dict[str, Any]
 
     def __init__(self, data: dict[str, Any]):
         self.requester = None
 
-        self.track_identifier: str = data.get("track")
+        self.track_identifier: str = data.get("track") or data.get("encoded")
         _info: dict = data.get("info", {})
         self.identifier = _info.get("identifier")
         self.source: Optional[str] = _info.get("sourceName", None)
@@ -142,7 +126,19 @@ class Track:
         self.title: str = _info.get("title")
         self.uri: str = _info.get("uri")
         self.start_timestamp: int = _info.get("timestamp", 0)
-        self.extras: dict = data.get("extras", {})
+        # Most of the tracks never get extras, so the dict is created only when it's needed
+        self._extras: Optional[dict[str, Any]] = data.get("extras")
+
+    @property
+    def extras(self) -> dict[str, Any]:
+        """Additional data attached to the track."""
+        if self._extras is None:
+            self._extras = {}
+        return self._extras
+
+    @extras.setter
+    def extras(self, value: dict[str, Any]):
+        self._extras = value
 
     @property
     def thumbnail(self) -> Optional[str]:
@@ -172,7 +168,7 @@ class Track:
 
     def __hash__(self):
         """Overrides the default implementation"""
-        return hash(tuple(sorted([self.track_identifier, self.title, self.author, self.uri])))
+        return hash(self.track_identifier)
 
     def __repr__(self):
         return (
@@ -184,6 +180,135 @@ class Track:
         )
 
 
+class PendingTrack:
+    """
+    A queue entry that is not resolved to a :class:`Track` yet.
+
+    It only keeps the query and the requester, the query is loaded when the entry
+    reaches the prefetch window or the head of the queue.
+
+    Attributes
+    ----------
+    query : str
+        The query used to resolve the track, like a search term or an URL
+    requester : discord.User
+        The user who requested the track.
+    extras : dict[str, Any]
+        Additional data, copied to the track once resolved.
+    """
+    __slots__ = ("query", "requester", "_extras")
+
+    # The attributes shared with Track, so the entries of the queue can be handled the same way
+    track_identifier = None
+    length = 0
+    is_stream = False
+    start_timestamp = 0
+
+    def __init__(self, query: str, requester: Optional[discord.User] = None):
+        self.query = query
+        self.requester = requester
+        self._extras: Optional[dict[str, Any]] = None
+
+    @property
+    def title(self) -> str:
+        """The query of the entry, until it's resolved."""
+        return self.query
+
+    @property
+    def extras(self) -> dict[str, Any]:
+        """Additional data attached to the entry."""
+        if self._extras is None:
+            self._extras = {}
+        return self._extras
+
+    @extras.setter
+    def extras(self, value: dict[str, Any]):
+        self._extras = value
+
+    def __repr__(self):
+        return f"<PendingTrack: query={self.query!r}>"
+
+
+class _LazyTracks(Sequence):
+    """
+    Read-only sequence of tracks, which builds a :class:`Track` only when it is accessed.
+    """
+    __slots__ = ("_raw", "_cache", "_start_timestamp")
+
+    def __init__(self, raw: list[dict[str, Any]], start_timestamp: int = 0):
+        self._raw = raw
+        self._cache: list[Optional[Track]] = [None] * len(raw)
+        self._start_timestamp = start_timestamp
+
+    def __len__(self) -> int:
+        return len(self._raw)
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[Track, tuple[Track, ...]]:
+        if isinstance(index, slice):
+            return tuple(self[i] for i in range(*index.indices(len(self._raw))))
+        track = self._cache[index]
+        if track is None:
+            track = self._cache[index] = Track(self._raw[index])
+            if self._start_timestamp:
+                track.start_timestamp = self._start_timestamp
+        return track
+
+    def __iter__(self):
+        for i in range(len(self._raw)):
+            yield self[i]
+
+    def __eq__(self, other):
+        if isinstance(other, Sequence):
+            return tuple(self) == tuple(other)
+        return NotImplemented
+
+    def __hash__(self):
+        # Like the tuple of tracks it replaces, and equal to it
+        return hash(tuple(self))
+
+    def __repr__(self) -> str:
+        return f"<Tracks: count={len(self._raw)}>"
+
+
+# Lavalink v4 load types, mapped to the v3 ones
+_V4_LOAD_TYPES = {
+    "track": LoadType.TRACK_LOADED,
+    "playlist": LoadType.PLAYLIST_LOADED,
+    "search": LoadType.SEARCH_RESULT,
+    "empty": LoadType.NO_MATCHES,
+    "error": LoadType.LOAD_FAILED,
+}
+_V4_SEVERITIES = {"common": "COMMON", "suspicious": "SUSPICIOUS", "fault": "FATAL"}
+# The load types of a failed load, in the raw responses of all the versions
+_FAILED_LOAD_TYPES = frozenset({LoadType.LOAD_FAILED, LoadType.LOAD_FAILED.value, "error"})
+
+
+def _v4_exception(data: dict[str, Any]) -> dict[str, Any]:
+    severity = data.get("severity")
+    return {**data, "severity": _V4_SEVERITIES.get(severity, severity)}
+
+
+def _convert_v4_result(data: dict[str, Any]) -> dict[str, Any]:
+    """Convert a Lavalink v4 loadtracks response to the v3 format"""
+    load_type = _V4_LOAD_TYPES[data["loadType"]]
+    payload = data.get("data")
+    converted = {k: v for k, v in data.items() if k != "data"}
+    converted["loadType"] = load_type.value
+    converted["playlistInfo"] = {}
+    converted["tracks"] = []
+
+    if load_type == LoadType.TRACK_LOADED:
+        converted["tracks"] = [payload]
+    elif load_type == LoadType.PLAYLIST_LOADED:
+        converted["playlistInfo"] = payload.get("info", {})
+        converted["tracks"] = payload.get("tracks", [])
+    elif load_type == LoadType.SEARCH_RESULT:
+        converted["tracks"] = payload
+    elif load_type == LoadType.LOAD_FAILED:
+        converted["exception"] = _v4_exception(payload or {})
+    return converted
+
+
 class LoadResult:
     """
     The result of a load_tracks request.
@@ -194,14 +319,20 @@ class LoadResult:
         The result of the loadtracks request
     playlist_info : Optional[PlaylistInfo]
         The playlist information detected by Lavalink
-    tracks : tuple[Track, ...]
-        The tracks that were loaded, if any
+    tracks : Sequence[Track]
+        The tracks that were loaded, if any.
+        Each :class:`Track` is built only when it is accessed.
+    query_info : Optional[QueryInfo]
+        The analysis of the query, if available
     """
     load_type: LoadType
     playlist_info: Optional[PlaylistInfo]
-    tracks: tuple[Track, ...]
+    tracks: Sequence[Track]
+    query_info: Optional[QueryInfo]
 
-    def __init__(self, data: dict[str, Any]):
+    def __init__(self, data: dict[str, Any], query_info: Optional[QueryInfo] = None):
+        if data.get("loadType") in _V4_LOAD_TYPES:
+            data = _convert_v4_result(data)
         self._raw = data
         _fallback = {
             "loadType": LoadType.LOAD_FAILED,
@@ -242,8 +373,15 @@ class LoadResult:
         else:
             self.is_playlist = None
             self.playlist_info = None
-        _tracks = parse_timestamps(self._raw) if self._raw.get("query") else self._raw["tracks"]
-        self.tracks = tuple(Track(t) for t in _tracks)
+        if query_info is None and self._raw.get("query"):
+            query_info = analyze_query(self._raw["query"])
+        self.query_info = query_info
+
+        # The start time depends only on the query, so it's applied to the tracks when they are built
+        start_timestamp = 0
+        if query_info is not None and self.load_type != LoadType.PLAYLIST_LOADED:
+            start_timestamp = query_info.start_time
+        self.tracks = _LazyTracks(self._raw["tracks"], start_timestamp)
 
     @property
     def has_error(self) -> bool:
@@ -271,56 +409,442 @@ class LoadResult:
         return None
 
 
+_INCOMPLETE = object()
+
+
+class _LoadTracksParser:
+    """
+    Incremental parser for the body of a loadtracks response.
+
+    The top level fields are decoded as a whole, while the elements of the ``tracks``
+    array are decoded and returned one at a time, so the full body is never kept in memory.
+    On Lavalink v4 the tracks are found inside the ``data`` field, whose fields are
+    collected in ``fields["data"]``.
+    """
+    _START, _KEY, _COLON, _VALUE, _TRACKS, _DONE = range(6)
+
+    def __init__(self):
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._pos = 0
+        self._state = self._START
+        self._key: Optional[str] = None
+        self._top_level_list = False
+        self._nested = False
+        self.fields: dict[str, Any] = {}
+        self._target = self.fields
+
+    def feed(self, chunk: str, eof: bool = False) -> list[dict[str, Any]]:
+        """Parse a new chunk of the body and return the tracks completed by it"""
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
+        tracks = []
+
+        while self._state != self._DONE:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in " \t\r\n":
+                self._pos += 1
+            if self._pos >= len(self._buffer):
+                break
+            char = self._buffer[self._pos]
+
+            if self._state == self._START:
+                self._pos += 1
+                if char == "{":
+                    self._state = self._KEY
+                elif char == "[":
+                    # Lavalink V2 returns the tracks as top level array
+                    self._top_level_list = True
+                    self.fields["loadType"] = LoadType.V2_COMPAT.value
+                    self._state = self._TRACKS
+                else:
+                    raise ValueError(f"Unexpected character {char!r} in loadtracks response")
+            elif self._state == self._KEY:
+                if char in ",}":
+                    self._pos += 1
+                    if char == "}":
+                        if self._nested:
+                            self._nested = False
+                            self._target = self.fields
+                            self._state = self._KEY
+                        else:
+                            self._state = self._DONE
+                    continue
+                key = self._decode(eof)
+                if key is _INCOMPLETE:
+                    break
+                self._key = key
+                self._state = self._COLON
+            elif self._state == self._COLON:
+                if char != ":":
+                    raise ValueError(f"Unexpected character {char!r} in loadtracks response")
+                self._pos += 1
+                self._state = self._VALUE
+            elif self._state == self._VALUE:
+                if self._key == "tracks" and char == "[":
+                    self._pos += 1
+                    self._state = self._TRACKS
+                    continue
+                if self._key == "data" and not self._nested:
+                    load_type = self.fields.get("loadType")
+                    if load_type == "search" and char == "[":
+                        self._pos += 1
+                        self._state = self._TRACKS
+                        continue
+                    if load_type == "playlist" and char == "{":
+                        self._pos += 1
+                        self._nested = True
+                        self._target = self.fields["data"] = {}
+                        self._state = self._KEY
+                        continue
+                value = self._decode(eof)
+                if value is _INCOMPLETE:
+                    break
+                if self._key == "data" and not self._nested and self.fields.get("loadType") == "track":
+                    tracks.append(value)
+                else:
+                    self._target[self._key] = value
+                self._state = self._KEY
+            elif self._state == self._TRACKS:
+                if char in ",]":
+                    self._pos += 1
+                    if char == "]":
+                        self._state = self._DONE if self._top_level_list else self._KEY
+                    continue
+                track = self._decode(eof)
+                if track is _INCOMPLETE:
+                    break
+                tracks.append(track)
+
+        if eof and self._state != self._DONE:
+            raise ValueError("Truncated loadtracks response")
+        return tracks
+
+    def _decode(self, eof: bool) -> Any:
+        try:
+            value, end = self._decoder.raw_decode(self._buffer, self._pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            return _INCOMPLETE
+        # A number at the end of the buffer could be cut, wait for the next chunk to be sure
+        if end == len(self._buffer) and not eof:
+            return _INCOMPLETE
+        self._pos = end
+        return value
+
+
+class TrackStream:
+    """
+    The tracks of a loadtracks request, decoded while the response is received.
+
+    It can be iterated only once with ``async for``.
+    The other attributes are populated as soon as they are parsed from the response.
+
+    Attributes
+    ----------
+    query : str
+        The query of the request
+    limit : Optional[int]
+        The maximum number of tracks to take, ``None`` means all of them
+    load_type : Optional[LoadType]
+        The result of the loadtracks request
+    playlist_info : Optional[PlaylistInfo]
+        The playlist information detected by Lavalink
+    tracks_read : int
+        The number of tracks yielded so far
+    """
+    query: str
+    limit: Optional[int]
+    load_type: Optional[LoadType]
+    playlist_info: Optional[PlaylistInfo]
+    tracks_read: int
+
+    def __init__(self, client: RESTClient, query: str, url: str, limit: Optional[int] = None,
+                 priority: RequestPriority = RequestPriority.INTERACTIVE, chunk_size: int = 65536):
+        self._client = client
+        self._url = url
+        self._priority = priority
+        self._chunk_size = chunk_size
+        self._fields: dict[str, Any] = {}
+        self._started = False
+        self.query = query
+        self.limit = limit
+        self.load_type = None
+        self.playlist_info = None
+        self.tracks_read = 0
+
+    def __aiter__(self) -> AsyncIterator[Track]:
+        if self._started:
+            raise RuntimeError("A TrackStream can be iterated only once.")
+        self._started = True
+        return self._iterate()
+
+    @property
+    def has_error(self) -> bool:
+        return self.load_type == LoadType.LOAD_FAILED
+
+    @property
+    def exception_message(self) -> Optional[str]:
+        """
+        If there was an exception during the load this property will be populated with the error message.
+        """
+        if self.has_error:
+            exception = self._fields.get("exception")
+            if exception is None and isinstance(self._fields.get("data"), dict):
+                # Lavalink v4 stores the exception as data of the result
+                exception = self._fields["data"]
+            return (exception or {}).get("message")
+        return None
+
+    def _update_fields(self, fields: dict[str, Any]):
+        self._fields = fields
+        if self.load_type is None and "loadType" in fields:
+            load_type = fields["loadType"]
+            self.load_type = _V4_LOAD_TYPES.get(load_type) or LoadType(load_type)
+        if self.playlist_info is None and self.load_type == LoadType.PLAYLIST_LOADED:
+            if "playlistInfo" in fields:
+                self.playlist_info = playlist_info(**fields["playlistInfo"])
+            elif "info" in fields.get("data", {}):
+                self.playlist_info = playlist_info(**fields["data"]["info"])
+
+    async def _iterate(self) -> AsyncIterator[Track]:
+        if self.limit is not None and self.limit <= 0:
+            return
+
+        client = self._client
+        parser = _LoadTracksParser()
+        text_decoder = codecs.getincrementaldecoder("utf-8")()
+        start_timestamp = analyze_query(self.query).start_time
+
+        try:
+            async with client.node.rest_scheduler.slot(self._priority), \
+                    client._session.get(self._url, headers=client._headers) as resp:
+                eof = False
+                while not eof:
+                    chunk = await resp.content.read(self._chunk_size)
+                    eof = not chunk
+                    raw_tracks = parser.feed(text_decoder.decode(chunk, final=eof), eof=eof)
+                    self._update_fields(parser.fields)
+
+                    for raw in raw_tracks:
+                        track = Track(raw)
+                        if start_timestamp and self.load_type != LoadType.PLAYLIST_LOADED:
+                            track.start_timestamp = start_timestamp
+
+                        self.tracks_read += 1
+                        yield track
+                        if self.limit is not None and self.tracks_read >= self.limit:
+                            return
+        except ServerDisconnectedError:
+            if client._disconnecting:
+                self.load_type = LoadType.LOAD_FAILED
+                self._fields["exception"] = {
+                    "message": "Load tracks interrupted by player disconnect.",
+                    "severity": ExceptionSeverity.COMMON,
+                }
+                return
+            log.debug("Received server disconnected error for %r", client.player or client.node)
+            raise
+
+
+class HedgePolicy:
+    """
+    Configuration of hedged loadtracks requests.
+
+    If the node has not answered within the hedge delay, the same request is sent to a second
+    ready node. The first response wins and the other request is cancelled.
+    The hedge delay is either fixed or a percentile of the latency recently observed on the node.
+
+    To keep the additional load bounded, every request adds ``budget`` tokens to a bucket
+    and every hedge takes one, so the hedges stay under that fraction of the traffic.
+    The same policy can be shared by many clients to share the budget.
+
+    Attributes
+    ----------
+    delay : Optional[float]
+        The fixed hedge delay in seconds, ``None`` to use the latency percentile
+    percentile : float
+        The percentile of the recent latency of the node used as hedge delay
+    min_delay : float
+        The lowest hedge delay in seconds
+    default_delay : float
+        The hedge delay used while there aren't latency samples yet
+    budget : float
+        The maximum fraction of requests that can be hedged
+    requests : int
+        The number of requests made with this policy
+    hedges : int
+        The number of hedged requests
+    hedge_wins : int
+        The number of hedged requests answered first by the second node
+    """
+    delay: Optional[float]
+    percentile: float
+    min_delay: float
+    default_delay: float
+    budget: float
+    requests: int
+    hedges: int
+    hedge_wins: int
+
+    def __init__(
+            self,
+            delay: Optional[float] = None,
+            percentile: float = 95.0,
+            min_delay: float = 0.05,
+            default_delay: float = 1.0,
+            budget: float = 0.05,
+            burst: int = 10,
+    ):
+        """
+        Parameters
+        ----------
+        delay : Optional[float]
+            The fixed hedge delay in seconds, ``None`` to use the latency percentile
+        percentile : float
+            The percentile of the recent latency of the node used as hedge delay
+        min_delay : float
+            The lowest hedge delay in seconds
+        default_delay : float
+            The hedge delay used while there aren't latency samples yet
+        budget : float
+            The maximum fraction of requests that can be hedged, 0 < x ≤ 1
+        burst : int
+            The maximum number of hedges that can be saved up while the traffic is low
+        """
+        if not (0 < budget <= 1):
+            raise ValueError("Budget must be 0 < x ≤ 1")
+
+        self.delay = delay
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.default_delay = default_delay
+        self.budget = budget
+        self._burst = burst
+        self._tokens = 0.0
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def __repr__(self) -> str:
+        return (
+            "<HedgePolicy: "
+            f"delay={self.delay}, "
+            f"percentile={self.percentile}, "
+            f"budget={self.budget}, "
+            f"requests={self.requests}, "
+            f"hedges={self.hedges}, "
+            f"hedge_wins={self.hedge_wins}>"
+        )
+
+    def hedge_delay(self, node: Node) -> float:
+        """
+        The time to wait for the node before hedging a request
+
+        Parameters
+        ----------
+        node : Node
+            The node of the request
+        """
+        if self.delay is not None:
+            return self.delay
+        latency = node.rest_latency.percentile(self.percentile)
+        if latency is None:
+            return self.default_delay
+        return max(self.min_delay, latency)
+
+    def _add_tokens(self):
+        self._tokens = min(self._tokens + self.budget, self._burst)
+
+    def _take_token(self) -> bool:
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        self.hedges += 1
+        return True
+
+
 class RESTClient:
     """
     Client class used to access the REST endpoints on a Lavalink node.
 
+    It's bound to a player, or directly to a node to make requests without a connected player.
+
     Attributes
     ----------
-    player : Player
-        The player to use
+    player : Optional[Player]
+        The player to use, ``None`` if the client is bound to a node
     node : Node
         The node used by the player
     state : PlayerState
-        The current player state
+        The current player state, not available if the client is bound to a node
+    hedge_policy : Optional[HedgePolicy]
+        If set, slow loadtracks requests are repeated on another node
     """
-    player: Player
+    player: Optional[Player]
     node: Node
     state: PlayerState
+    hedge_policy: Optional[HedgePolicy]
 
-    def __init__(self, player: Player, ssl: bool = False):
+    def __init__(self, player: Optional[Player] = None, ssl: bool = False, node: Optional[Node] = None):
         """
 
         Parameters
         ----------
-        player: Player
+        player: Optional[Player]
             The player object to use
         ssl : bool
             Whether to use the `https://` protocol.
+        node : Optional[Node]
+            The node to use when the client is not bound to a player
         """
+        if player is None and node is None:
+            raise TypeError("Either a player or a node is required.")
+
         self.player = player
-        self.node = player.node
+        self.node = player.node if player is not None else node
         self._session = self.node.session
-        if ssl:
-            self._uri = f"https://{self.node.host}:{self.node.port}/loadtracks?identifier="
-        else:
-            self._uri = f"http://{self.node.host}:{self.node.port}/loadtracks?identifier="
+        # Without ssl, the scheme follows the connection of the node, which is known once it's connected
+        self._base_uri: Optional[str] = f"https://{self.node.host}:{self.node.port}" if ssl else None
         self._headers = {"Authorization": self.node.password}
 
-        self.state = player.state
+        if player is not None:
+            self.state = player.state
 
+        self.hedge_policy = None
         self._warned = False
 
+    @property
+    def _uri(self) -> str:
+        base_uri = self._base_uri or self.node.rest_uri
+        # Lavalink v4 serves the REST API only under the versioned path
+        if self.node.api_version >= 4:
+            return f"{base_uri}/v4/loadtracks?identifier="
+        return f"{base_uri}/loadtracks?identifier="
+
     def __check_node_ready(self):
-        if self.state != PlayerState.READY:
+        if self.player is None:
+            ready = self.node.ready
+        else:
+            ready = self.state == PlayerState.READY
+        if not ready:
             raise RuntimeError("Cannot execute REST request when node not ready.")
 
-    async def _get(self, url: str) -> dict[str, Any]:
+    @property
+    def _disconnecting(self) -> bool:
+        if self.player is None:
+            return self.node.state == NodeState.DISCONNECTING
+        return self.state == PlayerState.DISCONNECTING
+
+    async def _get(self, url: str, priority: RequestPriority = RequestPriority.INTERACTIVE) -> dict[str, Any]:
         try:
-            async with self._session.get(url, headers=self._headers) as resp:
-                data = await resp.json(content_type=None)
+            async with self.node.rest_scheduler.slot(priority):
+                start = time.monotonic()
+                async with self._session.get(url, headers=self._headers) as resp:
+                    data = await resp.json(content_type=None)
+                self.node.rest_latency.record(time.monotonic() - start)
         except ServerDisconnectedError:
-            if self.state == PlayerState.DISCONNECTING:
+            if self._disconnecting:
                 return {
                     "loadType": LoadType.LOAD_FAILED,
                     "exception": {
@@ -329,41 +853,175 @@ class RESTClient:
                     },
                     "tracks": [],
                 }
-            log.debug("Received server disconnected error when player state = %s", self.state.name)
+            log.debug("Received server disconnected error for %r", self.player or self.node)
+            raise
+        return data
+
+    async def _coalesced_get(
+            self, url: str, priority: RequestPriority, key: Optional[str] = None
+    ) -> dict[str, Any]:
+        # Equivalent requests in flight on the node share the same response, they have the same key
+        if key is None:
+            key = url
+        pending = self.node._pending_loads
+        future = pending.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._get(url, priority))
+            pending[key] = future
+
+            def _remove(_):
+                if pending.get(key) is future:
+                    del pending[key]
+
+            future.add_done_callback(_remove)
+            return await asyncio.shield(future)
+
+        # The failures aren't shared, they may be transient: the other callers make their own request
+        try:
+            data = await asyncio.shield(future)
+        except asyncio.CancelledError:
             raise
+        except Exception:
+            return await self._get(url, priority)
+        if isinstance(data, dict) and data.get("loadType") in _FAILED_LOAD_TYPES:
+            return await self._get(url, priority)
         return data
 
-    async def load_tracks(self, query: str) -> LoadResult:
+    def _hedge_node(self) -> Optional[Node]:
+        from .node import _nodes
+
+        candidates = [n for n in _nodes if n is not self.node and n.ready]
+        return min(candidates, key=lambda n: n.rest_scheduler.queue_depth(), default=None)
+
+    def _recovery_node(self, source: Optional[str]) -> Optional[Node]:
+        from .node import _nodes
+
+        candidates = [n for n in _nodes if n is not self.node and n.ready and n.is_source_available(source)]
+        return min(candidates, key=lambda n: n.rest_scheduler.queue_depth(), default=None)
+
+    async def _hedged_get(
+            self, query: str, priority: RequestPriority, policy: HedgePolicy
+    ) -> tuple[dict[str, Any], str]:
+        policy.requests += 1
+        policy._add_tokens()
+
+        url = self._uri + quote(query)
+        tasks = {asyncio.ensure_future(self._get(url, priority)): url}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=policy.hedge_delay(self.node))
+            if not done:
+                other = self._hedge_node()
+                if other is not None and policy._take_token():
+                    log.debug("Hedging loadtracks request for %r on %r", query, other)
+                    other_url = other.rest._uri + quote(query)
+                    tasks[asyncio.ensure_future(other.rest._get(other_url, priority))] = other_url
+
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if tasks[task] != url:
+                            policy.hedge_wins += 1
+                        return task.result(), tasks[task]
+            # Every request failed, report the error of the primary node
+            primary = next(iter(tasks))
+            return primary.result(), url
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def load_tracks(
+            self,
+            query: str,
+            priority: RequestPriority = RequestPriority.INTERACTIVE,
+            hedge: Optional[HedgePolicy] = None,
+    ) -> LoadResult:
         """
-        Executes a loadtracks request. Only works on Lavalink V3.
+        Executes a loadtracks request.
+
+        The outcome is recorded in the source health of the node. If the load failed and
+        the source is no longer available on the node, the request is repeated on another
+        ready node where the source is available.
 
         Parameters
         ----------
         query : str
+        priority : RequestPriority
+            The priority of the request in the node scheduler
+        hedge : Optional[HedgePolicy]
+            The hedging policy to use instead of :attr:`hedge_policy`
 
         Returns
         -------
         LoadResult
         """
+        return await self._load_tracks(query, priority, hedge, recover=True)
+
+    async def _load_tracks(
+            self, query: str, priority: RequestPriority, hedge: Optional[HedgePolicy], recover: bool
+    ) -> LoadResult:
         self.__check_node_ready()
         query = str(query)
-        url = self._uri + quote(query)
+        query_info = analyze_query(query)
+
+        policy = hedge if hedge is not None else self.hedge_policy
+        if policy is None:
+            url = self._uri + quote(query_info.canonical)
+            data = await self._coalesced_get(url, priority, query_info.cache_key)
+        else:
+            data, url = await self._hedged_get(query_info.canonical, priority, policy)
 
-        data = await self._get(url)
         if isinstance(data, dict):
+            data = dict(data)
             data["query"] = query
             data["encodedquery"] = url
-            return LoadResult(data)
-        elif isinstance(data, list):
-            modified_data = {
+        else:
+            data = {
                 "loadType": LoadType.V2_COMPAT,
                 "tracks": data,
                 "query": query,
                 "encodedquery": url,
             }
-            return LoadResult(modified_data)
+        result = LoadResult(data, query_info)
+        self.node.record_load(query_info.source, result.has_error, result.exception_severity)
+        if recover and result.has_error and not self.node.is_source_available(query_info.source):
+            other = self._recovery_node(query_info.source)
+            if other is not None:
+                log.debug("Source %s is failing on %r, loading %r on %r", query_info.source, self.node, query, other)
+                # Loaded once on the other node, without chaining another recovery
+                return await other.rest._load_tracks(query, priority, hedge, recover=False)
+        track_index.add_result(result)
+        return result
+
+    def stream_tracks(
+            self, query: str, limit: Optional[int] = None, priority: RequestPriority = RequestPriority.INTERACTIVE
+    ) -> TrackStream:
+        """
+        Executes a loadtracks request, decoding the tracks while the response is received.
+
+        Unlike :meth:`load_tracks`, the response is never fully loaded in memory,
+        which is useful for huge playlists.
+
+        Parameters
+        ----------
+        query : str
+        limit : Optional[int]
+            The maximum number of tracks to take. When it's reached the response is discarded.
+        priority : RequestPriority
+            The priority of the request in the node scheduler, the slot is held until the stream is exhausted
+
+        Returns
+        -------
+        TrackStream
+            An asynchronous iterator over the loaded tracks
+        """
+        self.__check_node_ready()
+        query = str(query)
+        url = self._uri + quote(analyze_query(query).canonical)
+        return TrackStream(self, query, url, limit=limit, priority=priority)
 
-    async def get_tracks(self, query: str) -> Tuple[Track, ...]:
+    async def get_tracks(self, query: str) -> Sequence[Track]:
         """
         Gets tracks from lavalink.
 
@@ -373,7 +1031,7 @@ class RESTClient:
 
         Returns
         -------
-        Tuple[Track, ...]
+        Sequence[Track]
         """
         if not self._warned:
             log.warn("get_tracks() is now deprecated. Please switch to using load_tracks().")
@@ -381,30 +1039,110 @@ class RESTClient:
         result = await self.load_tracks(query)
         return result.tracks
 
-    async def search_yt(self, query: str) -> LoadResult:
+    async def search_yt(self, query: str, priority: RequestPriority = RequestPriority.INTERACTIVE) -> LoadResult:
         """
         Gets track results from YouTube from Lavalink.
 
         Parameters
         ----------
         query : str
+        priority : RequestPriority
 
         Returns
         -------
         list of Track
         """
-        return await self.load_tracks(f"ytsearch:{query}")
+        return await self.load_tracks(f"ytsearch:{query}", priority)
 
-    async def search_sc(self, query: str) -> LoadResult:
+    async def search_sc(self, query: str, priority: RequestPriority = RequestPriority.INTERACTIVE) -> LoadResult:
         """
         Gets track results from SoundCloud from Lavalink.
 
         Parameters
         ----------
         query : str
+        priority : RequestPriority
 
         Returns
         -------
         list of Track
         """
-        return await self.load_tracks(f"scsearch:{query}")
+        return await self.load_tracks(f"scsearch:{query}", priority)
+
+    async def load_many(
+            self,
+            queries: Iterable[str],
+            concurrency: int = 5,
+            ordered: bool = False,
+            priority: RequestPriority = RequestPriority.BULK,
+    ) -> AsyncIterator[tuple[str, LoadResult]]:
+        """
+        Resolves many queries concurrently, yielding the results as they complete.
+
+        At most ``concurrency`` requests are in flight at the same time.
+        Closing the iterator early cancels the pending requests.
+
+        Parameters
+        ----------
+        queries : Iterable[str]
+            The queries to resolve
+        concurrency : int
+            The maximum number of concurrent requests
+        ordered : bool
+            If set to True, the results are yielded in the same order of the queries,
+            so the first tracks can be used while the rest are still resolving.
+        priority : RequestPriority
+            The priority of the requests in the node scheduler
+
+        Yields
+        ------
+        tuple[str, LoadResult]
+            The query and its result
+
+        Raises
+        ------
+        ValueError
+            If ``concurrency`` is lower than 1
+        """
+        if concurrency < 1:
+            raise ValueError("Concurrency must be greater than 0")
+
+        queries = iter(queries)
+        # Completed results waiting for the head of the window are kept here in ordered mode,
+        # so a slow query can't make the buffer grow without limit
+        max_window = concurrency * 2 if ordered else concurrency
+        window: deque[tuple[str, asyncio.Task]] = deque()
+
+        def fill():
+            running = sum(1 for _, t in window if not t.done())
+            while running < concurrency and len(window) < max_window:
+                try:
+                    query = next(queries)
+                except StopIteration:
+                    return
+                window.append((query, asyncio.ensure_future(self.load_tracks(query, priority))))
+                running += 1
+
+        try:
+            fill()
+            while window:
+                if ordered:
+                    ready = []
+                    while window and window[0][1].done():
+                        ready.append(window.popleft())
+                else:
+                    ready = [entry for entry in window if entry[1].done()]
+                    for entry in ready:
+                        window.remove(entry)
+
+                if not ready:
+                    await asyncio.wait(
+                        [t for _, t in window if not t.done()], return_when=asyncio.FIRST_COMPLETED
+                    )
+                else:
+                    for query, task in ready:
+                        yield query, task.result()
+                fill()
+        finally:
+            for _, task in window:
+                task.cancel()
@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+from .enums import RequestPriority
+from .metrics import LatencyWindow
+
+__all__ = ["RESTScheduler"]
+
+
+class RESTScheduler:
+    """
+    Limits the concurrent REST requests made to a node.
+
+    When all the slots are taken, the waiting requests are served by priority
+    and then in arrival order, so interactive requests jump ahead of bulk work.
+
+    Attributes
+    ----------
+    concurrency : int
+        The maximum number of concurrent requests
+    """
+    concurrency: int
+
+    def __init__(self, concurrency: int = 8):
+        """
+        Parameters
+        ----------
+        concurrency : int
+            The maximum number of concurrent requests
+        """
+        if concurrency < 1:
+            raise ValueError("Concurrency must be greater than 0")
+
+        self.concurrency = concurrency
+        self._active = 0
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._counter = itertools.count()
+        self._depth = {priority: 0 for priority in RequestPriority}
+        self._wait_times = {priority: LatencyWindow() for priority in RequestPriority}
+
+    def __repr__(self) -> str:
+        return (
+            "<RESTScheduler: "
+            f"concurrency={self.concurrency}, "
+            f"active={self._active}, "
+            f"queue_depth={self.queue_depth()}>"
+        )
+
+    @property
+    def active(self) -> int:
+        """The number of requests currently running"""
+        return self._active
+
+    def queue_depth(self, priority: Optional[RequestPriority] = None) -> int:
+        """
+        The number of requests waiting for a slot
+
+        Parameters
+        ----------
+        priority : Optional[RequestPriority]
+            Count only the requests with this priority
+        """
+        if priority is None:
+            return sum(self._depth.values())
+        return self._depth[priority]
+
+    def wait_time(self, priority: RequestPriority) -> LatencyWindow:
+        """
+        The time spent by the requests waiting for a slot
+
+        Parameters
+        ----------
+        priority : RequestPriority
+        """
+        return self._wait_times[priority]
+
+    async def acquire(self, priority: RequestPriority = RequestPriority.INTERACTIVE):
+        """
+        Wait for a free slot. Every call must be followed by a call to :meth:`release`.
+
+        Parameters
+        ----------
+        priority : RequestPriority
+        """
+        start = time.monotonic()
+        if self._active < self.concurrency and not self._waiters:
+            self._active += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._waiters, (priority.value, next(self._counter), future))
+            self._depth[priority] += 1
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # The slot was handed over just before the cancellation
+                    self.release()
+                raise
+            finally:
+                self._depth[priority] -= 1
+        self._wait_times[priority].record(time.monotonic() - start)
+
+    def release(self):
+        """Free a slot, handing it over to the next waiting request"""
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self._active -= 1
+
+    @asynccontextmanager
+    async def slot(self, priority: RequestPriority = RequestPriority.INTERACTIVE) -> AsyncIterator[None]:
+        """
+        Hold a slot for the duration of the ``async with`` block
+
+        Parameters
+        ----------
+        priority : RequestPriority
+        """
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
@@ -1,11 +1,16 @@
-from typing import NamedTuple
+from typing import Any, NamedTuple, Optional
+
+from .enums import QueueChangeType
 
 __all__ = [
     "PositionTime",
     "MemoryInfo",
     "CPUInfo",
     "EqualizerBands",
-    "PlaylistInfo"
+    "PlaylistInfo",
+    "QueryInfo",
+    "RoutePlannerStatus",
+    "QueueChange",
 ]
 
 
@@ -75,3 +80,70 @@ class PlaylistInfo(NamedTuple):
             f"name={self.name}, "
             f"selectedTrack={self.selectedTrack}"
         )
+
+
+class QueryInfo(NamedTuple):
+    query: str
+    canonical: str
+    source: Optional[str]
+    identifier: Optional[str]
+    start_time: int
+    cache_key: str
+    is_search: bool
+
+    def __repr__(self) -> str:
+        return (
+            "<QueryInfo: "
+            f"query={self.query!r}, "
+            f"canonical={self.canonical!r}, "
+            f"source={self.source}, "
+            f"identifier={self.identifier}, "
+            f"start_time={self.start_time}"
+        )
+
+
+class RoutePlannerStatus(NamedTuple):
+    class_name: Optional[str]
+    ip_block_type: Optional[str]
+    ip_block_size: int
+    failing_addresses: tuple[str, ...]
+
+    @property
+    def exhausted(self) -> bool:
+        """True if every address of the IP block is marked as failing"""
+        return 0 < self.ip_block_size <= len(self.failing_addresses)
+
+    def __repr__(self) -> str:
+        return (
+            "<RoutePlannerStatus: "
+            f"class_name={self.class_name}, "
+            f"ip_block_type={self.ip_block_type}, "
+            f"ip_block_size={self.ip_block_size}, "
+            f"failing_addresses={len(self.failing_addresses)}"
+        )
+
+
+class QueueChange(NamedTuple):
+    """
+    A change of the queue of a player, the indices are the ones of the queue before the change.
+
+    For :attr:`QueueChangeType.MOVED`, ``count`` entries starting at ``index`` are moved,
+    ``destination`` is the index of the first one after the move. For
+    :attr:`QueueChangeType.REMOVED`, ``indices`` lists the removed entries when they
+    aren't contiguous.
+    """
+    type: QueueChangeType
+    index: int = 0
+    count: int = 0
+    destination: Optional[int] = None
+    entries: tuple[Any, ...] = ()
+    indices: tuple[int, ...] = ()
+
+    def __repr__(self) -> str:
+        return (
+            "<QueueChange: "
+            f"type={self.type.name}, "
+            f"index={self.index}, "
+            f"count={self.count}, "
+            f"destination={self.destination}>"
+        )
@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+
+from lavalink.autocomplete import TrackIndex
+from lavalink.rest_api import LoadResult
+
+
+def _raw(i: int, title: str, author: str = "Someone") -> dict:
+    return {"track": f"track{i}", "info": {"title": title, "author": author, "identifier": f"id{i}"}}
+
+
+def test_lookup():
+    index = TrackIndex()
+    index.add([
+        _raw(0, "Never Gonna Give You Up", "Rick Astley"),
+        _raw(1, "Never Enough", "Loren Allred"),
+        _raw(2, "Take On Me", "a-ha"),
+    ])
+
+    assert [t.title for t in index.lookup("nev")] == ["Never Enough", "Never Gonna Give You Up"]
+    assert [t.title for t in index.lookup("never rick")] == ["Never Gonna Give You Up"]
+    assert [t.title for t in index.lookup("A-HA")] == ["Take On Me"]
+    assert index.lookup("zzz") == []
+
+
+def test_lookup_v4():
+    index = TrackIndex()
+    raw = _raw(0, "Never Gonna Give You Up", "Rick Astley")
+    index.add_result(LoadResult({"loadType": "search", "data": [{"encoded": raw["track"], "info": raw["info"]}]}))
+
+    (track,) = index.lookup("never")
+    assert (track.title, track.track_identifier) == ("Never Gonna Give You Up", "track0")
+
+
+def test_eviction():
+    index = TrackIndex(max_tracks=2)
+    index.add([_raw(i, f"Song {i}") for i in range(3)])
+
+    assert len(index) == 2
+    assert [t.title for t in index.lookup("song")] == ["Song 2", "Song 1"]
+    assert len(index._terms) == 6
+
+
+@pytest.mark.asyncio
+async def test_complete_debounce():
+    index = TrackIndex()
+    searches = []
+
+    async def load(query):
+        searches.append(query)
+        return LoadResult({"loadType": "SEARCH_RESULT", "tracks": [_raw(9, "Remote Song")]})
+
+    first = asyncio.ensure_future(index.complete("rem", load, debounce=0.01, key=1))
+    second = asyncio.ensure_future(index.complete("remote", load, debounce=0.01, key=1))
+
+    assert await first == []
+    assert [t.title for t in await second] == ["Remote Song"]
+    assert searches == ["ytsearch:remote"]
+    assert [t.title for t in index.lookup("remote")] == ["Remote Song"]
@@ -1,8 +1,14 @@
+import asyncio
 from copy import copy
 
 import aiohttp
 import pytest
 
+from lavalink.enums import ExceptionSeverity, NodeState
+from lavalink.metrics import LatencyHistogram, SourceHealth
+from lavalink.node import _normalize_v4_event
+from lavalink.rest_api import Track
+
 
 @pytest.mark.asyncio
 async def test_node_connected(node):
@@ -13,3 +19,149 @@ async def test_node_connected(node):
         headers=headers,
         heartbeat=60
     )
+
+
+@pytest.mark.asyncio
+async def test_node_rest_client(node):
+    assert node.rest.player is None
+    assert node.rest.node is node
+
+    node.update_state(NodeState.RECONNECTING)
+    with pytest.raises(RuntimeError):
+        await node.rest.load_tracks("ytsearch:test")
+
+
+def test_normalize_v4_event():
+    data = _normalize_v4_event({
+        "op": "event",
+        "type": "TrackEndEvent",
+        "guildId": "1",
+        "track": {"encoded": "QAAA", "info": {}},
+        "reason": "loadFailed",
+    })
+    assert data["track"] == "QAAA"
+    assert data["reason"] == "LOAD_FAILED"
+
+    data = _normalize_v4_event({"track": {"encoded": "QAAA"}, "exception": {"severity": "fault"}})
+    assert data["exception"]["severity"] == "FATAL"
+
+
+@pytest.mark.asyncio
+async def test_node_api_version(node):
+    assert node.api_version == 3
+    assert node.rest._uri.endswith(f":{node.port}/loadtracks?identifier=")
+
+    node._major_version = "4"
+    assert node.api_version == 4
+    assert node.rest._uri.endswith("/v4/loadtracks?identifier=")
+
+    # The client of the node follows its connection
+    node._ssl = True
+    assert node.rest._uri.startswith(f"https://{node.host}:{node.port}/")
+
+
+@pytest.mark.asyncio
+async def test_v4_player_updates(node, monkeypatch):
+    requests = []
+
+    async def rest_request(method, path, json=None, params=None):
+        if json.get("volume") == 0:
+            raise aiohttp.ClientConnectionError()
+        requests.append((method, path, json, params))
+
+    monkeypatch.setattr(node, "_rest_request", rest_request)
+    node._major_version = "4"
+    node._session_ready.clear()
+    track = Track({"track": "QAAA", "info": {"identifier": "id", "title": "Title", "length": 1000}})
+    try:
+        # The updates made before the session is ready wait for it
+        await node.play(1, track, start=500)
+        await node.pause(1, True)
+        assert not requests
+        # Still not ready, they are kept for the next session
+        await asyncio.wait_for(node._send_pending_updates(), 1)
+        assert len(node._pending_updates) == 2
+
+        node.session_id = "abc"
+        node._session_ready.set()
+        await node._send_pending_updates()
+        await node.volume(1, 50)
+        await node.seek(1, 100)
+        await node.play(1, track, replace=False)
+        path = "/v4/sessions/abc/players/1"
+        assert requests == [
+            ("PATCH", path, {"encodedTrack": "QAAA", "position": 500, "paused": False}, {"noReplace": "false"}),
+            ("PATCH", path, {"paused": True}, {"noReplace": "false"}),
+            ("PATCH", path, {"volume": 50}, {"noReplace": "false"}),
+            ("PATCH", path, {"position": 100}, {"noReplace": "false"}),
+            ("PATCH", path, {"encodedTrack": "QAAA", "position": 0, "paused": False}, {"noReplace": "true"}),
+        ]
+
+        # A connection error doesn't reach the player
+        await node.volume(1, 0)
+        assert len(requests) == 5
+    finally:
+        node._major_version = None
+        node.session_id = None
+
+
+@pytest.mark.asyncio
+async def test_node_routeplanner(node, monkeypatch):
+    async def rest_request(method, path, json=None, params=None):
+        assert (method, path) == ("GET", "/routeplanner/status")
+        return {
+            "class": "RotatingNanoIpRoutePlanner",
+            "details": {
+                "ipBlock": {"type": "Inet6Address", "size": "2"},
+                "failingAddresses": [
+                    {"failingAddress": "::1", "failingTimestamp": 0, "failingTime": ""},
+                    {"failingAddress": "::2", "failingTimestamp": 0, "failingTime": ""},
+                ],
+            },
+        }
+
+    monkeypatch.setattr(node, "_rest_request", rest_request)
+
+    status = await node.routeplanner_status()
+    assert status.ip_block_size == 2
+    assert status.exhausted
+    assert not node.is_source_available("youtube")
+    assert node.is_source_available("soundcloud")
+
+
+def test_source_health():
+    health = SourceHealth(threshold=2, cooldown=60)
+
+    health.record_failure("youtube")
+    assert health.is_healthy("youtube")
+    health.record_failure("youtube")
+    assert not health.is_healthy("youtube")
+
+    health.record_success("youtube")
+    assert health.is_healthy("youtube")
+    assert health.failures("youtube") == 0
+
+
+def test_record_load_severity(node):
+    node.source_health = SourceHealth(threshold=2, cooldown=60)
+
+    # Unavailable tracks don't make the source unhealthy
+    for _ in range(3):
+        node.record_load("soundcloud", True, ExceptionSeverity.COMMON)
+    assert node.is_source_available("soundcloud")
+
+    node.record_load("soundcloud", True, ExceptionSeverity.SUSPICIOUS)
+    node.record_load("soundcloud", True, ExceptionSeverity.FATAL)
+    assert not node.is_source_available("soundcloud")
+
+
+def test_latency_histogram():
+    histogram = LatencyHistogram(bounds=[0.001, 0.01, 0.1])
+    assert histogram.percentile(50) is None
+
+    for seconds in (0.0005, 0.002, 0.003, 0.05, 2.0):
+        histogram.record(seconds)
+    assert histogram.buckets() == [(0.001, 1), (0.01, 2), (0.1, 1), (float("inf"), 1)]
+    assert histogram.percentile(50) == 0.01
+    assert histogram.percentile(100) == 2.0
+    assert histogram.count == 5 and histogram.max == 2.0
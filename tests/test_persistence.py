@@ -0,0 +1,153 @@
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+
+from lavalink.persistence import QueueJournal
+from lavalink.player import Player
+from lavalink.rest_api import PendingTrack, Track
+from lavalink.tuples import PositionTime
+
+
+def _track(i: int) -> Track:
+    return Track(
+        {
+            "track": f"QAAA{i}",
+            "info": {
+                "identifier": f"id{i}",
+                "isSeekable": True,
+                "author": "Author",
+                "length": 1000,
+                "isStream": False,
+                "position": 0,
+                "title": f"Title {i}",
+                "uri": f"https://www.youtube.com/watch?v=id{i}",
+                "sourceName": "youtube",
+            },
+        }
+    )
+
+
+@pytest.fixture
+def player(bot, voice_channel, node):
+    return Player(bot, voice_channel, node)
+
+
+@pytest.mark.asyncio
+async def test_restore(player, bot, voice_channel, node, user, tmp_path):
+    journal = QueueJournal(str(tmp_path), flush_interval=60)
+    journal.start()
+    try:
+        for i in range(4):
+            player.add(user, _track(i))
+        player.add_queries(user, ["some query"])
+        await player.play()
+        player.move(2, 0)
+        player.remove(1)
+        await player.handle_player_update(PositionTime(position=1500, time=0, connected=True))
+        await player.handle_player_update(PositionTime(position=2500, time=0, connected=True))
+    finally:
+        await journal.close()
+
+    expected = [track.title for track in player.queue]
+    restored = Player(bot, voice_channel, node)
+    journal = QueueJournal(str(tmp_path))
+    assert await journal.load() == [player.guild.id]
+    assert journal.restore(restored)
+
+    assert [track.title for track in restored.queue] == expected
+    assert isinstance(restored.queue[-1], PendingTrack)
+    assert restored.queue[0].requester == user.id
+    assert restored.current.title == player.current.title
+    assert restored.position == 2500
+    assert not journal.restore(restored)
+    journal._executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_compaction(player, bot, voice_channel, node, user, tmp_path):
+    journal = QueueJournal(str(tmp_path), flush_interval=60, compact_after=5)
+    journal.start()
+    try:
+        for i in range(6):
+            player.add(user, _track(i))
+        await journal.flush()
+        player.remove(0)
+    finally:
+        await journal.close()
+
+    assert (tmp_path / "shard-0.snapshot").exists()
+    assert len((tmp_path / "shard-0.journal").read_text().splitlines()) == 1
+
+    # A record truncated by a crash is skipped
+    with open(tmp_path / "shard-0.journal", "a") as file:
+        file.write('{"g": 1, "op": "ad')
+
+    restored = Player(bot, voice_channel, node)
+    journal = QueueJournal(str(tmp_path))
+    await journal.load()
+    assert journal.restore(restored)
+    assert [track.title for track in restored.queue] == [f"Title {i}" for i in range(1, 6)]
+    journal._executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_snapshot_serialized_by_writer(player, bot, voice_channel, node, user, tmp_path):
+    journal = QueueJournal(str(tmp_path), flush_interval=60)
+    journal.start()
+    try:
+        for i in range(5):
+            player.add(user, _track(i))
+        player.force_shuffle(0)
+        # The queue is serialized by the writer thread, not on the event loop
+        (snapshot,) = [record for record in journal._pending[0] if record["op"] == "snapshot"]
+        assert all(isinstance(entry, Track) for entry in snapshot["entries"])
+    finally:
+        await journal.close()
+
+    restored = Player(bot, voice_channel, node)
+    journal = QueueJournal(str(tmp_path))
+    await journal.load()
+    assert journal.restore(restored)
+    assert [track.title for track in restored.queue] == [track.title for track in player.queue]
+    journal._executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_position_of_previous_track(player, node, tmp_path):
+    journal = QueueJournal(str(tmp_path), flush_interval=60)
+    journal.record(player, "current", {"entry": _track(1)})
+    journal.record(player, "position", {"position": 120000})
+    journal.record(player, "current", {"entry": _track(2)})
+    await journal.flush()
+
+    journal = QueueJournal(str(tmp_path))
+    await journal.load()
+    assert journal.restore(player)
+    assert player.current.title == "Title 2"
+    assert player.position == 0
+    journal._executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_queues_kept_on_shutdown(bot, node, user, tmp_path):
+    guild = SimpleNamespace(id=123, name="Shutdown", change_voice_state=AsyncMock())
+    channel = SimpleNamespace(
+        id=456, guild=guild, name="Shutdown VC", _get_voice_client_key=lambda: (guild.id, "guild_id")
+    )
+    player = Player(bot, channel, node)
+    node.add_player(guild.id, player)
+    journal = QueueJournal(str(tmp_path), flush_interval=60)
+    journal.start()
+    try:
+        player.add(user, _track(0))
+        # As done for every player by lavalink.close()
+        node._is_shutdown = True
+        await player.disconnect(force=True)
+    finally:
+        node._is_shutdown = False
+        await journal.close()
+
+    journal = QueueJournal(str(tmp_path))
+    assert await journal.load() == [guild.id]
+    journal._executor.shutdown()
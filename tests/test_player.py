@@ -0,0 +1,385 @@
+import asyncio
+import time
+
+import pytest
+
+import lavalink
+from lavalink.enums import LavalinkEvents, LavalinkIncomingOp, QueueChangeType, TrackEndReason
+from lavalink.player import Player
+from lavalink.rest_api import LoadResult, PendingTrack, Track
+
+
+def _raw_track(i: int) -> dict:
+    return {
+        "track": f"QAAA{i}",
+        "info": {
+            "identifier": f"id{i}",
+            "isSeekable": True,
+            "author": "Author",
+            "length": 1000,
+            "isStream": False,
+            "position": 0,
+            "title": f"Title {i}",
+            "uri": f"https://www.youtube.com/watch?v=id{i}",
+            "sourceName": "youtube",
+        },
+    }
+
+
+def _track(i: int) -> Track:
+    return Track(_raw_track(i))
+
+
+@pytest.fixture
+def player(bot, voice_channel, node):
+    return Player(bot, voice_channel, node)
+
+
+@pytest.mark.asyncio
+async def test_play_order(player):
+    for i in range(3):
+        player.add(None, _track(i))
+
+    await player.play()
+    assert player.current.title == "Title 0"
+
+    player.repeat = True
+    await player.play()
+    assert player.current.title == "Title 0"
+    assert [track.title for track in player.queue] == ["Title 1", "Title 2"]
+
+
+@pytest.mark.asyncio
+async def test_prefetch(player):
+    prefetched = []
+    gate = asyncio.Event()
+
+    async def listener(player_, track):
+        await gate.wait()
+        prefetched.append(track.title)
+
+    lavalink.register_prefetch_listener(listener)
+    try:
+        player.prefetch_depth = 2
+        for i in range(4):
+            player.add(None, _track(i))
+        assert len(player._prefetch_tasks) == 2
+
+        # The transition doesn't wait for the prefetch of the track
+        await player.play()
+        assert player.current.title == "Title 0"
+        assert len(player._prefetch_tasks) == 2
+
+        gate.set()
+        await asyncio.sleep(0.01)
+        assert sorted(prefetched) == ["Title 0", "Title 1", "Title 2"]
+    finally:
+        lavalink.unregister_prefetch_listener(listener)
+        await player.stop()
+
+
+@pytest.mark.asyncio
+async def test_pending_tracks(player, monkeypatch):
+    async def load_tracks(query, priority=None, hedge=None):
+        if query == "missing":
+            return LoadResult({"loadType": "NO_MATCHES", "tracks": []})
+        i = int(query.split()[-1])
+        return LoadResult({"loadType": "SEARCH_RESULT", "tracks": [_raw_track(i)]})
+
+    monkeypatch.setattr(player, "load_tracks", load_tracks)
+    player.prefetch_depth = 0
+    player.add_queries("user", ["song 0", "missing", "song 2"])
+    assert all(isinstance(entry, PendingTrack) for entry in player.queue)
+
+    await player.play()
+    assert player.current.title == "Title 0"
+    assert player.current.requester == "user"
+
+    # The entry without results is skipped
+    await player.play()
+    assert player.current.title == "Title 2"
+    assert not player.queue
+
+    player.prefetch_depth = 2
+    player.add_queries("user", ["missing", "song 5", "song 6"])
+    await asyncio.sleep(0.01)
+    assert [track.title for track in player.queue] == ["Title 5", "Title 6"]
+    await player.stop()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("fair", [False, True])
+async def test_resolve_then_play(player, node, monkeypatch, fair):
+    async def load_tracks(query, priority=None, hedge=None):
+        return LoadResult({"loadType": "TRACK_LOADED", "tracks": [_raw_track(5)]})
+
+    monkeypatch.setattr(player, "load_tracks", load_tracks)
+    player.set_fair_queue(fair)
+    unresolved = _raw_track(5)
+    unresolved["track"] = None
+    player.add("user", Track(unresolved))
+    player.add("user", _track(6))
+    node.event_handler.reset_mock()
+    await asyncio.sleep(0.01)
+    assert player.queue[0].track_identifier == "QAAA5"
+    # The UIs are told to replace the unresolved entry
+    (change,) = [call.args[2]["change"] for call in node.event_handler.call_args_list]
+    assert (change.type, change.index, change.entries) == (QueueChangeType.REPLACED, 0, (player.queue[0],))
+    assert player.contains(_track(5))
+
+    await player.play()
+    assert player.current.title == "Title 5"
+    assert player.current.requester == "user"
+    assert not player.contains(_track(5))
+    await player.stop()
+
+
+def test_add_dedupe(player):
+    assert player.add(None, _track(0), dedupe=True)
+    assert not player.add(None, _track(0), dedupe=True)
+    assert player.add(None, _track(0))
+    assert player.add(None, _track(1), dedupe=True)
+
+    assert player.contains(_track(1))
+    assert player.dedupe() == 1
+    assert [track.title for track in player.queue] == ["Title 0", "Title 1"]
+
+
+@pytest.mark.asyncio
+async def test_fair_queue(player):
+    for i in range(3):
+        player.add("a", _track(i))
+    player.add("b", _track(10))
+
+    async def listener(player_, track):
+        pass
+
+    lavalink.register_prefetch_listener(listener)
+    try:
+        player.set_fair_queue()
+    finally:
+        lavalink.unregister_prefetch_listener(listener)
+    assert player.fair_queue
+    assert [track.title for track in player.queue] == ["Title 0", "Title 10", "Title 1", "Title 2"]
+    # The prefetch window follows the new order
+    assert sorted(track.title for track, _ in player._prefetch_tasks.values()) == ["Title 0", "Title 10"]
+
+    await player.play()
+    await player.play()
+    assert player.current.title == "Title 10"
+
+    player.set_fair_queue(False)
+    assert not player.fair_queue
+    assert [track.title for track in player.queue] == ["Title 1", "Title 2"]
+
+
+@pytest.mark.asyncio
+async def test_fast_transition(player, node):
+    node.add_player(player.guild.id, player)
+    try:
+        for i in range(3):
+            player.add(None, _track(i))
+        await player.play()
+        node._MOCK_send.reset_mock()
+        # As if the current track was played by autoplay
+        player._auto_play_sent = True
+
+        event = {"op": "event", "type": "TrackEndEvent", "guildId": str(player.guild.id), "reason": "FINISHED"}
+        await node._handle_op(LavalinkIncomingOp.EVENT, event, time.perf_counter())
+        assert not player._auto_play_sent
+
+        # The next track was sent with its pre-built payload, before the event reached the player
+        node._MOCK_send.assert_called_once()
+        assert node._MOCK_send.call_args.args[0]["track"] == "QAAA1"
+        assert player.current.title == "Title 1"
+        assert node.transition_latency.count == 1
+        ends = [call for call in node.event_handler.call_args_list if call.args[1] == LavalinkEvents.TRACK_END]
+        assert len(ends) == 1
+
+        await player.handle_event(LavalinkEvents.TRACK_END, TrackEndReason.FINISHED)
+        node._MOCK_send.assert_called_once()
+        assert player.current.title == "Title 1"
+
+        # Without a prepared track, the event falls back to play
+        player.repeat = True
+        await node._handle_op(LavalinkIncomingOp.EVENT, event, time.perf_counter())
+        node._MOCK_send.assert_called_once()
+        await player.handle_event(LavalinkEvents.TRACK_END, TrackEndReason.FINISHED)
+        assert node._MOCK_send.call_count == 2
+        assert node.transition_latency.count == 2
+    finally:
+        # The mocked guild can't be disconnected by the node
+        node._players_dict.pop(player.guild.id)
+
+    # The end of a track of a guild without player isn't kept
+    event = {"op": "event", "type": "TrackEndEvent", "guildId": "1", "reason": "FINISHED"}
+    await node._handle_op(LavalinkIncomingOp.EVENT, event, time.perf_counter())
+    assert not node._track_ends
+
+
+@pytest.mark.asyncio
+async def test_previous(player):
+    for i in range(3):
+        player.add(None, _track(i))
+    assert not await player.previous()
+
+    await player.play()
+    await player.play()
+    assert [track.title for track in player.history] == ["Title 0"]
+
+    assert await player.previous()
+    assert player.current.title == "Title 0"
+    assert [track.title for track in player.queue] == ["Title 1", "Title 2"]
+    assert not player.history
+
+    await player.stop()
+    assert [track.title for track in player.history] == ["Title 0"]
+
+
+@pytest.mark.asyncio
+async def test_autoplay(player, monkeypatch):
+    queries = []
+
+    async def load_tracks(query, priority=None):
+        queries.append(query)
+        # The mix of a track contains the track itself and the next ones
+        i = int(query.rsplit("RDid", 1)[-1])
+        return LoadResult({"loadType": "PLAYLIST_LOADED", "playlistInfo": {}, "tracks": [
+            _raw_track(i), _raw_track(i + 1), _raw_track(i + 2), _raw_track(0)
+        ]})
+
+    monkeypatch.setattr(player, "load_tracks", load_tracks)
+    lavalink.related_tracks.clear()
+    player.autoplay = True
+    player.add(None, _track(0))
+
+    await player.play()
+    assert not player.is_auto_playing
+    # The related tracks are looked up while the last track of the queue plays
+    await asyncio.sleep(0.01)
+    assert queries == ["https://www.youtube.com/watch?v=id0&list=RDid0"]
+
+    await player.play()
+    assert player.current.title == "Title 1"
+    assert player.current.extras == {"autoplay": True}
+    assert player._is_autoplaying
+
+    await asyncio.sleep(0.01)
+    await player.play()
+    # The tracks already played aren't picked again
+    assert player.current.title == "Title 2"
+    assert len(queries) == 2
+    await player.stop()
+
+
+def test_bulk_commands(player):
+    player.add_many("a", [_track(i) for i in range(4)])
+    player.insert_many(1, "b", [_track(10), _track(11)])
+    assert [track.title for track in player.queue] == [
+        "Title 0", "Title 10", "Title 11", "Title 1", "Title 2", "Title 3"
+    ]
+
+    changes = []
+    lavalink.player._queue_listeners.append(lambda player_, op, data: changes.append(op))
+    try:
+        player.move_range(1, 3, 4)
+        assert [track.title for track in player.queue][-2:] == ["Title 10", "Title 11"]
+        assert [track.title for track in player.clear_requester("b")] == ["Title 10", "Title 11"]
+        assert not player.remove_where(lambda track: track.requester == "b")
+    finally:
+        lavalink.player._queue_listeners.pop()
+    # One notification for each command that changed the queue
+    assert changes == ["snapshot", "snapshot"]
+
+
+@pytest.mark.asyncio
+async def test_queue_update_events(player, node):
+    def changes() -> list:
+        calls = [call.args for call in node.event_handler.call_args_list]
+        node.event_handler.reset_mock()
+        return [data["change"] for op, event, data in calls if event == LavalinkEvents.QUEUE_UPDATE]
+
+    player.add("a", _track(0))
+    player.add_many("b", [_track(1), _track(2), _track(3)])
+    player.insert_many(1, "c", [_track(4)])
+    single, many, inserted = changes()
+    assert (single.type, single.index, single.count) == (QueueChangeType.INSERTED, 0, 1)
+    assert (many.type, many.index, many.count) == (QueueChangeType.INSERTED, 1, 3)
+    assert [track.title for track in many.entries] == ["Title 1", "Title 2", "Title 3"]
+    assert (inserted.index, inserted.entries) == (1, (player.queue[1],))
+
+    player.remove(2)
+    player.move_range(0, 2, 2)
+    (removed, moved) = changes()
+    assert (removed.type, removed.index, removed.count) == (QueueChangeType.REMOVED, 2, 1)
+    assert (moved.type, moved.index, moved.count, moved.destination) == (QueueChangeType.MOVED, 0, 2, 2)
+
+    # Applying the changes to a copy of the queue gives the same order
+    mirror = [track.title for track in player.queue]
+    player.remove_where(lambda track: track.requester == "b")
+    (removed,) = changes()
+    assert removed.indices == (0, 1)
+    for index in reversed(removed.indices):
+        del mirror[index]
+    assert mirror == [track.title for track in player.queue]
+
+    player.force_shuffle(0)
+    await player.stop()
+    assert [change.type for change in changes()] == [QueueChangeType.SHUFFLED, QueueChangeType.CLEARED]
+
+
+@pytest.mark.asyncio
+async def test_filters_are_merged(player, node):
+    player.filter_delay = 0
+    node._MOCK_send.reset_mock()
+    await player.nightcore()
+    await player.bass_boost()
+    await player.equalizer(1, 0)
+    await player.filter_volume(0.5)
+    sent = node._MOCK_send.call_args.args[0]
+    assert sent["op"] == "filters"
+    assert sent["timescale"] == {"speed": 1.20, "pitch": 1.1, "rate": 1.20}
+    assert sent["equalizer"] == [{"band": 0, "gain": 0.15}, {"band": 2, "gain": 0.15}]
+    assert sent["volume"] == 0.5
+    assert node._MOCK_send.call_count == 4
+
+    with pytest.raises(ValueError):
+        await player.vibrato(depth=2)
+    assert lavalink.FiltersOp.VIBRATO not in player.filters
+
+    # The filters are sent again after the current track is played on a new player
+    player.current = _track(0)
+    node._MOCK_send.reset_mock()
+    await player.resume(player.current, pause=False)
+    filters = [call.args[0] for call in node._MOCK_send.call_args_list if call.args[0]["op"] == "filters"]
+    assert filters == [sent]
+
+    await player.reset_filter()
+    assert not player.filters
+    assert node._MOCK_send.call_args.args[0] == {"op": "filters", "guildId": str(player.guild.id)}
+
+
+@pytest.mark.asyncio
+async def test_filters_debounce(player, node):
+    player.filter_delay = 0.05
+    node._MOCK_send.reset_mock()
+    # The first change is sent at once, the next ones wait for the end of the delay
+    for gain in (0.1, 0.2, 0.3):
+        await player.equalizer(0, gain)
+    await player.timescale(speed=1.5)
+    assert node._MOCK_send.call_count == 1
+
+    await asyncio.sleep(0.1)
+    assert node._MOCK_send.call_count == 2
+    sent = node._MOCK_send.call_args.args[0]
+    assert sent["equalizer"] == [{"band": 0, "gain": 0.3}]
+    assert sent["timescale"]["speed"] == 1.5
+
+    await player.equalizer(1, 0.1)
+    await player.flush_filters()
+    assert node._MOCK_send.call_count == 3
+    assert len(node._MOCK_send.call_args.args[0]["equalizer"]) == 2
+    # Nothing is left to send
+    await asyncio.sleep(0.1)
+    await player.flush_filters()
+    assert node._MOCK_send.call_count == 3
@@ -0,0 +1,52 @@
+import pytest
+
+from lavalink.query import analyze_query
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "https://youtu.be/dQw4w9WgXcQ?si=tracking&t=42",
+        "https://m.youtube.com/watch?v=dQw4w9WgXcQ&feature=share&t=42s",
+        "https://www.youtube.com/watch?v=dQw4w9WgXcQ&t=42",
+        "https://music.youtube.com/watch?v=dQw4w9WgXcQ&t=0h0m42s",
+    ],
+)
+def test_youtube_canonical(query):
+    info = analyze_query(query)
+
+    assert info.canonical == "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+    assert info.cache_key == "youtube:dQw4w9WgXcQ"
+    assert info.source == "youtube"
+    assert info.identifier == "dQw4w9WgXcQ"
+    assert info.start_time == 42000
+
+
+def test_search_query():
+    info = analyze_query("ytsearch:  Never Gonna   Give You Up ")
+
+    assert info.is_search
+    assert info.canonical == "ytsearch:Never Gonna Give You Up"
+    assert info.cache_key == analyze_query("ytsearch:never gonna give you up").cache_key
+
+
+def test_other_sources():
+    soundcloud = analyze_query("https://m.soundcloud.com/artist/song?utm_source=clipboard#t=1:30")
+    twitch = analyze_query("https://twitch.tv/channel?t=1h2m3s")
+    local = analyze_query("/music/song.mp3")
+
+    assert soundcloud.canonical == "https://soundcloud.com/artist/song"
+    assert soundcloud.start_time == 90000
+    assert twitch.canonical == "https://www.twitch.tv/channel"
+    assert twitch.start_time == 3723000
+    assert local.canonical == "/music/song.mp3"
+    assert local.source is None
+
+
+def test_other_urls_unchanged():
+    query = "https://Example.com/track.mp3?ref=home&utm_source=bot&token=a%2Fb#part"
+    info = analyze_query(query)
+
+    assert info.canonical == query
+    assert info.cache_key == query
+    assert info.source is None
@@ -0,0 +1,303 @@
+import random
+from types import SimpleNamespace
+
+import pytest
+
+import lavalink
+from lavalink.queue import CompactTrackQueue, FairQueue, PlayHistory, TrackQueue
+from lavalink.rest_api import PendingTrack, Track
+
+
+def test_queue_matches_list():
+    rng = random.Random(42)
+    queue = TrackQueue(range(50), block_size=4)
+    expected = list(range(50))
+
+    for i in range(2000):
+        op = rng.randrange(5)
+        if op == 0 or not expected:
+            index = rng.randint(-len(expected) - 1, len(expected))
+            queue.insert(index, i)
+            expected.insert(index, i)
+        elif op == 1:
+            index = rng.randrange(len(expected))
+            assert queue.pop(index) == expected.pop(index)
+        elif op == 2:
+            source, destination = rng.randrange(len(expected)), rng.randrange(len(expected))
+            queue.move(source, destination)
+            expected.insert(destination, expected.pop(source))
+        elif op == 3:
+            index = rng.randrange(len(expected))
+            queue[index] = expected[index] = -i
+        else:
+            assert queue.popleft() == expected.pop(0)
+
+        assert len(queue) == len(expected)
+
+    assert list(queue) == expected
+    assert list(reversed(queue)) == expected[::-1]
+    assert queue[3:40] == expected[3:40]
+    assert queue[::7] == expected[::7]
+    assert [queue[i] for i in range(len(expected))] == expected
+
+
+def test_queue_deque_methods():
+    queue = TrackQueue(block_size=2)
+    queue.extend([2, 3])
+    queue.appendleft(1)
+    queue.append(4)
+
+    assert list(queue) == [1, 2, 3, 4]
+    assert queue.popleft() == 1
+    assert queue.pop() == 4
+    assert 3 in queue
+    assert queue.index(3) == 1
+
+    queue.clear()
+    assert not queue
+    with pytest.raises(IndexError):
+        queue.popleft()
+    with pytest.raises(IndexError):
+        queue[0]
+
+
+def test_queue_identifier_index():
+    tracks = [SimpleNamespace(track_identifier=f"id{i % 3}") for i in range(6)]
+    queue = TrackQueue(tracks, block_size=2)
+
+    assert queue.count(tracks[0]) == 2
+    assert SimpleNamespace(track_identifier="id1") in queue
+    assert SimpleNamespace(track_identifier="other") not in queue
+
+    queue[0] = SimpleNamespace(track_identifier="id4")
+    assert queue.count(tracks[0]) == 1
+    queue.popleft()
+    queue.pop()
+    assert queue.count(tracks[2]) == 1
+
+    assert queue.dedupe() == 1
+    assert [track.track_identifier for track in queue] == ["id1", "id2", "id0"]
+    assert queue.dedupe() == 0
+
+
+def test_queue_shuffle_and_unshuffle():
+    entries = [SimpleNamespace(track_identifier=f"id{i}", bumped=i in (5, 9)) for i in range(40)]
+    queue = TrackQueue(entries, block_size=4)
+
+    queue.shuffle(2, keep_first=lambda entry: entry.bumped, rng=random.Random(1))
+    assert queue[:4] == entries[:2] + [entries[5], entries[9]]
+    assert list(queue) != entries
+    assert sorted(queue, key=lambda entry: int(entry.track_identifier[2:])) == entries
+    assert queue.count(entries[7]) == 1
+
+    queue.shuffle(2, rng=random.Random(2))
+    queue.popleft()
+    removed = queue.pop(10)
+    queue.append("new")
+    assert queue.unshuffle()
+    assert list(queue) == [entry for entry in entries[1:] if entry is not removed] + ["new"]
+    assert not queue.unshuffle()
+
+    queue.shuffle(0)
+    queue.insert(5, "inside")
+    assert not queue.shuffled
+
+
+def _track(i: int, requester=None) -> Track:
+    track = Track(
+        {
+            "track": f"QAAAAQ{i:04d}==",
+            "info": {
+                "identifier": f"id{i}",
+                "isSeekable": True,
+                "author": f"Author {i % 3}",
+                "length": 1000 + i,
+                "isStream": False,
+                "position": 0,
+                "title": f"Title {i}",
+                "uri": f"https://www.youtube.com/watch?v=id{i}",
+                "sourceName": "youtube",
+            },
+        }
+    )
+    track.requester = requester
+    return track
+
+
+def test_compact_queue_matches_track_queue():
+    rng = random.Random(7)
+    user = SimpleNamespace(id=1234)
+    queue = CompactTrackQueue((_track(i, user) for i in range(50)), block_size=4)
+    expected = TrackQueue((_track(i, user) for i in range(50)), block_size=4)
+
+    for i in range(50, 1500):
+        op = rng.randrange(5)
+        if op == 0 or not expected:
+            index = rng.randint(0, len(expected))
+            queue.insert(index, _track(i, user))
+            expected.insert(index, _track(i, user))
+        elif op == 1:
+            index = rng.randrange(len(expected))
+            assert queue.pop(index) == expected.pop(index)
+        elif op == 2:
+            source, destination = rng.randrange(len(expected)), rng.randrange(len(expected))
+            queue.move(source, destination)
+            expected.move(source, destination)
+        elif op == 3:
+            queue.append(_track(i))
+            expected.append(_track(i))
+        else:
+            assert queue.popleft() == expected.popleft()
+
+    fields = ("track_identifier", "identifier", "author", "length", "title", "uri", "source", "seekable")
+    assert [[getattr(track, field) for field in fields] for track in queue] == [
+        [getattr(track, field) for field in fields] for track in expected
+    ]
+    assert queue[::5] == expected[::5]
+    assert queue.count(expected[0]) == 1
+    assert {track.requester for track in queue} <= {None, 1234}
+
+
+def test_compact_queue_views():
+    users = {1: SimpleNamespace(id=1)}
+    queue = CompactTrackQueue([_track(0, users[1]), _track(1)], resolve_requester=users.get)
+    pending = PendingTrack("query", users[1])
+    queue.append(pending)
+
+    # A referenced view is reused, with its changes
+    first = queue[0]
+    assert queue[0] is first
+    assert first.requester is users[1]
+    first.extras["bumped"] = True
+    assert queue.popleft() is first
+    assert first.extras == {"bumped": True}
+
+    assert queue[-1] is pending
+    assert queue[0].requester is None
+    queue[0] = _track(2)
+    assert queue[0].title == "Title 2"
+    assert _track(1) not in queue and _track(2) in queue
+
+
+@pytest.mark.parametrize("kind", [TrackQueue, CompactTrackQueue])
+def test_queue_bulk_methods(kind):
+    user = SimpleNamespace(id=1)
+    expected = [_track(i, user) for i in range(30)]
+    queue = kind(expected, block_size=4)
+
+    queue.insert_many(5, [_track(i, user) for i in range(100, 110)])
+    expected[5:5] = [_track(i, user) for i in range(100, 110)]
+    queue.insert_many(len(queue), [_track(200)])
+    expected.append(_track(200))
+
+    removed = queue.remove_where(lambda track: track.length % 2 == 0)
+    assert removed == [track for track in expected if track.length % 2 == 0]
+    expected = [track for track in expected if track.length % 2]
+
+    queue.move_range(2, 6, 10)
+    moved = expected[2:6]
+    del expected[2:6]
+    expected[10:10] = moved
+
+    assert [track.title for track in queue] == [track.title for track in expected]
+    assert queue.count(_track(104)) == 0 and queue.count(_track(105)) == 1
+
+
+def test_queue_remove_where_keeps_shuffle():
+    queue = TrackQueue(range(20), block_size=4)
+    queue.shuffle(2, rng=random.Random(3))
+    expected = [value for value in queue if value in (0, 5, 6)]
+    assert queue.remove_where(lambda value: value in (0, 5, 6)) == expected
+    assert queue.unshuffle()
+    assert list(queue) == [value for value in range(1, 20) if value not in (5, 6)]
+
+
+def _entry(requester: str, i: int, length: int = 1000) -> SimpleNamespace:
+    return SimpleNamespace(requester=requester, track_identifier=f"{requester}{i}", length=length, is_stream=False)
+
+
+def test_fair_queue_round_robin():
+    queue = FairQueue([_entry("a", i) for i in range(5)])
+    queue.extend([_entry("b", 0), _entry("c", 0), _entry("b", 1)])
+
+    order = ["a0", "b0", "c0", "a1", "b1", "a2", "a3", "a4"]
+    assert [entry.track_identifier for entry in queue] == order
+    assert queue[3].track_identifier == "a1"
+    assert _entry("c", 0) in queue
+
+    queue.appendleft(_entry("c", 9))
+    assert queue[0].track_identifier == "c9"
+    del queue[1]
+    popped = [queue.popleft().track_identifier for _ in range(len(queue))]
+    assert popped == ["c9", "a1", "b0", "c0", "a2", "b1", "a3", "a4"]
+    assert not queue.requesters
+
+
+def test_fair_queue_weighted():
+    queue = FairQueue(weighted=True, quantum=300)
+    queue.extend([_entry("long", i, length=300) for i in range(3)])
+    queue.extend([_entry("short", i, length=100) for i in range(6)])
+
+    expected = ["long0", "short0", "short1", "short2", "long1", "short3", "short4", "short5", "long2"]
+    assert [entry.track_identifier for entry in queue] == expected
+    assert [queue.popleft().track_identifier for _ in range(len(queue))] == expected
+
+
+
+@pytest.mark.parametrize("weighted", [False, True])
+def test_fair_queue_head(weighted):
+    rng = random.Random(7)
+    queue = FairQueue(weighted=weighted, quantum=300)
+    for i in range(200):
+        requester = rng.choice("abcd")
+        queue.append(_entry(requester, i, length=rng.choice((100, 200, 300, 500))))
+        if rng.random() < 0.4 and len(queue) > 1:
+            queue.popleft()
+        # The next entry is read without computing the whole order
+        head = queue[0]
+        assert queue._view is None
+        assert head is next(iter(queue))
+
+
+def test_play_history():
+    history = PlayHistory(size=3)
+    for i in range(5):
+        history.append(i)
+    assert list(history) == [2, 3, 4]
+    assert list(reversed(history)) == [4, 3, 2]
+    assert history.pop() == 4
+    history.append(5)
+    assert list(history) == [2, 3, 5]
+
+
+def test_play_history_global_limit():
+    lavalink.set_history_limit(4)
+    try:
+        first, second = PlayHistory(size=3), PlayHistory(size=3)
+        for i in range(3):
+            first.append(f"a{i}")
+        second.append("b0")
+        second.append("b1")
+        # The globally oldest entries are dropped first
+        assert list(first) == ["a1", "a2"]
+        assert list(second) == ["b0", "b1"]
+
+        first.clear()
+        second.append("b2")
+        assert list(second) == ["b0", "b1", "b2"]
+    finally:
+        lavalink.set_history_limit(10_000)
+
+
+def test_fair_queue_bulk_methods():
+    queue = FairQueue([_entry("a", i) for i in range(3)] + [_entry("b", i) for i in range(3)])
+    queue.insert_many(0, [_entry("c", 0), _entry("c", 1)])
+    assert [entry.track_identifier for entry in queue][:4] == ["c0", "a0", "b0", "c1"]
+
+    removed = queue.remove_where(lambda entry: entry.requester == "a")
+    assert [entry.track_identifier for entry in removed] == ["a0", "a1", "a2"]
+    assert [entry.track_identifier for entry in queue] == ["c0", "b0", "c1", "b1", "b2"]
+
+    queue.move_range(3, 5, 0)
+    assert len(queue) == 5 and queue.requesters == 2
+    assert queue[0].track_identifier == "b1"
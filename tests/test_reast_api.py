@@ -1,4 +1,13 @@
-from lavalink.rest_api import LoadResult, Track
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from lavalink.enums import ExceptionSeverity, LoadType, RequestPriority
+from lavalink.metrics import LatencyWindow
+from lavalink.rest_api import HedgePolicy, LoadResult, RESTClient, Track, TrackStream
+from lavalink.scheduler import RESTScheduler
 
 
 def test_load_result_track():
@@ -100,3 +109,332 @@ def test_track():
     assert track.identifier == "dQw4w9WgXcQ"
     assert track.thumbnail == "https://img.youtube.com/vi/dQw4w9WgXcQ/mqdefault.jpg"
     assert not track.is_stream
+
+
+class _DelayedClient(RESTClient):
+    def __init__(self, delays: dict[str, float]):
+        self.delays = delays
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def load_tracks(self, query: str, priority: RequestPriority = RequestPriority.INTERACTIVE) -> LoadResult:
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(self.delays[query])
+        self.in_flight -= 1
+        return LoadResult({"loadType": "NO_MATCHES", "tracks": []})
+
+
+@pytest.mark.asyncio
+async def test_load_many_unordered():
+    client = _DelayedClient({"a": 0.03, "b": 0.01, "c": 0.02})
+
+    queries = [query async for query, _ in client.load_many(["a", "b", "c"], concurrency=3)]
+
+    assert queries == ["b", "c", "a"]
+
+
+@pytest.mark.asyncio
+async def test_load_many_ordered():
+    client = _DelayedClient({"a": 0.03, "b": 0.01, "c": 0.02, "d": 0.0})
+
+    results = [r async for r in client.load_many("abcd", concurrency=2, ordered=True)]
+
+    assert [query for query, _ in results] == ["a", "b", "c", "d"]
+    assert all(result.load_type == LoadType.NO_MATCHES for _, result in results)
+    assert client.max_in_flight <= 2
+
+
+class _FakeContent:
+    def __init__(self, body: bytes, chunk_size: int):
+        self._chunks = [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)]
+
+    async def read(self, n: int = -1) -> bytes:
+        return self._chunks.pop(0) if self._chunks else b""
+
+
+class _FakeResponse:
+    def __init__(self, body: bytes, chunk_size: int):
+        self.content = _FakeContent(body, chunk_size)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+
+class _FakeSession:
+    def __init__(self, body: bytes, chunk_size: int):
+        self.body = body
+        self.chunk_size = chunk_size
+
+    def get(self, url, headers=None):
+        return _FakeResponse(self.body, self.chunk_size)
+
+
+def _playlist_body(count: int) -> bytes:
+    tracks = []
+    for i in range(count):
+        tracks.append({
+            "track": f"QAAA{i}",
+            "info": {
+                "identifier": f"id{i}",
+                "isSeekable": True,
+                "author": "Ãuthor",
+                "length": 1000 + i,
+                "isStream": False,
+                "position": 0,
+                "title": f"Title {i}",
+                "uri": f"https://www.youtube.com/watch?v=id{i}",
+                "sourceName": "youtube",
+            },
+        })
+    data = {"loadType": "PLAYLIST_LOADED", "playlistInfo": {"name": "Big", "selectedTrack": -1}, "tracks": tracks}
+    return json.dumps(data, ensure_ascii=False).encode()
+
+
+def _fake_client(body: bytes, chunk_size: int) -> RESTClient:
+    client = RESTClient.__new__(RESTClient)
+    client.node = SimpleNamespace(rest_scheduler=RESTScheduler())
+    client._session = _FakeSession(body, chunk_size)
+    client._headers = {}
+    return client
+
+
+@pytest.mark.asyncio
+async def test_stream_tracks():
+    client = _fake_client(_playlist_body(50), chunk_size=7)
+
+    stream = TrackStream(client, "https://www.youtube.com/playlist?list=x", "url")
+    tracks = [track async for track in stream]
+
+    assert len(tracks) == stream.tracks_read == 50
+    assert tracks[49].length == 1049
+    assert tracks[0].author == "Ãuthor"
+    assert stream.load_type == LoadType.PLAYLIST_LOADED
+    assert stream.playlist_info.name == "Big"
+
+
+@pytest.mark.asyncio
+async def test_stream_tracks_limit():
+    client = _fake_client(_playlist_body(50), chunk_size=1024)
+
+    stream = TrackStream(client, "query", "url", limit=3)
+
+    assert [track.title async for track in stream] == ["Title 0", "Title 1", "Title 2"]
+
+
+def _v4_body(body: bytes) -> bytes:
+    data = json.loads(body)
+    data = {
+        "loadType": "playlist",
+        "data": {"info": data["playlistInfo"], "pluginInfo": {}, "tracks": data["tracks"]},
+    }
+    for track in data["data"]["tracks"]:
+        track["encoded"] = track.pop("track")
+    return json.dumps(data).encode()
+
+
+@pytest.mark.asyncio
+async def test_stream_tracks_v4():
+    client = _fake_client(_v4_body(_playlist_body(20)), chunk_size=5)
+
+    stream = TrackStream(client, "query", "url")
+    tracks = [track async for track in stream]
+
+    assert len(tracks) == 20
+    assert tracks[3].track_identifier == "QAAA3"
+    assert stream.load_type == LoadType.PLAYLIST_LOADED
+    assert stream.playlist_info.name == "Big"
+
+
+def test_load_result_v4():
+    playlist = LoadResult(json.loads(_v4_body(_playlist_body(3))))
+    assert playlist.load_type == LoadType.PLAYLIST_LOADED
+    assert playlist.playlist_info.name == "Big"
+    assert [track.track_identifier for track in playlist.tracks] == ["QAAA0", "QAAA1", "QAAA2"]
+
+    error = LoadResult({"loadType": "error", "data": {"message": "Broken", "severity": "fault"}})
+    assert error.has_error
+    assert error.exception_message == "Broken"
+    assert error.exception_severity == ExceptionSeverity.FATAL
+
+    assert LoadResult({"loadType": "empty", "data": {}}).load_type == LoadType.NO_MATCHES
+
+
+def test_load_result_lazy_tracks():
+    result = LoadResult(json.loads(_playlist_body(10)))
+
+    assert result.tracks._cache.count(None) == 10
+    first = result.tracks[0]
+    assert result.tracks[0] is first
+    assert result.tracks._cache.count(None) == 9
+    assert [track.title for track in result.tracks[-2:]] == ["Title 8", "Title 9"]
+    assert hash(result.tracks) == hash(tuple(result.tracks))
+
+
+def test_track_extras():
+    track = Track(json.loads(_playlist_body(1))["tracks"][0])
+
+    assert track._extras is None
+    track.extras["bumped"] = True
+    assert track.extras == {"bumped": True}
+    assert not hasattr(track, "__dict__")
+
+
+class _HedgeClient(RESTClient):
+    def __init__(self, name: str, delay: float, other: "_HedgeClient" = None):
+        self.player = None
+        self.node = SimpleNamespace(
+            ready=True,
+            rest_latency=LatencyWindow(),
+            rest=self,
+            api_version=3,
+            record_load=lambda source, failed, severity=None: None,
+            is_source_available=lambda source: True,
+        )
+        self._base_uri = name
+        self.hedge_policy = None
+        self.delay = delay
+        self.other = other
+        self.cancelled = False
+
+    def _hedge_node(self):
+        return self.other.node if self.other else None
+
+    async def _get(self, url: str, priority: RequestPriority = RequestPriority.INTERACTIVE):
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        return {"loadType": "NO_MATCHES", "tracks": []}
+
+
+@pytest.mark.asyncio
+async def test_hedged_load_tracks():
+    secondary = _HedgeClient("secondary", delay=0.01)
+    primary = _HedgeClient("primary", delay=1, other=secondary)
+    policy = HedgePolicy(delay=0.01, budget=1)
+
+    result = await primary.load_tracks("query", hedge=policy)
+
+    await asyncio.sleep(0)
+
+    assert result._raw["encodedquery"] == "secondary/loadtracks?identifier=query"
+    assert primary.cancelled
+    assert (policy.requests, policy.hedges, policy.hedge_wins) == (1, 1, 1)
+
+
+@pytest.mark.asyncio
+async def test_hedge_budget():
+    secondary = _HedgeClient("secondary", delay=0)
+    primary = _HedgeClient("primary", delay=0.02, other=secondary)
+    primary.hedge_policy = HedgePolicy(delay=0, budget=0.5)
+
+    for _ in range(4):
+        await primary.load_tracks("query")
+
+    assert primary.hedge_policy.requests == 4
+    assert primary.hedge_policy.hedges == 2
+
+
+def test_load_result_start_timestamp():
+    data = json.loads(_playlist_body(3))
+    data["loadType"] = "SEARCH_RESULT"
+    data["query"] = "https://youtu.be/id0?t=30"
+
+    result = LoadResult(data)
+
+    assert result.query_info.identifier == "id0"
+    assert [track.start_timestamp for track in result.tracks] == [30000] * 3
+
+
+class _FailingClient(RESTClient):
+    def __init__(self, name: str):
+        self.player = None
+        self.node = SimpleNamespace(
+            ready=True,
+            rest=self,
+            api_version=3,
+            record_load=lambda source, failed, severity=None: None,
+            is_source_available=lambda source: False,
+        )
+        self._base_uri = name
+        self.hedge_policy = None
+        self.other: "_FailingClient" = None
+        self.loads = 0
+
+    def _recovery_node(self, source):
+        return self.other.node
+
+    async def _coalesced_get(self, url: str, priority: RequestPriority, key=None):
+        self.loads += 1
+        return {"loadType": "LOAD_FAILED", "exception": {"message": "blocked", "severity": "SUSPICIOUS"}}
+
+
+@pytest.mark.asyncio
+async def test_load_recovery_is_not_chained():
+    first, second = _FailingClient("first"), _FailingClient("second")
+    first.other, second.other = second, first
+
+    result = await first.load_tracks("ytsearch:query")
+
+    assert result.has_error
+    assert result._raw["encodedquery"].startswith("second")
+    assert (first.loads, second.loads) == (1, 1)
+
+
+class _CoalescingClient(RESTClient):
+    def __init__(self, responses: list):
+        self.player = None
+        self.node = SimpleNamespace(
+            _pending_loads={},
+            ready=True,
+            api_version=3,
+            record_load=lambda source, failed, severity=None: None,
+            is_source_available=lambda source: True,
+        )
+        self._base_uri = "http://localhost/loadtracks?identifier="
+        self.hedge_policy = None
+        self.responses = responses
+        self.gets = 0
+
+    async def _get(self, url: str, priority: RequestPriority = RequestPriority.INTERACTIVE):
+        self.gets += 1
+        response = self.responses.pop(0)
+        await asyncio.sleep(0.01)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+@pytest.mark.asyncio
+async def test_coalesced_loads_share_only_successes():
+    found = {"loadType": "SEARCH_RESULT", "tracks": []}
+    client = _CoalescingClient([found])
+    results = await asyncio.gather(*(client._coalesced_get("url", RequestPriority.INTERACTIVE) for _ in range(3)))
+    assert results == [found] * 3
+    assert client.gets == 1
+
+    # The callers that joined a failed load make their own request
+    failed = {"loadType": "LOAD_FAILED", "exception": {"message": "reset", "severity": "COMMON"}}
+    for failure in (failed, ConnectionResetError()):
+        client = _CoalescingClient([failure, found, found])
+        results = await asyncio.gather(
+            *(client._coalesced_get("url", RequestPriority.INTERACTIVE) for _ in range(3)), return_exceptions=True
+        )
+        assert results[1:] == [found, found]
+        assert client.gets == 3
+        assert not client.node._pending_loads
+
+
+@pytest.mark.asyncio
+async def test_coalesced_loads_by_cache_key():
+    found = {"loadType": "SEARCH_RESULT", "tracks": []}
+    client = _CoalescingClient([found])
+    results = await asyncio.gather(client.load_tracks("ytsearch:Never Gonna"), client.load_tracks("ytsearch:never gonna"))
+
+    assert client.gets == 1
+    assert [result._raw["query"] for result in results] == ["ytsearch:Never Gonna", "ytsearch:never gonna"]
@@ -0,0 +1,50 @@
+import asyncio
+
+import pytest
+
+from lavalink.enums import RequestPriority
+from lavalink.scheduler import RESTScheduler
+
+
+@pytest.mark.asyncio
+async def test_scheduler_priority():
+    scheduler = RESTScheduler(concurrency=1)
+    order = []
+
+    async def request(name: str, priority: RequestPriority):
+        async with scheduler.slot(priority):
+            order.append(name)
+
+    await scheduler.acquire()
+    tasks = [
+        asyncio.ensure_future(request("bulk 1", RequestPriority.BULK)),
+        asyncio.ensure_future(request("bulk 2", RequestPriority.BULK)),
+        asyncio.ensure_future(request("interactive", RequestPriority.INTERACTIVE)),
+    ]
+    await asyncio.sleep(0)
+
+    assert scheduler.queue_depth() == 3
+    assert scheduler.queue_depth(RequestPriority.BULK) == 2
+
+    scheduler.release()
+    await asyncio.gather(*tasks)
+
+    assert order == ["interactive", "bulk 1", "bulk 2"]
+    assert scheduler.active == 0
+    assert scheduler.queue_depth() == 0
+    assert scheduler.wait_time(RequestPriority.BULK).count == 2
+
+
+@pytest.mark.asyncio
+async def test_scheduler_cancelled_waiter():
+    scheduler = RESTScheduler(concurrency=1)
+
+    await scheduler.acquire()
+    waiter = asyncio.ensure_future(scheduler.acquire(RequestPriority.BULK))
+    await asyncio.sleep(0)
+    waiter.cancel()
+    await asyncio.sleep(0)
+    scheduler.release()
+
+    assert scheduler.active == 0
+    assert scheduler.queue_depth() == 0